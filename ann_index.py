@@ -0,0 +1,229 @@
+"""
+Configurable FAISS index types for large document collections
+- flat:     exact search, cost grows linearly with the number of chunks
+- ivf_flat: inverted lists over k-means cells; searches `nprobe` cells
+- hnsw:     graph index; search breadth set by `ef_search`
+- ivf_pq:   inverted lists with product-quantized vectors (~8x smaller than float32)
+- auto:     picked from the corpus size (see choose_index_type)
+
+Vectors in flat, ivf_flat and hnsw indexes are stored as float32, or more compactly
+(VECTOR_ENCODINGS):
+- fp16:     half precision, 2 bytes per dimension, distances almost exact
+- int8:     8-bit scalar quantization with per-dimension ranges, 1 byte per dimension
+- binary:   one sign bit per dimension (32x smaller), scanned exhaustively by Hamming
+            distance, which is fast on such short codes; the best BINARY_RESCORE * k
+            candidates are then re-scored with int8 codes (memory-mapped indexes only
+            page those in), since sign bits alone rank poorly
+
+Indexes are built as flat during ingestion and converted once the corpus is complete,
+so ANN types are always trained on the real vector distribution.
+"""
+
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+VECTOR_ENCODINGS = ("float32", "fp16", "int8", "binary")
+
+# Index type for new vector stores (override with GEMMA3_INDEX_TYPE)
+INDEX_TYPE = os.environ.get("GEMMA3_INDEX_TYPE", "auto")
+
+# How vectors are stored (override with GEMMA3_VECTOR_ENCODING)
+VECTOR_ENCODING = os.environ.get("GEMMA3_VECTOR_ENCODING", "float32")
+
+# Hamming candidates re-scored per result with binary encoding (GEMMA3_BINARY_RESCORE;
+# 0 keeps only the sign bits)
+BINARY_RESCORE = int(os.environ.get("GEMMA3_BINARY_RESCORE", 30))
+
+# Search-time settings (override with GEMMA3_NPROBE / GEMMA3_EF_SEARCH)
+NPROBE = int(os.environ.get("GEMMA3_NPROBE", 16))
+EF_SEARCH = int(os.environ.get("GEMMA3_EF_SEARCH", 64))
+
+# Corpus sizes (in chunks) at which "auto" switches index type
+AUTO_HNSW_MIN = 20_000
+AUTO_IVF_PQ_MIN = 200_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+PQ_SUBQUANTIZERS = 48
+MIN_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(n_vectors: int) -> str:
+    """Pick an index type for a corpus size: exact when small, HNSW when medium, IVF-PQ when huge"""
+    if n_vectors < AUTO_HNSW_MIN:
+        return "flat"
+    if n_vectors < AUTO_IVF_PQ_MIN:
+        return "hnsw"
+    return "ivf_pq"
+
+
+def index_type_of(index) -> str:
+    """Name (one of INDEX_TYPES) of an existing FAISS index"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def encoding_of(index) -> str:
+    """Vector encoding (one of VECTOR_ENCODINGS) of an existing FAISS index; ivf_pq counts as float32"""
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.base_index)
+    if isinstance(index, faiss.IndexLSH):
+        return "binary"
+    storage = faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+    # IndexScalarQuantizer and IndexIVFScalarQuantizer
+    sq = getattr(storage, "sq", None)
+    if sq is None:
+        return "float32"
+    return "fp16" if sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+
+
+def _nlist_for(n_vectors: int) -> int:
+    # ~4*sqrt(n) cells, with enough training points per cell for k-means
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def build_index(vectors: np.ndarray, index_type: str = "auto", nlist: int = None,
+                nprobe: int = NPROBE, ef_search: int = EF_SEARCH, encoding: str = "float32",
+                binary_rescore: int = BINARY_RESCORE):
+    """
+    Build, train and populate a FAISS index (L2 metric, like the default langchain store)
+
+    Args:
+        vectors: (n, dim) float32 matrix
+        index_type: One of INDEX_TYPES or "auto"
+        nlist: IVF cell count (defaults to ~4*sqrt(n))
+        nprobe: IVF cells searched per query
+        ef_search: HNSW search breadth
+        encoding: One of VECTOR_ENCODINGS (ivf_pq has its own compression and ignores it)
+        binary_rescore: Candidates per result re-scored with int8 codes (binary encoding)
+
+    Returns:
+        The populated FAISS index
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES} or 'auto'")
+    if encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Unknown vector encoding {encoding!r}; expected one of {VECTOR_ENCODINGS}")
+    qtype = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}.get(encoding)
+
+    if encoding == "binary":
+        # Sign bits of the (unit) vectors, no rotation or trained thresholds
+        index = faiss.index_factory(dim, "LSH,Refine(SQ8)" if binary_rescore else "LSH")
+        if binary_rescore:
+            index.k_factor = binary_rescore
+    elif index_type == "flat":
+        index = faiss.IndexFlatL2(dim) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M) if qtype is None else faiss.IndexHNSWSQ(dim, qtype, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        nlist = nlist or _nlist_for(n_vectors)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat" and qtype is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype)
+        elif index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            m = PQ_SUBQUANTIZERS if dim % PQ_SUBQUANTIZERS == 0 else 1
+            # 8-bit codes need 256 centroids per sub-quantizer; use fewer bits on small corpora
+            nbits = max(1, min(8, int(math.log2(max(2, n_vectors // MIN_POINTS_PER_CENTROID)))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits)
+        # Training on a sample is enough and much faster than on everything
+        sample_size = min(n_vectors, nlist * 256)
+        sample = vectors[np.random.default_rng(0).choice(n_vectors, sample_size, replace=False)]
+        index.train(sample)
+    if not index.is_trained:
+        # Scalar quantizer ranges (flat / HNSW storage, binary re-scoring)
+        index.train(vectors[np.random.default_rng(0).choice(n_vectors, min(n_vectors, 65536), replace=False)])
+
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    index.add(vectors)
+    return index
+
+
+def set_search_params(index, nprobe: int = None, ef_search: int = None):
+    """Apply nprobe (IVF) / efSearch (HNSW) to an index; other types are unaffected"""
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def ensure_index_type(vector_store, index_type: str = INDEX_TYPE, encoding: str = VECTOR_ENCODING):
+    """
+    Convert a vector store's index in place to the requested type and encoding, if they differ
+
+    Positions are preserved, so the store's index_to_docstore_id mapping stays valid.
+    Conversion reads exact vectors back out of a float32 flat index; other indexes are
+    left alone.
+    """
+    if vector_store is None:
+        return vector_store
+
+    current = vector_store.index
+    target = choose_index_type(current.ntotal) if index_type == "auto" else index_type
+    # What build_index makes of these: binary codes are always scanned, ivf_pq has its own codes
+    if encoding == "binary":
+        target = "flat"
+    elif target == "ivf_pq":
+        encoding = "float32"
+    if (target, encoding) == (index_type_of(current), encoding_of(current)):
+        return vector_store
+    if (index_type_of(current), encoding_of(current)) != ("flat", "float32"):
+        return vector_store
+
+    vectors = current.reconstruct_n(0, current.ntotal)
+    vector_store.index = build_index(vectors, target, encoding=encoding)
+    logger.info("Converted index with %d vectors from flat to %s (%s)", current.ntotal, target, encoding)
+    return vector_store
+
+
+def delete_vectors(vector_store, ids: list, embeddings):
+    """
+    Delete chunks from a vector store by docstore ID, for any index type
+
+    Flat indexes use langchain's FAISS.delete. IVF, HNSW and re-scored binary indexes
+    cannot be compacted in place, so they are rebuilt from the remaining chunks: the
+    trained index is cloned empty and refilled with vectors from `embeddings` (cache hits
+    with CachedEmbeddings).
+    """
+    if isinstance(vector_store.index, faiss.IndexFlatCodes):
+        vector_store.delete(ids)
+        return vector_store
+
+    removed = set(ids)
+    remaining = [
+        (i, doc_id) for i, doc_id in sorted(vector_store.index_to_docstore_id.items())
+        if doc_id not in removed
+    ]
+    texts = [vector_store.docstore.search(doc_id).page_content for _, doc_id in remaining]
+
+    index = faiss.clone_index(vector_store.index)
+    index.reset()
+    if texts:
+        vectors = (embeddings.embed_array(texts) if hasattr(embeddings, "embed_array")
+                   else np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+        index.add(vectors)
+
+    vector_store.index = index
+    vector_store.docstore.delete(list(removed))
+    if hasattr(vector_store, "lexical_index"):
+        vector_store.lexical_index.remove(ids)
+    vector_store.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(remaining)}
+    return vector_store
@@ -0,0 +1,220 @@
+"""
+Answer cache for repeated and near-duplicate questions
+Answers are scoped by chat mode, document-set fingerprint and recent history, so a
+cached answer is only reused in the same situation it was generated in. Within a scope,
+lookups are exact (normalized question text) first, then by question-embedding cosine
+similarity above a threshold. Entries are evicted LRU-first and expire after a TTL;
+an optional SQLite backend keeps them across restarts.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL = 3600.0
+SIMILARITY_THRESHOLD = 0.95
+
+
+def normalize_question(question: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question"""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+def make_scope(mode: str, corpus_fingerprint: str = "", history: str = "") -> str:
+    """Hash of everything besides the question that the answer depends on"""
+    return hashlib.sha256(f"{mode}\0{corpus_fingerprint}\0{history}".encode()).hexdigest()
+
+
+def corpus_fingerprint(vector_store) -> str:
+    """
+    Fingerprint of the documents in a vector store
+
+    Chunk IDs are derived from file name and content (see ingest.chunk_ids), so hashing the
+    set of per-file ID prefixes identifies the document set. Recomputed on every call: the
+    mapping is updated in place or replaced by a new dict, so neither its identity nor its
+    size tells reliably whether it changed, and hashing it costs little next to a lookup.
+
+    Returns:
+        The fingerprint ("" without a store), or None for stores without a docstore ID
+        mapping, whose documents cannot be identified (their answers must not be cached)
+    """
+    if vector_store is None:
+        return ""
+    mapping = getattr(vector_store, "index_to_docstore_id", None)
+    if mapping is None:
+        return None
+    file_ids = sorted({doc_id.rsplit("-", 1)[0] for doc_id in mapping.values()})
+    return hashlib.sha256("\0".join(file_ids).encode()).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    scope: str
+    question: str
+    answer: str
+    vector: np.ndarray
+    created_at: float
+
+
+class AnswerCache:
+    """
+    LRU + TTL answer cache with exact and semantic lookup
+
+    Args:
+        max_entries: Entries kept in memory before the least recently used is evicted
+        ttl: Seconds an entry stays valid
+        threshold: Minimum cosine similarity for a semantic hit
+        path: Optional SQLite file for a persistent backend
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = SIMILARITY_THRESHOLD, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0,
+                         "expired": 0, "lookup_seconds": 0.0}
+
+        self._conn = None
+        if path:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, scope TEXT NOT NULL, "
+                "question TEXT NOT NULL, answer TEXT NOT NULL, vector BLOB, created_at REAL NOT NULL)"
+            )
+            self._load()
+
+    @staticmethod
+    def _key(scope: str, question: str) -> str:
+        return hashlib.sha256(f"{scope}\0{normalize_question(question)}".encode()).hexdigest()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl
+        rows = self._conn.execute(
+            "SELECT key, scope, question, answer, vector, created_at FROM answers "
+            "WHERE created_at >= ? ORDER BY created_at DESC LIMIT ?",
+            (cutoff, self.max_entries)
+        ).fetchall()
+        for key, scope, question, answer, blob, created_at in reversed(rows):
+            vector = np.frombuffer(blob, dtype=np.float32) if blob else None
+            self._entries[key] = CacheEntry(scope, question, answer, vector, created_at)
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created_at > self.ttl
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def get(self, scope: str, question: str, embed_query=None):
+        """
+        Look up an answer
+
+        Args:
+            scope: From make_scope
+            question: The user's question
+            embed_query: Optional callable(text) -> vector, enabling semantic lookup
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        start = time.perf_counter()
+        try:
+            return self._get(scope, question, embed_query)
+        finally:
+            with self._lock:
+                self._metrics["lookup_seconds"] += time.perf_counter() - start
+
+    def _get(self, scope: str, question: str, embed_query):
+        now = time.time()
+        key = self._key(scope, question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._drop(key)
+                self._metrics["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._metrics["exact_hits"] += 1
+                return entry.answer
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if e.scope == scope and e.vector is not None and not self._expired(e, now)
+            ]
+
+        if embed_query is not None and candidates:
+            vector = _unit(embed_query(question))
+            similarities = np.stack([e.vector for _, e in candidates]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                best_key, best_entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self._metrics["semantic_hits"] += 1
+                return best_entry.answer
+
+        with self._lock:
+            self._metrics["misses"] += 1
+        return None
+
+    def put(self, scope: str, question: str, answer: str, embed_query=None):
+        """Store an answer; embed_query enables later semantic hits for it"""
+        vector = _unit(embed_query(question)) if embed_query is not None else None
+        key = self._key(scope, question)
+        entry = CacheEntry(scope, question, answer, vector, time.time())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, scope, question, answer,
+                     vector.tobytes() if vector is not None else None, entry.created_at)
+                )
+                self._conn.commit()
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._metrics["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def metrics(self) -> dict:
+        """Hit/miss counters, hit rate and mean lookup latency"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        lookups = metrics["exact_hits"] + metrics["semantic_hits"] + metrics["misses"]
+        metrics["entries"] = len(self._entries)
+        metrics["hit_rate"] = (metrics["exact_hits"] + metrics["semantic_hits"]) / lookups if lookups else 0.0
+        metrics["mean_lookup_ms"] = 1000 * metrics.pop("lookup_seconds") / lookups if lookups else 0.0
+        return metrics
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
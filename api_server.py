@@ -0,0 +1,366 @@
+"""
+Headless HTTP API over llm_logic, for other services and load tests
+Serves the same core as the Streamlit app (ingestion jobs, retrieval, generation, the
+caches and the shared InferenceService) without re-running a UI script per interaction.
+Runs on Starlette + uvicorn: blocking calls into llm_logic go to a thread pool, and
+token streams are forwarded as server-sent events as soon as they are produced.
+
+    GET    /health                            Status, models and collections
+    POST   /v1/collections/{name}/documents   Make a collection hold exactly these files
+                                              (multipart, or {"files": [{"name", "content"}]});
+                                              unchanged files are not re-embedded. Returns
+                                              the ingestion job (?wait=1: once it is done)
+    GET    /v1/jobs/{job_id}                  Ingestion progress
+    DELETE /v1/collections/{name}             Drop a collection
+    POST   /v1/retrieve                       {"question" or "questions", "collection", "k"}
+    POST   /v1/chat                           {"question", "history", "session_id", "collection"}
+    POST   /v1/chat/stream                    Same body; events: token {"text", "replace"}
+                                              ..., then done (or error)
+
+Chats with a "collection" are answered from its documents (RAG), others are normal chat.
+Request bodies are JSON, or msgpack with Content-Type: application/msgpack (needs the
+optional ormsgpack package); responses are msgpack when the Accept header asks for it.
+Connections are kept alive between requests (GEMMA3_API_KEEP_ALIVE seconds when idle).
+
+Run with: python api_server.py [--host 127.0.0.1] [--port 8000]
+"""
+
+import argparse
+import base64
+import contextlib
+import json
+import os
+import threading
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import llm_logic
+from doc_registry import DocumentRegistry
+from inference_service import GenerationCancelled, ServiceBusyError
+from ingest_jobs import DONE, get_job_queue
+from llm_router import Replacement
+from rag_response import RAGResponse, Timings
+
+# Seconds an idle client connection is kept open (override with GEMMA3_API_KEEP_ALIVE)
+KEEP_ALIVE_SECONDS = int(os.environ.get("GEMMA3_API_KEEP_ALIVE", 75))
+
+# Session id for requests that do not send one (body "session_id" or X-Session-Id header)
+API_SESSION = "api"
+
+MAX_K = 50
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _msgpack():
+    try:
+        import ormsgpack
+    except ImportError:
+        raise HTTPException(415, "msgpack bodies need the ormsgpack package: pip install ormsgpack")
+    return ormsgpack
+
+
+async def read_body(request) -> dict:
+    """The request body as a dict, decoded from JSON or msgpack by its Content-Type"""
+    raw = await request.body()
+    if not raw:
+        return {}
+    content_type = request.headers.get("content-type", JSON_TYPE).split(";")[0].strip()
+    try:
+        body = _msgpack().unpackb(raw) if content_type in MSGPACK_TYPES else json.loads(raw)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(400, f"Could not decode the {content_type} body")
+    if not isinstance(body, dict):
+        raise HTTPException(400, "The body must be an object")
+    return body
+
+
+def respond(request, data, status_code: int = 200) -> Response:
+    """A JSON response, or msgpack if the client's Accept header asks for it"""
+    accept = request.headers.get("accept", "")
+    if any(media_type in accept for media_type in MSGPACK_TYPES):
+        return Response(_msgpack().packb(data), status_code, media_type=MSGPACK_TYPES[0])
+    return JSONResponse(data, status_code)
+
+
+# Inference errors as HTTP statuses: the queue is full, or the server is shutting down
+_ERROR_STATUS = {ServiceBusyError: 429, GenerationCancelled: 503}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def job_status(job) -> dict:
+    return {
+        "job_id": job.job_id, "status": job.status, "stage": job.current_stage, "progress": job.progress,
+        "summary": job.summary(), "changes": job.changes, "error": job.error,
+        "files": {name: vars(progress) for name, progress in job.files.items()},
+    }
+
+
+class Collections:
+    """
+    Named document collections, one DocumentRegistry each
+
+    Args:
+        use_cache: Passed to each DocumentRegistry (index cache and shared indexes)
+    """
+
+    def __init__(self, use_cache: bool = True):
+        self.use_cache = use_cache
+        self._registries = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, create: bool = False) -> DocumentRegistry:
+        with self._lock:
+            registry = self._registries.get(name)
+            if registry is None and create:
+                registry = self._registries[name] = DocumentRegistry(use_cache=self.use_cache)
+        if registry is None:
+            raise HTTPException(404, f"Unknown collection {name!r}")
+        return registry
+
+    def drop(self, name: str) -> DocumentRegistry:
+        with self._lock:
+            registry = self._registries.pop(name, None)
+        if registry is None:
+            raise HTTPException(404, f"Unknown collection {name!r}")
+        return registry
+
+    def summary(self) -> dict:
+        with self._lock:
+            registries = dict(self._registries)
+        return {name: {"files": len(registry), "chunks": registry.chunk_count} for name, registry in registries.items()}
+
+    def vector_store(self, name: str):
+        """The collection's vector store, ready to query"""
+        registry = self.get(name)
+        if get_job_queue().active_job(registry) is not None:
+            raise HTTPException(409, f"Collection {name!r} is still being indexed")
+        if registry.vector_store is None:
+            raise HTTPException(404, f"Collection {name!r} has no documents")
+        return registry.vector_store
+
+
+def _question(body: dict) -> str:
+    question = body.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPException(400, "A non-empty 'question' is required")
+    return question
+
+
+def _chat_args(request, body: dict, collections: Collections) -> tuple:
+    """(question, history, session_id, vector_store or None) of a chat request"""
+    history = body.get("history") or []
+    if not isinstance(history, list) or not all(
+        isinstance(msg, dict) and msg.get("role") in ("user", "assistant") and isinstance(msg.get("content"), str)
+        for msg in history
+    ):
+        raise HTTPException(400, "'history' must be a list of {role: user|assistant, content} messages")
+    session_id = body.get("session_id") or request.headers.get("x-session-id") or API_SESSION
+    collection = body.get("collection")
+    vector_store = collections.vector_store(collection) if collection else None
+    return _question(body), history, session_id, vector_store
+
+
+async def _uploads(request) -> list:
+    """(file_name, bytes) tuples from a multipart form or a {"files": [...]} body"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        async with request.form() as form:
+            return [(upload.filename, await upload.read()) for _, upload in form.multi_items()
+                    if hasattr(upload, "filename")]
+
+    files = (await read_body(request)).get("files")
+    if not isinstance(files, list):
+        raise HTTPException(400, "Send files as multipart/form-data or as {'files': [{'name', 'content'}]}")
+    uploads = []
+    for file in files:
+        name, content = (file.get("name"), file.get("content")) if isinstance(file, dict) else (None, None)
+        if not isinstance(name, str) or not isinstance(content, (str, bytes)):
+            raise HTTPException(400, "Each file needs a 'name' and a 'content' (bytes, or base64 in JSON)")
+        uploads.append((name, base64.b64decode(content) if isinstance(content, str) else content))
+    return uploads
+
+
+def create_app(use_cache: bool = True, warm_up: bool = True) -> Starlette:
+    """
+    Build the API application
+
+    Args:
+        use_cache: Use the on-disk index cache and shared indexes for collections
+        warm_up: Load the models in the background when the server starts
+
+    Returns:
+        The Starlette app (an ASGI application, e.g. for uvicorn.run)
+    """
+    collections = Collections(use_cache=use_cache)
+
+    async def health(request):
+        router = llm_logic.get_router()
+        return respond(request, {
+            "status": "ok", "llm": router.main.name, "fast_llm": router.fast.name if router.fast else None,
+            "collections": collections.summary(),
+        })
+
+    async def ingest(request):
+        registry = collections.get(request.path_params["name"], create=True)
+        uploads = await _uploads(request)
+        if not uploads:
+            raise HTTPException(400, "No files were sent")
+        job = await run_in_threadpool(get_job_queue().submit, registry, uploads)
+        if request.query_params.get("wait") in ("1", "true"):
+            await run_in_threadpool(job.wait)
+        return respond(request, job_status(job), 200 if job.status == DONE else 202)
+
+    async def job(request):
+        found = get_job_queue().get(request.path_params["job_id"])
+        if found is None:
+            raise HTTPException(404, "Unknown job")
+        return respond(request, job_status(found))
+
+    async def drop(request):
+        registry = collections.drop(request.path_params["name"])
+        active = get_job_queue().active_job(registry)
+        if active is not None:
+            active.cancel()
+            await run_in_threadpool(active.wait)
+        registry.clear()
+        return respond(request, {"dropped": request.path_params["name"]})
+
+    async def retrieve(request):
+        body = await read_body(request)
+        vector_store = collections.vector_store(body.get("collection") or "")
+        k = body.get("k", 3)
+        if not isinstance(k, int) or not 1 <= k <= MAX_K:
+            raise HTTPException(400, f"'k' must be an integer from 1 to {MAX_K}")
+        if "questions" in body:
+            questions = body["questions"]
+            if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+                raise HTTPException(400, "'questions' must be a list of strings")
+            batches = await run_in_threadpool(llm_logic.retrieve_batch, questions, vector_store, k)
+            return respond(request, {"results": [[source.to_dict() for source in sources] for sources in batches]})
+
+        timings = Timings()
+        sources, _ = await run_in_threadpool(llm_logic.retrieve_scored, _question(body), vector_store, k, timings)
+        return respond(request, {"sources": [source.to_dict() for source in sources], "timings": timings.to_dict()})
+
+    async def chat(request):
+        question, history, session_id, vector_store = _chat_args(request, await read_body(request), collections)
+        if vector_store is not None:
+            result = await run_in_threadpool(llm_logic.get_rag_result, question, vector_store, history, session_id)
+            return respond(request, result.to_dict())
+        answer = await run_in_threadpool(llm_logic.get_text_response, question, history, session_id)
+        return respond(request, {"question": question, "answer": answer})
+
+    async def chat_stream(request):
+        question, history, session_id, vector_store = _chat_args(request, await read_body(request), collections)
+        result = RAGResponse(question)
+        if vector_store is not None:
+            stream = llm_logic.stream_rag_response(question, vector_store, history, session_id, result=result)
+        else:
+            stream = llm_logic.stream_text_response(question, history, session_id)
+
+        async def events():
+            parts = []
+            try:
+                async for fragment in iterate_in_threadpool(stream):
+                    replace = isinstance(fragment, Replacement)
+                    if replace:
+                        parts.clear()
+                    parts.append(fragment)
+                    yield _sse("token", {"text": fragment, "replace": replace})
+                yield _sse("done", result.to_dict() if vector_store is not None
+                           else {"question": question, "answer": "".join(parts)})
+            except Exception as e:
+                yield _sse("error", {"error": str(e), "status": _ERROR_STATUS.get(type(e), 500)})
+            finally:
+                # Also runs when the client disconnects: closing the stream cancels the generation
+                await run_in_threadpool(stream.close)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def http_error(request, exc: HTTPException):
+        return respond(request, {"error": exc.detail}, exc.status_code)
+
+    async def service_error(request, exc: Exception):
+        return respond(request, {"error": str(exc)}, _ERROR_STATUS[type(exc)])
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        if warm_up:
+            llm_logic.warm_up(embeddings=True)
+        yield
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/v1/collections/{name}/documents", ingest, methods=["POST"]),
+            Route("/v1/collections/{name}", drop, methods=["DELETE"]),
+            Route("/v1/jobs/{job_id}", job),
+            Route("/v1/retrieve", retrieve, methods=["POST"]),
+            Route("/v1/chat", chat, methods=["POST"]),
+            Route("/v1/chat/stream", chat_stream, methods=["POST"]),
+        ],
+        exception_handlers={HTTPException: http_error, ServiceBusyError: service_error,
+                            GenerationCancelled: service_error},
+        lifespan=lifespan,
+    )
+
+
+class BackgroundServer:
+    """
+    uvicorn serving an app on a free port, in a background thread (for tests and benchmarks)
+
+    Usage:
+        with BackgroundServer(create_app(warm_up=False)) as server:
+            conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning",
+                                                    timeout_keep_alive=KEEP_ALIVE_SECONDS))
+        self.thread = None
+        self.port = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.run, name="api-server", daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The API server failed to start")
+            time.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk index cache")
+    args = parser.parse_args()
+
+    import uvicorn
+    print(f"🚀 API on http://{args.host}:{args.port} (LLM: {llm_logic.LLM_BACKEND})")
+    uvicorn.run(create_app(use_cache=not args.no_cache), host=args.host, port=args.port,
+                timeout_keep_alive=KEEP_ALIVE_SECONDS, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
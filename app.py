@@ -1,6 +1,15 @@
 import streamlit as st
-from llm_logic import get_text_response, get_rag_response, process_documents
-import time
+from llm_logic import (
+    stream_text_response, stream_rag_response, warm_up, get_answer_cache, cancel_session, get_router,
+    get_extractive_answerer, ANSWER_CACHE_ENABLED, EXTRACTIVE_ENABLED, FAST_LLM_BACKEND
+)
+from llm_router import Replacement
+from inference_service import GenerationCancelled
+from doc_registry import DocumentRegistry
+from ingest_jobs import CANCELLED, DONE, get_job_queue
+from rag_response import RAGResponse
+from contextlib import closing
+import uuid
 
 # Page config
 st.set_page_config(
@@ -260,6 +269,63 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def render_sources(sources: list, timings: str = None):
+    """Show the chunks an answer was based on, and the latency breakdown"""
+    if sources:
+        with st.expander(f"📎 Sources ({len(sources)})"):
+            for source in sources:
+                location = source["file"] + (f", page {source['page']}" if source["page"] else "")
+                scores = []
+                if source["similarity"] is not None:
+                    scores.append(f"similarity {source['similarity']:.2f}")
+                if source["bm25"] is not None:
+                    scores.append(f"BM25 {source['bm25']:.1f}")
+                if source.get("rerank") is not None:
+                    scores.append(f"rerank {source['rerank']:.2f}")
+                st.markdown(f"**[{source['rank']}] {location}** · {' · '.join(scores) or 'n/a'}")
+                st.caption(source["excerpt"])
+    if timings:
+        st.caption(f"⏱️ {timings}")
+
+
+@st.fragment(run_every=1.0)
+def render_ingest_job(job_id: str):
+    """Progress of this session's background ingestion job; reruns itself every second"""
+    job = get_job_queue().get(job_id)
+    if job is not None and not job.is_finished:
+        st.progress(job.progress, text=f"⏳ {job.summary()}")
+        with st.expander("📄 Files"):
+            for file in job.files.values():
+                counts = f" {file.embedded}/{file.chunks} chunks" if file.chunks else ""
+                st.caption(f"{file.file_name} • {file.stage}{counts}")
+        if st.button("⏹️ Cancel", use_container_width=True):
+            job.cancel()
+        return
+    
+    # Finished: hand the index to the chat and show the outcome
+    registry = st.session_state.doc_registry
+    st.session_state.ingest_job_id = None
+    st.session_state.vector_store = registry.vector_store
+    st.session_state.documents_processed = registry.vector_store is not None
+    if job is None:
+        pass
+    elif job.status == DONE:
+        changes = job.changes
+        st.session_state.ingest_result = ("success", (
+            f"✅ Indexed {len(registry)} document(s): "
+            f"{len(changes['added'])} added, {len(changes['replaced'])} updated, "
+            f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged"
+        ))
+    elif job.status == CANCELLED:
+        st.session_state.ingest_result = ("warning", (
+            f"⏹️ Cancelled with {len(registry)} document(s) indexed. "
+            "Process the documents again to index the rest."
+        ))
+    else:
+        st.session_state.ingest_result = ("error", f"❌ Error: {job.error}")
+    st.rerun()
+
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -273,6 +339,20 @@ if "documents_processed" not in st.session_state:
 if "vector_store" not in st.session_state:
     st.session_state.vector_store = None
 
+if "doc_registry" not in st.session_state:
+    st.session_state.doc_registry = DocumentRegistry()
+
+# Documents are indexed by a background job; its id survives reruns
+if "ingest_job_id" not in st.session_state:
+    st.session_state.ingest_job_id = None
+
+if "ingest_result" not in st.session_state:
+    st.session_state.ingest_result = None
+
+# Identifies this browser session to the shared inference service (fair queueing, cancellation)
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Sidebar
 with st.sidebar:
     st.markdown("### ⚙️ Settings")
@@ -288,6 +368,9 @@ with st.sidebar:
     
     st.session_state.rag_enabled = (mode == "📚 Document Chat (RAG)")
     
+    # Load models in the background while the page renders (embeddings only for RAG)
+    warm_up(embeddings=st.session_state.rag_enabled)
+    
     st.markdown("---")
     
     # Document upload section (only show in RAG mode)
@@ -305,18 +388,43 @@ with st.sidebar:
             st.info(f"📁 {len(uploaded_files)} file(s) selected")
             
             if st.button("🔄 Process Documents", use_container_width=True):
-                with st.spinner("Processing your documents..."):
-                    try:
-                        st.session_state.vector_store = process_documents(uploaded_files)
-                        st.session_state.documents_processed = True
-                        st.success(f"✅ Successfully processed {len(uploaded_files)} document(s)!")
-                        time.sleep(1)
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Error: {str(e)}")
+                try:
+                    # Indexed in the background: only new or changed files are embedded,
+                    # dropped files are deleted
+                    job = get_job_queue().submit(st.session_state.doc_registry, uploaded_files)
+                    st.session_state.ingest_job_id = job.job_id
+                    st.session_state.ingest_result = None
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+        
+        if st.session_state.ingest_job_id:
+            render_ingest_job(st.session_state.ingest_job_id)
+            st.caption("💬 You can keep chatting in Normal Chat while documents are indexed.")
+        elif st.session_state.ingest_result:
+            kind, text = st.session_state.ingest_result
+            getattr(st, kind)(text)
         
         if st.session_state.documents_processed:
             st.success("📚 Documents ready! Ask me anything about them.")
+            
+            registry = st.session_state.doc_registry
+            with st.expander(f"🗂️ Indexed files ({len(registry)})"):
+                if registry.last_stats is not None:
+                    st.caption(f"⏱️ Last run: {registry.last_stats.summary()}")
+                if registry.shared_sessions > 1:
+                    st.caption(f"🔗 Shared index, in use by {registry.shared_sessions} sessions")
+                for file_name, record in list(registry.files.items()):
+                    col1, col2 = st.columns([4, 1])
+                    col1.caption(f"{file_name} • {len(record.chunk_ids)} chunks")
+                    # The index may only change through the running job
+                    if st.session_state.ingest_job_id:
+                        continue
+                    if col2.button("🗑️", key=f"remove_{file_name}"):
+                        registry.remove_file(file_name)
+                        st.session_state.vector_store = registry.vector_store
+                        st.session_state.documents_processed = registry.vector_store is not None
+                        st.rerun()
     
     st.markdown("---")
     
@@ -329,16 +437,47 @@ with st.sidebar:
         user_msgs = len([m for m in st.session_state.messages if m["role"] == "user"])
         st.metric("Questions", user_msgs)
     
+    if ANSWER_CACHE_ENABLED:
+        cache_metrics = get_answer_cache().metrics()
+        cache_hits = cache_metrics["exact_hits"] + cache_metrics["semantic_hits"]
+        st.caption(
+            f"⚡ Answer cache: {cache_hits} hits, {cache_metrics['misses']} misses "
+            f"({cache_metrics['hit_rate']:.0%} hit rate)"
+        )
+    
+    if EXTRACTIVE_ENABLED:
+        extractive_metrics = get_extractive_answerer().metrics()
+        st.caption(
+            f"✂️ Extractive answers: {extractive_metrics['hits']} of {extractive_metrics['attempts']} "
+            f"({extractive_metrics['hit_rate']:.0%}), ~{extractive_metrics['saved_ms'] / 1000:.0f} s of generation saved"
+        )
+    
+    if FAST_LLM_BACKEND:
+        routed = {}
+        for backends in get_router().telemetry.stats().values():
+            for backend, group in backends.items():
+                routed[backend] = routed.get(backend, 0) + group["answers"]
+        if routed:
+            st.caption("🔀 Answers by model: " + ", ".join(f"{backend} {count}" for backend, count in routed.items()))
+    
     st.markdown("---")
     
     # Action buttons
     if st.button("🗑️ Clear Chat", use_container_width=True):
+        cancel_session(st.session_state.session_id)
         st.session_state.messages = []
         st.rerun()
     
     if st.session_state.rag_enabled and st.button("🔄 Reset Documents", use_container_width=True):
+        job = get_job_queue().active_job(st.session_state.doc_registry)
+        if job is not None:
+            job.cancel()
+            job.wait()
+        st.session_state.ingest_job_id = None
+        st.session_state.ingest_result = None
         st.session_state.documents_processed = False
         st.session_state.vector_store = None
+        st.session_state.doc_registry.clear()
         st.rerun()
     
     st.markdown("---")
@@ -367,11 +506,15 @@ else:
 for message in st.session_state.messages:
     with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🤖"):
         st.markdown(message["content"])
+        if message.get("sources") or message.get("timings"):
+            render_sources(message.get("sources"), message.get("timings"))
 
 # Chat input
 if prompt := st.chat_input("💭 Type your message here..."):
     # Check if RAG mode is enabled but no documents uploaded
-    if st.session_state.rag_enabled and not st.session_state.documents_processed:
+    if st.session_state.rag_enabled and st.session_state.ingest_job_id:
+        st.warning("⏳ Documents are still being indexed. Switch to Normal Chat or wait a moment.")
+    elif st.session_state.rag_enabled and not st.session_state.documents_processed:
         st.warning("⚠️ Please upload and process documents first using the sidebar!")
     else:
         # Add user message to chat
@@ -382,40 +525,58 @@ if prompt := st.chat_input("💭 Type your message here..."):
         # Get AI response
         with st.chat_message("assistant", avatar="🤖"):
             message_placeholder = st.empty()
+            rag_result = None
             
             with st.spinner("🤔 Thinking..."):
                 try:
                     if st.session_state.rag_enabled:
-                        # RAG response
-                        response = get_rag_response(
+                        # RAG response; rag_result collects its sources and timings
+                        rag_result = RAGResponse(prompt)
+                        stream = stream_rag_response(
                             prompt, 
                             st.session_state.vector_store,
-                            st.session_state.messages[:-1]
+                            st.session_state.messages[:-1],
+                            session_id=st.session_state.session_id,
+                            result=rag_result
                         )
                     else:
                         # Normal response with chat history
-                        response = get_text_response(
+                        stream = stream_text_response(
                             prompt,
-                            st.session_state.messages[:-1]
+                            st.session_state.messages[:-1],
+                            session_id=st.session_state.session_id
                         )
                     
-                    # Simulate streaming effect
-                    full_response = ""
-                    words = response.split()
-                    for i, word in enumerate(words):
-                        full_response += word + " "
-                        if i % 3 == 0:  # Update every 3 words for smoother effect
-                            time.sleep(0.03)
-                            message_placeholder.markdown(full_response + "▌")
+                    # Render tokens as Ollama produces them; if the run is stopped (new
+                    # message, page closed) closing the stream cancels the generation
+                    response = ""
+                    with closing(stream):
+                        for token in stream:
+                            # In draft mode the main model's answer replaces the draft shown so far
+                            response = token if isinstance(token, Replacement) else response + token
+                            message_placeholder.markdown(response + "▌")
                     
                     message_placeholder.markdown(response)
                     
+                except GenerationCancelled:
+                    # Cancelled (e.g. the chat was cleared): keep what was shown, marked as cut short
+                    response += " _(stopped)_"
+                    message_placeholder.markdown(response)
+                    rag_result = None
                 except Exception as e:
                     response = f"❌ Sorry, I encountered an error: {str(e)}"
                     message_placeholder.markdown(response)
+                    rag_result = None
             
-            # Add assistant response to chat
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            # Add assistant response to chat, with the sources it was based on
+            assistant_message = {"role": "assistant", "content": response}
+            if rag_result is not None:
+                assistant_message["sources"] = [source.to_dict() for source in rag_result.sources]
+                assistant_message["timings"] = rag_result.timings.summary() + (
+                    " (answer cache)" if rag_result.from_cache else " (extractive)" if rag_result.extractive else ""
+                )
+                render_sources(assistant_message["sources"], assistant_message["timings"])
+            st.session_state.messages.append(assistant_message)
 
 # Welcome message for new users
 if len(st.session_state.messages) == 0:
@@ -0,0 +1,88 @@
+"""
+Recall vs latency benchmark for the ANN index types in ann_index.py
+Builds each index type over a synthetic clustered corpus of unit vectors (like
+normalized MiniLM embeddings) and compares top-k results with exact flat search.
+
+Run with: python bench_ann.py [--vectors 100000] [--queries 500] [--dim 384] [--k 10]
+"""
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import build_index, set_search_params
+
+
+def make_corpus(n_vectors: int, n_queries: int, dim: int, n_clusters: int = 200, seed: int = 0) -> tuple:
+    """Gaussian clusters on the unit sphere; queries are drawn from the same distribution"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+
+    def sample(count):
+        points = centers[rng.integers(0, n_clusters, count)] + 0.6 * rng.standard_normal((count, dim))
+        points = points.astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(n_vectors), sample(n_queries)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def measure(index, queries: np.ndarray, k: int) -> tuple:
+    """Single-query search loop, as in get_rag_response; returns (labels, mean ms, p99 ms)"""
+    latencies = []
+    labels = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, labels[i] = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return labels, float(np.mean(latencies)), float(np.percentile(latencies, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.vectors, args.queries, args.dim)
+    print(f"📊 {args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k}")
+    print("-" * 78)
+    print(f"   {'index':<10} {'setting':<14} {'build s':>8} {'MB':>8} {'mean ms':>9} {'p99 ms':>8} {'recall':>8}")
+
+    configs = [
+        ("flat", [None]),
+        ("ivf_flat", [("nprobe", 4), ("nprobe", 16), ("nprobe", 64)]),
+        ("hnsw", [("ef_search", 16), ("ef_search", 64), ("ef_search", 256)]),
+        ("ivf_pq", [("nprobe", 16), ("nprobe", 64)]),
+    ]
+    truth = None
+    for index_type, settings in configs:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        for setting in settings:
+            label = "exact"
+            if setting is not None:
+                name, value = setting
+                set_search_params(index, **{name: value})
+                label = f"{name}={value}"
+            found, mean_ms, p99_ms = measure(index, queries, args.k)
+            if truth is None:
+                truth = found
+            print(f"   {index_type:<10} {label:<14} {build_seconds:8.2f} {size_mb:8.1f} "
+                  f"{mean_ms:9.3f} {p99_ms:8.3f} {recall_at_k(found, truth):8.3f}")
+    print("-" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Load test for the HTTP API: concurrent clients against api_server with a fake Ollama server
+Each client streams --turns chat answers over SSE, then the per-request overhead is measured
+on /v1/retrieve: a kept-alive connection against a new connection per request, and JSON
+against msgpack bodies. Reports p50/p99 time-to-first-token, total latency and throughput.
+Embeddings are a deterministic fake, so only the API and its plumbing are measured.
+
+Run with: python bench_api.py [--clients 8] [--turns 5] [--requests 200]
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import llm_logic
+from api_server import BackgroundServer, create_app
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from fake_ollama import FakeOllamaServer
+
+DOCUMENT = " ".join(f"Fact number {i} is about topic {i % 17}." for i in range(400)).encode()
+
+
+def _post(conn, path: str, payload: dict, msgpack: bool = False):
+    if msgpack:
+        import ormsgpack
+        body, content_type = ormsgpack.packb(payload), "application/msgpack"
+    else:
+        body, content_type = json.dumps(payload).encode(), "application/json"
+    conn.request("POST", path, body, {"Content-Type": content_type, "Accept": content_type})
+    response = conn.getresponse()
+    raw = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{path} returned {response.status}: {raw[:200]!r}")
+    return raw
+
+
+def stream_chat(port: int, clients: int, turns: int) -> dict:
+    """Every client streams its turns one after another over one kept-alive connection"""
+    results = {"ttft": [], "total": []}
+    lock = threading.Lock()
+
+    def client(index: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        for turn in range(turns):
+            payload = {"question": f"What is fact number {index * turns + turn}?", "collection": "bench"}
+            start = time.perf_counter()
+            conn.request("POST", "/v1/chat/stream", json.dumps(payload), {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            ttft = None
+            while line := response.readline():
+                if ttft is None and line.startswith(b"event: token"):
+                    ttft = time.perf_counter() - start
+            total = time.perf_counter() - start
+            with lock:
+                results["ttft"].append(ttft)
+                results["total"].append(total)
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["wall"] = time.perf_counter() - start
+    return results
+
+
+def retrieve_overhead(port: int, requests: int, keep_alive: bool, msgpack: bool) -> list:
+    """Latencies of sequential /v1/retrieve requests"""
+    latencies = []
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    for i in range(requests):
+        if not keep_alive:
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        start = time.perf_counter()
+        _post(conn, "/v1/retrieve", {"question": f"topic {i % 17}", "collection": "bench", "k": 5}, msgpack)
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+
+def _ms(values: list, q: float) -> float:
+    return 1000 * float(np.percentile(values, q))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="Sequential retrieve requests per variant")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    args = parser.parse_args()
+
+    llm_logic._embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=384), "fake",
+                                             cache=EmbeddingCache(":memory:"))
+    llm_logic.ANSWER_CACHE_ENABLED = False
+    tokens = [f" token{i}" for i in range(40)]
+    with FakeOllamaServer(tokens, token_delay=args.token_delay) as ollama, \
+            BackgroundServer(create_app(use_cache=False, warm_up=False)) as api:
+        llm_logic.llm.base_url = ollama.url
+        conn = http.client.HTTPConnection("127.0.0.1", api.port, timeout=300)
+        boundary = "bench-boundary"
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="facts.txt"\r\n'
+                f"Content-Type: text/plain\r\n\r\n").encode() + DOCUMENT + f"\r\n--{boundary}--\r\n".encode()
+        conn.request("POST", "/v1/collections/bench/documents?wait=1", body,
+                     {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        conn.getresponse().read()
+        conn.close()
+
+        print(f"Streaming chat: {args.clients} clients x {args.turns} turns, {len(tokens)} tokens per answer")
+        chat = stream_chat(api.port, args.clients, args.turns)
+        answers = len(chat["total"])
+        print(f"   ttft  p50 {_ms(chat['ttft'], 50):7.1f} ms   p99 {_ms(chat['ttft'], 99):7.1f} ms")
+        print(f"   total p50 {_ms(chat['total'], 50):7.1f} ms   p99 {_ms(chat['total'], 99):7.1f} ms")
+        print(f"   {answers} answers in {chat['wall']:.2f} s ({answers / chat['wall']:.1f} answers/s)")
+
+        print(f"\nRetrieve overhead: {args.requests} sequential requests")
+        for keep_alive, msgpack in [(True, False), (True, True), (False, False)]:
+            if msgpack and importlib.util.find_spec("ormsgpack") is None:
+                print("   (msgpack skipped: pip install ormsgpack)")
+                continue
+            latencies = retrieve_overhead(api.port, args.requests, keep_alive, msgpack)
+            label = f"{'keep-alive' if keep_alive else 'new connection':<15}{'msgpack' if msgpack else 'JSON':<8}"
+            print(f"   {label} p50 {_ms(latencies, 50):6.2f} ms   p99 {_ms(latencies, 99):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Chunking benchmark: structure-aware token chunker vs the recursive character splitter
+Loads a synthetic PDF/DOCX/TXT corpus once, then for each chunker measures splitting
+throughput, chunk sizes in tokens, how many tokens end up embedded per token of text
+(overlap inflation), embedding time, and the retrieval hit rate: the fraction of
+questions, each built from one sentence of the corpus, for which a top-k chunk contains
+that whole sentence (a sentence cut in two by a chunk boundary is a miss).
+
+Run with: python bench_chunking.py [--pages 300] [--queries 200] [--k 3] [--repeat 3]
+                                   [--embeddings minilm|fake] [--output bench_chunking.json]
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+
+import numpy as np
+
+import llm_logic
+from bench_e2e import install_embeddings, load_embeddings
+from context_builder import count_tokens
+from ingest import add_chunks, chunk_ids, get_splitter, load_file, spool_uploads
+from synthetic_corpus import make_corpus
+
+CHUNKERS = ("recursive", "structure")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def load_corpus(pages: int) -> list:
+    """(SpooledFile, pages) for each file of a synthetic corpus, parsed once up front"""
+    with spool_uploads(make_corpus(pages)) as files:
+        return [(file, list(load_file(file))) for file in files]
+
+
+def make_sentence_questions(corpus: list, count: int, seed: int = 0) -> list:
+    """
+    (question, sentence) pairs for sentences holding an identifier (ERR-123, v1.2.3): the
+    question keeps the identifier and about half of the other words, in order
+    """
+    rng = random.Random(seed)
+    sentences = [
+        sentence
+        for _, docs in corpus for doc in docs
+        for sentence in re.split(r"(?<=\.)\s+", _normalize(doc.page_content))
+        if len(sentence.split()) >= 8 and any(c.isdigit() for c in sentence)
+    ]
+    questions = []
+    for sentence in rng.sample(sentences, min(count, len(sentences))):
+        words = sentence.rstrip(".").split()
+        keep = set(rng.sample(range(len(words)), len(words) // 2))
+        keep |= {i for i, word in enumerate(words) if any(c.isdigit() for c in word)}
+        questions.append((" ".join(words[i] for i in sorted(keep)) + "?", sentence))
+    return questions
+
+
+def split_corpus(corpus: list, chunker: str) -> list:
+    """(SpooledFile, chunks) per file"""
+    return [
+        (file, get_splitter(file.file_name.split(".")[-1], chunker).split_documents(docs))
+        for file, docs in corpus
+    ]
+
+
+def bench_split(corpus: list, chunker: str, repeat: int) -> tuple:
+    pages = sum(len(docs) for _, docs in corpus)
+    chars = sum(len(doc.page_content) for _, docs in corpus for doc in docs)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        split = split_corpus(corpus, chunker)
+        best = min(best, time.perf_counter() - start)
+
+    tokens = [count_tokens(chunk.page_content) for _, chunks in split for chunk in chunks]
+    text_tokens = sum(count_tokens(doc.page_content) for _, docs in corpus for doc in docs)
+    return split, {
+        "chunks": len(tokens), "seconds": best,
+        "chunks_per_s": len(tokens) / best, "pages_per_s": pages / best, "mb_per_s": chars / best / 1e6,
+        "mean_tokens": float(np.mean(tokens)), "max_tokens": int(np.max(tokens)),
+        "embedded_tokens_per_text_token": sum(tokens) / text_tokens,
+    }
+
+
+def bench_retrieval(split: list, questions: list, k: int) -> dict:
+    """Embed the chunks into a fresh index and check which questions find their sentence"""
+    embeddings = llm_logic.get_embeddings()
+    start = time.perf_counter()
+    vector_store = None
+    for file, chunks in split:
+        vector_store = add_chunks(vector_store, chunks, chunk_ids(file.file_name, file.digest, len(chunks)), embeddings)
+    embed_seconds = time.perf_counter() - start
+
+    def hit_rate(results) -> float:
+        hits = sum(
+            any(sentence in _normalize(doc.page_content) for doc in docs)
+            for docs, (_, sentence) in zip(results, questions)
+        )
+        return hits / len(questions)
+
+    texts = [question for question, _ in questions]
+    retrieved = [[source.document for source in sources] for sources in llm_logic.retrieve_batch(texts, vector_store, k)]
+    lexical = [[doc for doc, _ in vector_store.lexical_search(text, k=k)] for text in texts]
+    return {
+        "embed_seconds": embed_seconds, "k": k, "mode": llm_logic.RETRIEVAL_MODE,
+        "hit_rate": hit_rate(retrieved), "lexical_hit_rate": hit_rate(lexical),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="Splitting runs per chunker (best is kept)")
+    parser.add_argument("--embeddings", choices=["minilm", "fake"], default="minilm",
+                        help="'fake' skips the model; hit rates then only mean something for lexical search")
+    parser.add_argument("--output", default="bench_chunking.json")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.pages)
+    questions = make_sentence_questions(corpus, args.queries)
+    base_embeddings = load_embeddings(args.embeddings)
+
+    print(f"📊 Chunking benchmark: {args.pages} pages, {len(questions)} questions, "
+          f"{args.embeddings} embeddings, top-{args.k}")
+    print("-" * 60)
+    results = {"args": vars(args), "results": {}}
+    for chunker in CHUNKERS:
+        install_embeddings(base_embeddings)
+        split, stats = bench_split(corpus, chunker, args.repeat)
+        stats.update(bench_retrieval(split, questions, args.k))
+        results["results"][chunker] = stats
+        print(f"   {chunker:<10} {stats['chunks']:6d} chunks  {stats['chunks_per_s']:9.0f} chunks/s  "
+              f"{stats['mb_per_s']:6.2f} MB/s  tokens mean {stats['mean_tokens']:5.0f} max {stats['max_tokens']:4d}")
+        print(f"   {'':<10} embedded {stats['embedded_tokens_per_text_token']:.2f}x the text's tokens in "
+              f"{stats['embed_seconds']:.2f}s  hit rate {stats['hit_rate']:.1%} ({stats['mode']}), "
+              f"{stats['lexical_hit_rate']:.1%} (BM25)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("-" * 60)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+End-to-end benchmark: ingestion, retrieval and generation on synthetic corpora
+For each corpus size (in pages of ~400 words, split over PDF, DOCX and TXT files) it
+measures process_documents throughput and peak memory, similarity_search / hybrid_search QPS
+and latency percentiles, retrieve() vs batched retrieve_batch() QPS, and get_rag_result latency against a
+deterministic fake Ollama server. Results are written as JSON; pass --baseline with the
+JSON of an earlier commit to print the change.
+
+Run with: python bench_e2e.py [--sizes 30,150,600] [--queries 200] [--rag-queries 20] [--batch-size 32]
+                              [--embeddings minilm|fake] [--output bench_e2e.json] [--baseline old.json]
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import llm_logic
+from fake_ollama import FakeOllamaServer
+from synthetic_corpus import make_corpus, make_questions
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Metrics compared against --baseline: (section, key, higher_is_better)
+KEY_METRICS = [
+    ("ingest", "pages_per_s", True),
+    ("ingest", "chunks_per_s", True),
+    ("similarity_search", "qps", True),
+    ("similarity_search", "p99_ms", False),
+    ("hybrid_search", "qps", True),
+    ("hybrid_search", "p99_ms", False),
+    ("batch_retrieval", "qps", True),
+    ("rag", "p50_ms", False),
+    ("rag", "p99_ms", False),
+    ("memory", "ingest_peak_mb", False),
+]
+
+
+def _proc_status_mb(field: str) -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Restart the memory high-water mark, so each corpus size gets its own peak (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of this process's resident memory (None where unsupported)"""
+    # VmHWM honours reset_peak_rss; ru_maxrss never goes down
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None or resource is None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(latencies_ms: list) -> dict:
+    values = np.asarray(latencies_ms)
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def load_embeddings(kind: str):
+    """MiniLM as configured in llm_logic, or a deterministic fake of the same dimension"""
+    from embedding_engine import EMBED_BATCH_SIZE
+    if kind == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=384)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=llm_logic.EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': EMBED_BATCH_SIZE}
+    )
+
+
+def install_embeddings(base):
+    """Give llm_logic the embeddings model with an empty in-memory cache, so nothing is pre-embedded"""
+    from embedding_engine import EMBED_BATCH_SIZE, CachedEmbeddings, EmbeddingCache
+    llm_logic._embeddings = CachedEmbeddings(
+        base, llm_logic.EMBEDDING_MODEL_NAME, EMBED_BATCH_SIZE, EmbeddingCache(":memory:")
+    )
+
+
+def bench_ingest(files: list, pages: int) -> tuple:
+    """Ingestion throughput, and how far above its starting point the process's memory peaked"""
+    rss_before = _proc_status_mb("VmRSS")
+    reset_peak_rss()
+    start = time.perf_counter()
+    vector_store = llm_logic.process_documents(files, use_cache=False)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    chunks = vector_store.index.ntotal
+    memory = {"ingest_peak_mb": peak - rss_before if peak is not None and rss_before is not None else None}
+    return vector_store, memory, {
+        "files": len(files), "pages": pages, "chunks": chunks,
+        "bytes": sum(f.size for f in files), "seconds": elapsed,
+        "pages_per_s": pages / elapsed, "chunks_per_s": chunks / elapsed,
+    }
+
+
+def bench_search(search, questions: list) -> dict:
+    for question in questions[:5]:
+        search(question)  # warm up
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        search(question)
+        latencies.append(1000 * (time.perf_counter() - start))
+    return {"queries": len(questions), "qps": 1000 * len(latencies) / sum(latencies), **percentiles(latencies)}
+
+
+def bench_batch_retrieval(vector_store, questions: list, batch_size: int) -> dict:
+    """retrieve() per question (cold and cached query embeddings) vs retrieve_batch()"""
+    embeddings = llm_logic.get_embeddings()
+
+    def qps(run) -> float:
+        start = time.perf_counter()
+        run()
+        return len(questions) / (time.perf_counter() - start)
+
+    embeddings.clear_query_cache()
+    sequential = qps(lambda: [llm_logic.retrieve(question, vector_store) for question in questions])
+    cached = qps(lambda: [llm_logic.retrieve(question, vector_store) for question in questions])
+    embeddings.clear_query_cache()
+    batched = qps(lambda: [llm_logic.retrieve_batch(questions[start:start + batch_size], vector_store)
+                           for start in range(0, len(questions), batch_size)])
+    return {"batch_size": batch_size, "sequential_qps": sequential, "cached_qps": cached, "qps": batched}
+
+
+def bench_rag(vector_store, questions: list) -> dict:
+    results = [llm_logic.get_rag_result(question, vector_store) for question in questions]
+    breakdown = {
+        f"mean_{name}": float(np.mean([getattr(r.timings, name) for r in results]))
+        for name in ("embed_ms", "search_ms", "prompt_ms", "ttft_ms")
+    }
+    return {"queries": len(questions), **percentiles([r.timings.total_ms for r in results]), **breakdown}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    """Print the relative change of KEY_METRICS per corpus size"""
+    before = {run["pages"]: run for run in baseline["results"]}
+    print(f"📊 Change vs baseline {baseline['meta'].get('commit') or ''}")
+    print("-" * 60)
+    for run in results["results"]:
+        old = before.get(run["pages"])
+        if old is None:
+            continue
+        for section, key, higher_is_better in KEY_METRICS:
+            new_value, old_value = run[section].get(key), old[section].get(key)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = change < -0.1 if higher_is_better else change > 0.1
+            print(f"   {run['pages']:>5} pages  {section + '.' + key:<28} {old_value:10.2f} -> "
+                  f"{new_value:10.2f}  {change:+7.1%} {'⚠️' if worse else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="30,150,600", help="Corpus sizes in pages, comma-separated")
+    parser.add_argument("--pages-per-file", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rag-queries", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32, help="Questions per retrieve_batch call")
+    parser.add_argument("--embeddings", choices=["minilm", "fake"], default="minilm",
+                        help="'fake' skips the model to measure pipeline overhead only")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--output", default="bench_e2e.json")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare with")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    llm_logic.ANSWER_CACHE_ENABLED = False
+    questions = make_questions(args.queries)
+    tokens = [f"token{i} " for i in range(40)]
+
+    results = {
+        "meta": {
+            "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "embeddings": args.embeddings, "args": vars(args),
+        },
+        "results": [],
+    }
+
+    with FakeOllamaServer(tokens, args.first_token_delay, args.token_delay) as server:
+        llm_logic.get_llm().base_url = server.url
+        # Load the model and start the worker pool outside the measurements
+        base_embeddings = load_embeddings(args.embeddings)
+        install_embeddings(base_embeddings)
+        llm_logic.process_documents(make_corpus(3, seed=99), use_cache=False)
+
+        print(f"📊 End-to-end benchmark ({args.embeddings} embeddings), sizes {sizes} pages")
+        print("-" * 60)
+        for pages in sizes:
+            install_embeddings(base_embeddings)
+            files = make_corpus(pages, args.pages_per_file)
+            vector_store, memory, ingest = bench_ingest(files, pages)
+            run = {
+                "pages": pages,
+                "ingest": ingest,
+                "similarity_search": bench_search(lambda q: vector_store.similarity_search(q, k=3), questions),
+                "hybrid_search": bench_search(lambda q: vector_store.hybrid_search(q, k=3), questions),
+                "batch_retrieval": bench_batch_retrieval(vector_store, questions, args.batch_size),
+                "rag": bench_rag(vector_store, questions[:args.rag_queries]),
+                "memory": memory,
+            }
+            memory["peak_rss_mb"] = peak_rss_mb()
+            results["results"].append(run)
+
+            print(f"   {pages} pages: {ingest['files']} files, {ingest['chunks']} chunks")
+            print(f"      ingest   {ingest['seconds']:7.2f}s  {ingest['pages_per_s']:8.1f} pages/s  "
+                  f"{ingest['chunks_per_s']:8.1f} chunks/s")
+            for name in ("similarity_search", "hybrid_search"):
+                stats = run[name]
+                print(f"      {name:<18} {stats['qps']:8.0f} QPS  p50 {stats['p50_ms']:6.2f} ms  "
+                      f"p99 {stats['p99_ms']:6.2f} ms")
+            batch = run["batch_retrieval"]
+            print(f"      retrieve {batch['sequential_qps']:8.0f} QPS, repeated {batch['cached_qps']:8.0f} QPS, "
+                  f"batches of {batch['batch_size']} {batch['qps']:8.0f} QPS")
+            rag = run["rag"]
+            print(f"      rag      p50 {rag['p50_ms']:6.0f} ms  p99 {rag['p99_ms']:6.0f} ms  "
+                  f"(embed {rag['mean_embed_ms']:.1f}, search {rag['mean_search_ms']:.1f}, "
+                  f"prompt {rag['mean_prompt_ms']:.1f}, first token {rag['mean_ttft_ms']:.0f} ms)")
+            if memory["ingest_peak_mb"] is not None:
+                print(f"      memory   ingestion peak +{memory['ingest_peak_mb']:.0f} MB, "
+                      f"peak RSS {memory['peak_rss_mb']:.0f} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("-" * 60)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Embedding throughput benchmark: plain HuggingFaceEmbeddings vs CachedEmbeddings
+Uses a synthetic corpus where a share of chunks are repeated boilerplate, like
+headers/footers in real PDFs.
+
+Run with: python bench_embeddings.py [--chunks 2000] [--duplicate-ratio 0.3] [--batch-size 32]
+"""
+
+import argparse
+import random
+import time
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+
+WORDS = (
+    "system model data index query vector document page section table figure result "
+    "method value error network memory process thread request response latency cache"
+).split()
+
+
+def make_chunks(count: int, duplicate_ratio: float, seed: int = 0) -> list:
+    """Random chunks of 20-200 words, with duplicate_ratio of them drawn from a few boilerplate texts"""
+    rng = random.Random(seed)
+    boilerplate = [
+        "Confidential - internal use only. Page footer.",
+        "Copyright 2024 Example Corp. All rights reserved.",
+        "This page intentionally left blank.",
+    ]
+    chunks = []
+    for i in range(count):
+        if rng.random() < duplicate_ratio:
+            chunks.append(rng.choice(boilerplate))
+        else:
+            chunks.append(f"{i} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 200))))
+    return chunks
+
+
+def run(label: str, embed, chunks: list) -> float:
+    start = time.perf_counter()
+    embed(chunks)
+    elapsed = time.perf_counter() - start
+    rate = len(chunks) / elapsed
+    print(f"   {label:<32} {elapsed:7.2f}s  {rate:8.1f} chunks/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    base = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': args.batch_size}
+    )
+    chunks = make_chunks(args.chunks, args.duplicate_ratio)
+    base.embed_documents(chunks[:8])  # warm up
+
+    print(f"📊 Embedding {len(chunks)} chunks ({args.duplicate_ratio:.0%} boilerplate)")
+    print("-" * 60)
+    before = run("HuggingFaceEmbeddings", base.embed_documents, chunks)
+
+    cached = CachedEmbeddings(base, model_name, args.batch_size, EmbeddingCache(":memory:"))
+    cold = run("CachedEmbeddings (cold cache)", cached.embed_array, chunks)
+    warm = run("CachedEmbeddings (warm cache)", cached.embed_array, chunks)
+    print("-" * 60)
+    print(f"   Speedup: {cold / before:.1f}x cold, {warm / before:.1f}x warm")
+    print(f"   Stats: {cached.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Import-time benchmark for llm_logic, based on `python -X importtime`
+Each run uses a fresh interpreter so nothing is cached in sys.modules.
+
+Run with: python bench_import.py [--module llm_logic] [--runs 5] [--top 15] [--max-ms 500]
+Exits with status 1 when the median import time exceeds --max-ms, so it can guard
+against startup regressions.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Modules that must not be loaded just by importing llm_logic
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "faiss", "langchain_community.llms"]
+
+
+def import_profile(module: str) -> tuple:
+    """
+    Import a module in a fresh interpreter with -X importtime
+
+    Returns:
+        (total_us, {module_name: (self_us, cumulative_us)}, [heavy modules that got imported])
+    """
+    check = f"import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}; {check}"],
+        capture_output=True, text=True, check=True
+    )
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+
+    heavy = [m for m in result.stdout.strip().split(",") if m]
+    return timings[module][1], timings, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="llm_logic")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        total_us, timings, heavy = import_profile(args.module)
+        totals.append(total_us / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"⏱️  import {args.module}: median {median_ms:.1f} ms "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}, {args.runs} runs)")
+    print("-" * 60)
+    print(f"   Slowest imports (cumulative, last run):")
+    slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:args.top]:
+        print(f"   {cumulative_us / 1000:9.1f} ms  {name}")
+    print("-" * 60)
+
+    if heavy:
+        print(f"⚠️  Heavy modules loaded at import time: {', '.join(heavy)}")
+    else:
+        print("✅ No heavy modules loaded at import time")
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"❌ Median import time {median_ms:.1f} ms exceeds budget of {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
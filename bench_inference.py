@@ -0,0 +1,135 @@
+"""
+Load test for the inference path: simulated chat users against a fake Ollama server
+Each regular user sends --turns questions one after another with some think time and
+streams every answer. Heavy users fire all their turns at once, like a script or a user
+hammering the send button. The fake server generates --server-parallel requests at a
+time, like OLLAMA_NUM_PARALLEL. Reports p50/p99 time-to-first-token and total latency
+for regular users, calling Ollama directly (one request per user, no queueing) and
+through the InferenceService.
+
+Run with: python bench_inference.py [--users 8] [--heavy-users 1] [--turns 5] [--max-inflight 2]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+from fake_ollama import FakeOllamaServer
+from inference_service import InferenceService, ServiceBusyError
+
+MODEL_NAME = "gemma3:1b"
+
+
+def simulate(stream_fn, users: int, heavy_users: int, turns: int, think_time: float, seed: int = 0) -> dict:
+    """
+    Run the simulated users to completion
+
+    Args:
+        stream_fn: callable(session_id, prompt) -> token iterator
+        users: Regular users (sequential turns with think time)
+        heavy_users: Users sending all their turns concurrently
+        turns: Questions per user
+        think_time: Maximum seconds a regular user waits between turns
+
+    Returns:
+        Dict with ttft/total latency lists for regular users, rejected count and wall time
+    """
+    results = {"ttft": [], "total": [], "rejected": 0}
+    lock = threading.Lock()
+
+    def ask(session_id: str, prompt: str, record: bool):
+        start = time.perf_counter()
+        ttft = None
+        try:
+            for _ in stream_fn(session_id, prompt):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+        except ServiceBusyError:
+            with lock:
+                results["rejected"] += 1
+            return
+        total = time.perf_counter() - start
+        if record:
+            with lock:
+                results["ttft"].append(ttft)
+                results["total"].append(total)
+
+    def regular_user(user: int):
+        rng = random.Random(seed + user)
+        for turn in range(turns):
+            time.sleep(rng.uniform(0, think_time))
+            ask(f"user-{user}", f"user {user} question {turn}", record=True)
+
+    def heavy_user(user: int):
+        burst = [threading.Thread(target=ask, args=(f"heavy-{user}", f"heavy {user} question {turn}", False))
+                 for turn in range(turns)]
+        for thread in burst:
+            thread.start()
+        for thread in burst:
+            thread.join()
+
+    threads = [threading.Thread(target=regular_user, args=(u,)) for u in range(users)]
+    threads += [threading.Thread(target=heavy_user, args=(u,)) for u in range(heavy_users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["wall"] = time.perf_counter() - start
+    return results
+
+
+def report(label: str, results: dict):
+    ttft_ms = 1000 * np.array(results["ttft"])
+    total_ms = 1000 * np.array(results["total"])
+    print(f"   {label:<18} {np.percentile(ttft_ms, 50):8.0f} {np.percentile(ttft_ms, 99):8.0f} "
+          f"{np.percentile(total_ms, 50):9.0f} {np.percentile(total_ms, 99):9.0f} "
+          f"{results['rejected']:9d} {results['wall']:7.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--heavy-users", type=int, default=1)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--first-token-delay", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--server-parallel", type=int, default=2)
+    parser.add_argument("--max-inflight", type=int, default=2)
+    args = parser.parse_args()
+
+    tokens = [f"token{i} " for i in range(args.tokens)]
+    print(f"📊 {args.users} users + {args.heavy_users} heavy users x {args.turns} turns, "
+          f"server parallel {args.server_parallel}")
+    print("-" * 60)
+    print(f"   {'mode':<18} {'TTFT p50':>8} {'TTFT p99':>8} {'total p50':>9} {'total p99':>9} "
+          f"{'rejected':>9} {'wall':>8}")
+
+    with FakeOllamaServer(tokens, args.first_token_delay, args.token_delay, args.server_parallel) as server:
+        from langchain_community.llms import Ollama
+        llm = Ollama(model=MODEL_NAME, base_url=server.url)
+
+        def direct(session_id, prompt):
+            return llm.stream(prompt)
+
+        report("direct", simulate(direct, args.users, args.heavy_users, args.turns, args.think_time))
+
+        service = InferenceService(max_inflight=args.max_inflight).start()
+        url = f"{server.url}/api/generate"
+
+        def via_service(session_id, prompt):
+            return service.stream(url, {"model": MODEL_NAME, "prompt": prompt}, session_id=session_id)
+
+        report("InferenceService", simulate(via_service, args.users, args.heavy_users, args.turns, args.think_time))
+        print("-" * 60)
+        print(f"   Service stats: {service.stats()}")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Reranking benchmark: recall gain and added latency of the cross-encoder stage
+Indexes a synthetic corpus, retrieves RERANK_CANDIDATES chunks per question with the
+first stage, and compares recall@k (a top-k chunk contains the sentence the question was
+built from, see bench_chunking) before and after reranking, for several latency budgets.
+Also reports the time the stage adds (p50/p95/p99) and how often the budget ran out.
+
+Run with: python bench_rerank.py [--pages 300] [--queries 200] [--k 3] [--budgets 50,150,1000]
+                                 [--embeddings minilm|fake] [--scorer cross-encoder|overlap]
+"""
+
+import argparse
+import json
+import time
+
+import llm_logic
+from bench_chunking import load_corpus, make_sentence_questions, split_corpus, _normalize
+from bench_e2e import install_embeddings, load_embeddings, percentiles
+from ingest import add_chunks, chunk_ids
+from reranker import RERANK_CANDIDATES, RERANK_MODEL_NAME, Reranker
+
+
+class OverlapScorer:
+    """
+    Stand-in for the cross-encoder when its weights are not available: the share of the
+    question's words found in the passage. Exercises the batching and budget logic only;
+    its recall says nothing about the model's.
+    """
+
+    def predict(self, pairs: list, batch_size: int = 32) -> list:
+        scores = []
+        for question, passage in pairs:
+            words = set(question.lower().rstrip("?").split())
+            scores.append(len(words & set(passage.lower().split())) / (len(words) or 1))
+        return scores
+
+
+def build_index(corpus: list):
+    vector_store = None
+    embeddings = llm_logic.get_embeddings()
+    for file, chunks in split_corpus(corpus, "structure"):
+        vector_store = add_chunks(vector_store, chunks, chunk_ids(file.file_name, file.digest, len(chunks)), embeddings)
+    return vector_store
+
+
+def recall(rankings: list, questions: list, k: int) -> float:
+    hits = sum(
+        any(sentence in _normalize(source.document.page_content) for source in sources[:k])
+        for sources, (_, sentence) in zip(rankings, questions)
+    )
+    return hits / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3, help="Chunks that reach the prompt")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES)
+    parser.add_argument("--budgets", default="50,150,1000", help="Latency budgets in ms, comma-separated")
+    parser.add_argument("--embeddings", choices=["minilm", "fake"], default="minilm")
+    parser.add_argument("--scorer", choices=["cross-encoder", "overlap"], default="cross-encoder",
+                        help=f"'cross-encoder' loads {RERANK_MODEL_NAME}; 'overlap' is a model-free stand-in")
+    parser.add_argument("--output", default="bench_rerank.json")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.pages)
+    questions = make_sentence_questions(corpus, args.queries)
+    install_embeddings(load_embeddings(args.embeddings))
+    vector_store = build_index(corpus)
+    texts = [question for question, _ in questions]
+    first_stage = llm_logic.retrieve_batch(texts, vector_store, args.candidates)
+
+    scorer = OverlapScorer() if args.scorer == "overlap" else None
+    print(f"📊 Reranking benchmark: {args.pages} pages, {len(questions)} questions, "
+          f"{args.candidates} candidates, recall@{args.k} ({args.embeddings} embeddings, {args.scorer})")
+    print("-" * 60)
+    baseline = recall(first_stage, questions, args.k)
+    print(f"   first stage only        recall@{args.k} {baseline:6.1%}   "
+          f"recall@{args.candidates} {recall(first_stage, questions, args.candidates):6.1%}")
+
+    results = {"args": vars(args), "first_stage_recall": baseline, "budgets": []}
+    for budget in (float(b) for b in args.budgets.split(",")):
+        reranker = Reranker(model=scorer, budget_ms=budget)
+        reranker.load()
+        rankings, latencies, scored = [], [], 0
+        for question, sources in zip(texts, first_stage):
+            start = time.perf_counter()
+            ranked, stats = reranker.rerank(question, list(sources))
+            latencies.append(1000 * (time.perf_counter() - start))
+            rankings.append(ranked)
+            scored += stats.scored
+        run = {
+            "budget_ms": budget, "recall": recall(rankings, questions, args.k),
+            "budget_exhausted": reranker.stats["budget"] / len(texts),
+            "scored_per_question": scored / len(texts), **percentiles(latencies),
+        }
+        results["budgets"].append(run)
+        print(f"   budget {budget:6.0f} ms        recall@{args.k} {run['recall']:6.1%} "
+              f"({run['recall'] - baseline:+.1%})  added p50 {run['p50_ms']:6.1f} ms  p99 {run['p99_ms']:6.1f} ms  "
+              f"scored {run['scored_per_question']:.1f}/{args.candidates}, budget ran out {run['budget_exhausted']:.0%}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("-" * 60)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
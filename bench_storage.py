@@ -0,0 +1,135 @@
+"""
+Storage benchmark: bytes per chunk and recall of the vector encodings and docstore layouts
+Vectors: builds a flat index in each encoding of ann_index.VECTOR_ENCODINGS (and binary
+without re-scoring) over a synthetic clustered corpus of unit vectors (see bench_ann) and
+reports bytes per vector, search latency and recall@k against exact float32 search.
+Docstore: saves the chunks of a synthetic PDF/DOCX/TXT corpus with langchain's pickled
+InMemoryDocstore and with CompactDocstore, loads each back as a shared index would, and
+reports the Python heap it takes per chunk, the text left in the memory map, and lookup time.
+
+Run with: python bench_storage.py [--vectors 100000] [--queries 500] [--k 10] [--pages 600]
+                                  [--output bench_storage.json]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from ann_index import BINARY_RESCORE, VECTOR_ENCODINGS, build_index
+from bench_ann import make_corpus, measure, recall_at_k
+from bench_chunking import load_corpus, split_corpus
+from compact_docstore import CompactDocstore
+
+
+def bench_vectors(vectors: np.ndarray, queries: np.ndarray, k: int) -> dict:
+    results, truth = {}, None
+    # "binary-bits" skips the int8 re-scoring: only the sign bits are stored
+    for name in VECTOR_ENCODINGS + ("binary-bits",):
+        encoding, rescore = ("binary", 0) if name == "binary-bits" else (name, BINARY_RESCORE)
+        index = build_index(vectors, "flat", encoding=encoding, binary_rescore=rescore)
+        found, mean_ms, p99_ms = measure(index, queries, k)
+        truth = found if truth is None else truth
+        results[name] = {
+            "bytes_per_vector": faiss.serialize_index(index).nbytes / len(vectors),
+            "mean_ms": mean_ms, "p99_ms": p99_ms, "recall": recall_at_k(found, truth),
+        }
+    return results
+
+
+def _heap_bytes(load) -> tuple:
+    """(result of load(), bytes it left allocated on the Python heap)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = load()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def _lookup_us(docstore, ids: list) -> float:
+    start = time.perf_counter()
+    for doc_id in ids:
+        docstore.search(doc_id)
+    return 1e6 * (time.perf_counter() - start) / len(ids)
+
+
+def bench_docstore(chunks: list, folder: str) -> dict:
+    ids = [f"{i:016x}-{i}" for i in range(len(chunks))]
+    documents = [Document(id=doc_id, page_content=c.page_content, metadata=c.metadata) for doc_id, c in zip(ids, chunks)]
+    text_bytes = sum(len(doc.page_content.encode()) for doc in documents)
+    sample = [ids[i] for i in np.random.default_rng(0).integers(0, len(ids), 2000)]
+
+    # What HybridFAISS.load_local held before: an unpickled docstore plus the position -> ID dict
+    pickled = pickle.dumps((InMemoryDocstore(dict(zip(ids, documents))), dict(enumerate(ids))))
+    (memory_store, _), memory_heap = _heap_bytes(lambda: pickle.loads(pickled))
+
+    CompactDocstore.from_documents(ids, documents).save(folder)
+    compact_store, compact_heap = _heap_bytes(lambda: CompactDocstore.load(folder))
+    positions, positions_heap = _heap_bytes(compact_store.positions)
+    assert all(compact_store.search(doc_id) == memory_store.search(doc_id) for doc_id in sample)
+
+    return {
+        "chunks": len(documents), "text_bytes_per_chunk": text_bytes / len(documents),
+        "memory": {"heap_bytes_per_chunk": memory_heap / len(documents), "mapped_bytes_per_chunk": 0,
+                   "lookup_us": _lookup_us(memory_store, sample)},
+        "compact": {"heap_bytes_per_chunk": (compact_heap + positions_heap) / len(documents),
+                    "mapped_bytes_per_chunk": os.path.getsize(os.path.join(folder, "index.text")) / len(documents),
+                    "lookup_us": _lookup_us(compact_store, sample)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=600, help="Synthetic corpus size for the docstore")
+    parser.add_argument("--output", default="bench_storage.json")
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.vectors, args.queries, args.dim)
+    print(f"📊 Vectors: {args.vectors} x {args.dim} dims, {args.queries} queries, recall@{args.k} vs float32")
+    print("-" * 60)
+    vector_results = bench_vectors(vectors, queries, args.k)
+    for encoding, stats in vector_results.items():
+        print(f"   {encoding:<11} {stats['bytes_per_vector']:7.0f} B/vector  {stats['mean_ms']:7.3f} ms/query  "
+              f"recall {stats['recall']:.3f}")
+
+    chunks = [chunk for _, file_chunks in split_corpus(load_corpus(args.pages), "structure") for chunk in file_chunks]
+    with tempfile.TemporaryDirectory() as folder:
+        docstore_results = bench_docstore(chunks, folder)
+    print(f"\n📊 Docstore: {docstore_results['chunks']} chunks of "
+          f"{docstore_results['text_bytes_per_chunk']:.0f} B of text, as loaded from the index cache")
+    print("-" * 60)
+    for layout in ("memory", "compact"):
+        stats = docstore_results[layout]
+        print(f"   {layout:<8} {stats['heap_bytes_per_chunk']:7.0f} B/chunk on the heap  "
+              f"{stats['mapped_bytes_per_chunk']:5.0f} B/chunk mapped  {stats['lookup_us']:6.1f} µs/lookup")
+
+    print("\n📊 Per chunk, vectors + docstore heap")
+    print("-" * 60)
+    for layout, encoding in (("memory", "float32"), ("compact", "float32"), ("compact", "int8"), ("compact", "binary"),
+                             ("compact", "binary-bits")):
+        total = vector_results[encoding]["bytes_per_vector"] + docstore_results[layout]["heap_bytes_per_chunk"]
+        print(f"   {layout:<8} docstore, {encoding:<11} vectors  {total:7.0f} B/chunk  "
+              f"recall {vector_results[encoding]['recall']:.3f}")
+
+    with open(args.output, "w") as f:
+        json.dump({"args": vars(args), "vectors": vector_results, "docstore": docstore_results}, f, indent=2)
+    print("-" * 60)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
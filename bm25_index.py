@@ -0,0 +1,169 @@
+"""
+Lexical BM25 index with compact array-backed postings, plus reciprocal-rank fusion
+MiniLM often misses exact matches on identifiers, part numbers and error codes; this
+index catches them and is fused with the dense FAISS results.
+"""
+
+import math
+import re
+from array import array
+
+import numpy as np
+
+# Words, plus compound tokens such as ERR-404, v1.2.3, foo_bar or 10.0.0.1
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+
+def tokenize(text: str) -> list:
+    """Lowercased tokens; compound tokens are kept whole and also split into their parts"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./:_]", token) if part)
+    return tokens
+
+
+class BM25Index:
+    """
+    Append-only inverted index scored with BM25
+
+    Each term's postings are two int32 arrays (internal doc numbers and term frequencies)
+    that grow with array.append and are viewed as numpy arrays at query time without
+    copying. Removed documents are tombstoned and dropped on compact().
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.terms = {}            # term -> term number
+        self.postings_docs = []    # term number -> array('i') of doc numbers
+        self.postings_tfs = []     # term number -> array('i') of term frequencies
+        self.doc_lengths = array('i')
+        self.doc_ids = []          # doc number -> docstore id
+        self.doc_numbers = {}      # docstore id -> doc number
+        self.deleted = set()
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids) - len(self.deleted)
+
+    def add(self, doc_ids: list, texts: list):
+        """Index texts under their docstore IDs"""
+        for doc_id, text in zip(doc_ids, texts):
+            if doc_id in self.doc_numbers:
+                raise ValueError(f"Document {doc_id} is already indexed")
+            doc = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self.doc_numbers[doc_id] = doc
+
+            counts = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term = self.terms.get(token)
+                if term is None:
+                    term = self.terms[token] = len(self.postings_docs)
+                    self.postings_docs.append(array('i'))
+                    self.postings_tfs.append(array('i'))
+                self.postings_docs[term].append(doc)
+                self.postings_tfs[term].append(tf)
+
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+
+    def remove(self, doc_ids: list):
+        """Tombstone documents; compacts automatically once a quarter of the index is dead"""
+        for doc_id in doc_ids:
+            doc = self.doc_numbers.pop(doc_id, None)
+            if doc is not None and doc not in self.deleted:
+                self.deleted.add(doc)
+                self.total_length -= self.doc_lengths[doc]
+        if self.deleted and len(self.deleted) * 4 >= len(self.doc_ids):
+            self.compact()
+
+    def compact(self):
+        """Rebuild the postings without tombstoned documents"""
+        live = [(doc_id, doc) for doc, doc_id in enumerate(self.doc_ids) if doc not in self.deleted]
+        remap = np.full(len(self.doc_ids), -1, dtype=np.int32)
+        remap[[doc for _, doc in live]] = np.arange(len(live), dtype=np.int32)
+
+        terms, postings_docs, postings_tfs = {}, [], []
+        for token, term in self.terms.items():
+            docs = remap[np.frombuffer(self.postings_docs[term], dtype=np.int32)]
+            keep = docs >= 0
+            if not keep.any():
+                continue
+            terms[token] = len(postings_docs)
+            postings_docs.append(array('i', docs[keep].tobytes()))
+            postings_tfs.append(array('i', np.frombuffer(self.postings_tfs[term], dtype=np.int32)[keep].tobytes()))
+
+        self.terms, self.postings_docs, self.postings_tfs = terms, postings_docs, postings_tfs
+        self.doc_lengths = array('i', [self.doc_lengths[doc] for _, doc in live])
+        self.doc_ids = [doc_id for doc_id, _ in live]
+        self.doc_numbers = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self.deleted = set()
+
+    def search(self, query: str, k: int = 10) -> list:
+        """
+        Top-k documents by BM25
+
+        Returns:
+            List of (docstore_id, score), best first; only documents matching a query term
+        """
+        n_docs = len(self)
+        if n_docs == 0:
+            return []
+
+        avg_length = self.total_length / n_docs
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.int32)
+        matched = None
+        for token in set(tokenize(query)):
+            term = self.terms.get(token)
+            if term is None:
+                continue
+            docs = np.frombuffer(self.postings_docs[term], dtype=np.int32)
+            tfs = np.frombuffer(self.postings_tfs[term], dtype=np.int32).astype(np.float32)
+            df = len(docs)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / avg_length)
+            term_scores = idf * tfs * (self.k1 + 1) / (tfs + norm)
+            if matched is None:
+                matched = np.zeros(len(self.doc_ids), dtype=np.float32)
+            matched[docs] += term_scores
+
+        if matched is None:
+            return []
+        if self.deleted:
+            matched[list(self.deleted)] = 0
+
+        candidates = np.flatnonzero(matched)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-matched[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-matched[candidates])]
+        return [(self.doc_ids[doc], float(matched[doc])) for doc in candidates]
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = None, rrf_k: int = RRF_K) -> list:
+    """
+    Fuse ranked ID lists: score(id) = sum over lists of 1 / (rrf_k + rank)
+
+    Args:
+        rankings: List of ranked ID lists (best first)
+        k: Number of results to return (all if None)
+
+    Returns:
+        List of (id, fused_score), best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ordered[:k] if k is not None else ordered
@@ -0,0 +1,235 @@
+"""
+Structure-aware document chunking measured in tokens
+Each page is token-counted once (context_builder.token_prefix) and read once, line by
+line, into headings and sentences, which are packed into chunks of up to `chunk_tokens`
+tokens. Chunks never span pages, a heading always starts a new chunk (and names the
+chunk's section), and a full chunk is cut at a paragraph break when one is close enough,
+otherwise between sentences. Only chunks cut inside a paragraph repeat up to
+`overlap_tokens` tokens of the sentences before the cut, so most chunks carry no overlap.
+"""
+import heapq
+import re
+from dataclasses import dataclass
+from typing import Iterator
+
+from context_builder import token_prefix
+
+
+@dataclass(frozen=True)
+class ChunkConfig:
+    """
+    Chunking parameters for one file type
+
+    Attributes:
+        chunk_tokens: Largest chunk, in tokens (see context_builder.count_tokens)
+        overlap_tokens: Tokens repeated from the previous chunk when a cut falls inside a
+            paragraph; cuts at headings and paragraph breaks are not overlapped
+    """
+    chunk_tokens: int = 256
+    overlap_tokens: int = 32
+
+    def __str__(self) -> str:
+        return f"{self.chunk_tokens}/{self.overlap_tokens}"
+
+
+# Per file type. PDF text comes back as wrapped lines without paragraph breaks, so most of
+# its cuts land mid-paragraph and rely on the overlap; DOCX and TXT keep their paragraphs
+CHUNK_CONFIGS = {
+    'pdf': ChunkConfig(chunk_tokens=256, overlap_tokens=32),
+    'docx': ChunkConfig(chunk_tokens=256, overlap_tokens=16),
+    'txt': ChunkConfig(chunk_tokens=256, overlap_tokens=16),
+}
+DEFAULT_CONFIG = ChunkConfig()
+
+# A full chunk is cut at its last paragraph break if that keeps at least this fraction
+# of it; otherwise between sentences
+PARAGRAPH_CUT_MIN_FILL = 0.5
+
+# Headings: markdown, numbered ("2.1 Scope"), named ("Section 3: ...", "Chapter IV") or
+# all-caps lines; never a line holding or ending a sentence
+_HEADING_PATTERN = re.compile(
+    r"#{1,6}\s+\S"
+    r"|\d+(?:\.\d+)*\.?\s+[A-Z]"
+    r"|(?:Chapter|Section|Part|Appendix|CHAPTER|SECTION|PART|APPENDIX)\s+(?:\d+|[IVXLC]+|[A-Z])\b"
+)
+_MAX_HEADING_CHARS = 100
+_SENTENCE_BREAK = re.compile(r"[.!?]\s+")
+_SENTENCE_END = re.compile(r"[.!?]\s")
+_WORD = re.compile(r"\S+")
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*(?:\n[ \t]*)+")
+# Lines that may be headings (checked with is_heading): no lowercase, or a heading prefix
+_HEADING_CANDIDATE = re.compile(
+    r"^[ \t]*(?:[#\d]|Chapter|Section|Part|Appendix|[^a-z\n]+$)[^\n]*$", re.MULTILINE
+)
+
+
+def is_heading(line: str) -> bool:
+    """Whether a stripped line looks like a heading"""
+    if not line or len(line) > _MAX_HEADING_CHARS or line[-1] in ".,;:!?" or _SENTENCE_END.search(line):
+        return False
+    if _HEADING_PATTERN.match(line):
+        return True
+    return line.isupper() and len(line.split()) >= 2
+
+
+@dataclass
+class _Unit:
+    """A heading or a sentence: its span in the page and its token count"""
+    start: int
+    end: int
+    tokens: int
+    paragraph_start: bool = False
+    heading: bool = False
+
+
+class StructureChunker:
+    """
+    Splits the pages of one file into chunks
+
+    The current section carries over from page to page, so use one chunker per file.
+    Has the split_documents interface of LangChain text splitters.
+    """
+
+    def __init__(self, config: ChunkConfig = DEFAULT_CONFIG):
+        self.config = config
+        self.section = None
+
+    def split_documents(self, documents: list) -> list:
+        """
+        Split Documents (pages) into chunk Documents
+
+        Chunks copy their page's metadata and add "section", the heading they fall under
+        (when the file has headings).
+        """
+        from langchain_core.documents import Document
+
+        chunks = []
+        for doc in documents:
+            for text, section in self.split_text(doc.page_content):
+                metadata = dict(doc.metadata)
+                if section is not None:
+                    metadata["section"] = section
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+    def split_text(self, text: str) -> Iterator[tuple]:
+        """
+        Split one page of text
+
+        Chunks are verbatim spans of the page (consecutive chunks may share their
+        overlap), stripped of surrounding whitespace.
+
+        Yields:
+            (chunk_text, section) tuples; section is None before the first heading
+        """
+        limit = self.config.chunk_tokens
+        current = []
+        total = 0
+        for unit in self._units(text, token_prefix(text)):
+            if unit.heading:
+                # A heading opens a new chunk unless the chunk so far is only headings
+                # (headings only ever start a chunk, so checking the last unit is enough)
+                if current and not current[-1].heading:
+                    yield text[current[0].start:current[-1].end], self.section
+                    current, total = [], 0
+                self.section = text[unit.start:unit.end]
+            elif total + unit.tokens > limit and current and not current[-1].heading:
+                cut = self._cut(current, limit)
+                yield text[current[0].start:current[cut - 1].end], self.section
+                carried = current[cut:]
+                total = sum(u.tokens for u in carried)
+                if carried and total + unit.tokens > limit:
+                    # The rest of a paragraph cut early does not fit with this sentence
+                    yield text[carried[0].start:carried[-1].end], self.section
+                    carried, total = [], 0
+                # Continuing mid-paragraph: repeat the sentences just before the cut
+                if not (carried[0] if carried else unit).paragraph_start:
+                    overlap = self._overlap(current[:cut], limit - total - unit.tokens)
+                    carried = overlap + carried
+                    total += sum(u.tokens for u in overlap)
+                current = carried
+            current.append(unit)
+            total += unit.tokens
+        if current and not current[-1].heading:
+            yield text[current[0].start:current[-1].end], self.section
+
+    def _units(self, text: str, prefix) -> Iterator[_Unit]:
+        """Headings and sentences of a page, found by one scan for blank lines and headings"""
+        headings = (
+            (m.start(), m.end(), True) for m in _HEADING_CANDIDATE.finditer(text) if is_heading(m.group().strip())
+        )
+        breaks = ((m.start(), m.end(), False) for m in _PARAGRAPH_BREAK.finditer(text))
+        pos = 0
+        for start, end, heading in heapq.merge(headings, breaks):
+            yield from self._paragraph(text, prefix, pos, start)
+            if heading:
+                start += len(text[start:end]) - len(text[start:end].lstrip())
+                yield _Unit(start, end, int(prefix[end] - prefix[start]), paragraph_start=True, heading=True)
+            pos = end
+        yield from self._paragraph(text, prefix, pos, len(text))
+
+    def _paragraph(self, text: str, prefix, start: int, end: int) -> Iterator[_Unit]:
+        """The sentences of text[start:end], if it is not blank"""
+        span = text[start:end]
+        stripped = span.strip()
+        if stripped:
+            start += len(span) - len(span.lstrip())
+            yield from self._sentences(text, prefix, start, start + len(stripped))
+
+    def _sentences(self, text: str, prefix, start: int, end: int) -> Iterator[_Unit]:
+        breaks = [(m.start() + 1, m.end()) for m in _SENTENCE_BREAK.finditer(text, start, end)]
+        starts = [start] + [next_start for _, next_start in breaks]
+        stops = [stop for stop, _ in breaks] + [end]
+        counts = (prefix[stops] - prefix[starts]).tolist()
+        for i, (start, stop, tokens) in enumerate(zip(starts, stops, counts)):
+            if tokens > self.config.chunk_tokens:
+                # Run-on text (tables, lists without punctuation): cut between words
+                yield from self._words(text, prefix, start, stop, i == 0)
+            else:
+                yield _Unit(start, stop, tokens, i == 0)
+
+    def _words(self, text: str, prefix, start: int, end: int, paragraph_start: bool) -> Iterator[_Unit]:
+        limit = self.config.chunk_tokens
+        piece_start = piece_end = None
+        for word in _WORD.finditer(text, start, end):
+            if piece_start is not None and prefix[word.end()] - prefix[piece_start] > limit:
+                yield _Unit(piece_start, piece_end, int(prefix[piece_end] - prefix[piece_start]), paragraph_start)
+                piece_start, paragraph_start = None, False
+            if piece_start is None:
+                piece_start = word.start()
+            piece_end = word.end()
+        if piece_start is not None:
+            yield _Unit(piece_start, piece_end, int(prefix[piece_end] - prefix[piece_start]), paragraph_start)
+
+    def _cut(self, units: list, limit: int) -> int:
+        """Where to end a full chunk: its last paragraph break if that is full enough"""
+        filled = 0
+        cut = len(units)
+        for i, unit in enumerate(units):
+            if i and unit.paragraph_start and filled >= PARAGRAPH_CUT_MIN_FILL * limit:
+                cut = i
+            filled += unit.tokens
+        return cut
+
+    def _overlap(self, units: list, room: int) -> list:
+        """The trailing sentences of a chunk that fit in overlap_tokens (and in room)"""
+        overlap, total = [], 0
+        budget = min(self.config.overlap_tokens, room)
+        for unit in reversed(units):
+            if unit.heading or total + unit.tokens > budget:
+                break
+            overlap.insert(0, unit)
+            total += unit.tokens
+            if unit.paragraph_start:
+                break
+        return overlap
+
+
+def chunk_config(file_type: str) -> ChunkConfig:
+    """The ChunkConfig for a file extension (without the dot)"""
+    return CHUNK_CONFIGS.get(file_type, DEFAULT_CONFIG)
+
+
+def config_key() -> str:
+    """The chunk configs as a string, for cache keys"""
+    return ",".join(f"{file_type}={config}" for file_type, config in sorted(CHUNK_CONFIGS.items()))
@@ -0,0 +1,181 @@
+"""
+Compact docstore for large indexes, optionally memory-mapped
+langchain's InMemoryDocstore keeps a Document object, a metadata dict and an ID string in
+Python memory for every chunk, on top of the text itself. CompactDocstore keeps:
+
+- all chunk texts in one contiguous UTF-8 buffer addressed by an offsets array; loaded
+  from disk, the buffer is a read-only memory map shared through the OS page cache
+- chunk IDs in one fixed-width byte array in index order, plus a sorted permutation for
+  lookups by ID (PositionIds serves index_to_docstore_id from the same array)
+- metadata column by column: each distinct value is stored once, rows hold int32 codes
+
+Documents are only materialized in search(). Stores written by HybridFAISS.save_local use
+this layout unless GEMMA3_DOCSTORE=memory.
+"""
+
+import json
+import mmap
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# Layout of saved docstores (override with GEMMA3_DOCSTORE=memory for langchain's pickle)
+DOCSTORE_LAYOUT = os.environ.get("GEMMA3_DOCSTORE", "compact")
+
+_MISSING = -1
+
+
+class PositionIds(Mapping):
+    """Read-only index_to_docstore_id mapping (FAISS position -> chunk ID) over an ID array"""
+
+    def __init__(self, ids: np.ndarray):
+        self._ids = ids
+
+    def __getitem__(self, position) -> str:
+        if not 0 <= position < len(self._ids):
+            raise KeyError(position)
+        return self._ids[position].decode()
+
+    def __iter__(self):
+        return iter(range(len(self._ids)))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class CompactDocstore(Docstore, AddableMixin):
+    """
+    Chunk texts, IDs and metadata in a few flat arrays instead of per-chunk objects
+
+    Build one with from_documents() or load(). Chunks added or deleted afterwards (a
+    writable store being edited) are kept in a small overlay until the store is saved again.
+    """
+
+    def __init__(self, ids: np.ndarray, text, offsets: np.ndarray, columns: dict):
+        self._ids = ids
+        self._order = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._order]
+        self._text = text
+        self._offsets = offsets
+        self._columns = columns      # metadata key -> (values, int32 codes per row)
+        self._added = {}
+        self._deleted = set()
+
+    @classmethod
+    def from_documents(cls, ids: list, documents: list) -> "CompactDocstore":
+        """Pack Documents, stored under ids (in FAISS position order)"""
+        encoded = [doc.page_content.encode("utf-8") for doc in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+        tables = {}
+        for row, doc in enumerate(documents):
+            for key, value in doc.metadata.items():
+                table = tables.setdefault(key, ({}, np.full(len(documents), _MISSING, dtype=np.int32)))
+                # Values are interned by their JSON form, so lists and dicts work too
+                table[1][row] = table[0].setdefault(json.dumps(value, sort_keys=True), len(table[0]))
+        columns = {
+            key: ([json.loads(value) for value in values], codes) for key, (values, codes) in tables.items()
+        }
+        id_array = np.array([doc_id.encode() for doc_id in ids], dtype=bytes)
+        return cls(id_array, b"".join(encoded), offsets, columns)
+
+    @classmethod
+    def from_store(cls, vector_store) -> "CompactDocstore":
+        """Pack the docstore of a FAISS store, rows in index order"""
+        ids = [vector_store.index_to_docstore_id[i] for i in range(len(vector_store.index_to_docstore_id))]
+        return cls.from_documents(ids, [vector_store.docstore.search(doc_id) for doc_id in ids])
+
+    def _row(self, doc_id: str):
+        key = doc_id.encode()
+        position = int(np.searchsorted(self._sorted_ids, key))
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == key:
+            return int(self._order[position])
+        return None
+
+    def document(self, row: int) -> Document:
+        """The Document stored in a row"""
+        start, end = self._offsets[row], self._offsets[row + 1]
+        metadata = {
+            key: values[codes[row]] for key, (values, codes) in self._columns.items() if codes[row] != _MISSING
+        }
+        return Document(id=self._ids[row].decode(), page_content=bytes(self._text[start:end]).decode("utf-8"),
+                        metadata=metadata)
+
+    def search(self, search: str):
+        """The Document stored under an ID, or an error string like InMemoryDocstore"""
+        if search in self._added:
+            return self._added[search]
+        row = None if search in self._deleted else self._row(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self.document(row)
+
+    def add(self, texts: dict) -> None:
+        overlapping = [doc_id for doc_id in texts if isinstance(self.search(doc_id), Document)]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: list) -> None:
+        for doc_id in ids:
+            if doc_id in self._added:
+                del self._added[doc_id]
+            elif doc_id not in self._deleted and self._row(doc_id) is not None:
+                self._deleted.add(doc_id)
+            else:
+                raise ValueError(f"ID {doc_id} not found.")
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + len(self._added)
+
+    def positions(self) -> PositionIds:
+        """index_to_docstore_id for a store whose FAISS positions are this docstore's rows"""
+        return PositionIds(self._ids)
+
+    def copy(self) -> "CompactDocstore":
+        """A docstore sharing this one's buffers, with its own overlay of changes"""
+        store = CompactDocstore.__new__(CompactDocstore)
+        store.__dict__.update(self.__dict__)
+        store._added, store._deleted = dict(self._added), set(self._deleted)
+        return store
+
+    def nbytes(self) -> int:
+        """Bytes held in the buffers (the text counts even when memory-mapped)"""
+        return (len(self._text) + self._offsets.nbytes + self._ids.nbytes + self._order.nbytes
+                + self._sorted_ids.nbytes + sum(codes.nbytes for _, codes in self._columns.values()))
+
+    def __getstate__(self) -> dict:
+        # A memory map cannot be pickled; its bytes can
+        return {**self.__dict__, "_text": bytes(self._text)}
+
+    def save(self, folder_path: str, index_name: str = "index"):
+        """Write the text buffer and the arrays next to the FAISS index"""
+        if self._added or self._deleted:
+            raise ValueError("Save a docstore rebuilt with from_store(), not one with pending changes")
+        with open(os.path.join(folder_path, f"{index_name}.text"), "wb") as f:
+            f.write(self._text)
+        arrays = {f"codes_{i}": codes for i, (_, codes) in enumerate(self._columns.values())}
+        columns = [[key, values] for key, (values, _) in self._columns.items()]
+        np.savez(os.path.join(folder_path, f"{index_name}.docs.npz"), ids=self._ids, offsets=self._offsets,
+                 columns=np.array(json.dumps(columns)), **arrays)
+
+    @classmethod
+    def exists(cls, folder_path: str, index_name: str = "index") -> bool:
+        return os.path.exists(os.path.join(folder_path, f"{index_name}.docs.npz"))
+
+    @classmethod
+    def load(cls, folder_path: str, index_name: str = "index") -> "CompactDocstore":
+        """Open a saved docstore; the text buffer is memory-mapped, not read"""
+        with np.load(os.path.join(folder_path, f"{index_name}.docs.npz")) as arrays:
+            columns = {
+                key: (values, arrays[f"codes_{i}"]) for i, (key, values) in enumerate(json.loads(str(arrays["columns"])))
+            }
+            ids, offsets = arrays["ids"], arrays["offsets"]
+        with open(os.path.join(folder_path, f"{index_name}.text"), "rb") as f:
+            # mmap cannot map an empty file
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+        return cls(ids, text, offsets, columns)
@@ -0,0 +1,198 @@
+"""
+Token-budgeted prompt assembly
+Instead of a fixed top-3 chunks and a fixed 6-message window, retrieved chunks and chat
+history are packed into token budgets: near-duplicate chunks are dropped, the highest
+ranked chunks are kept first, and the most recent messages are kept first.
+"""
+
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Prompt budgets in tokens (override with GEMMA3_CONTEXT_TOKENS / GEMMA3_HISTORY_TOKENS)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("GEMMA3_CONTEXT_TOKENS", 1500))
+HISTORY_TOKEN_BUDGET = int(os.environ.get("GEMMA3_HISTORY_TOKENS", 600))
+
+# Chunks sharing at least this fraction of word shingles count as duplicates
+DUPLICATE_THRESHOLD = 0.8
+
+# Optional tokenizer.json (e.g. Gemma's) for exact counts; otherwise a fast estimate is used
+TOKENIZER_PATH = os.environ.get("GEMMA3_TOKENIZER")
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+_tokenizer = None
+_ascii_classes = None
+
+
+def _load_tokenizer():
+    global _tokenizer
+    if _tokenizer is None and TOKENIZER_PATH:
+        from tokenizers import Tokenizer
+        _tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of a text
+
+    Uses the GEMMA3_TOKENIZER fast tokenizer when configured. Otherwise estimates
+    SentencePiece-style counts: one token per punctuation mark and roughly one per
+    four characters of each word.
+    """
+    tokenizer = _load_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _WORD_PATTERN.findall(text))
+
+
+def token_prefix(text: str):
+    """
+    Running token count by character position, for counting many spans of one text
+
+    text[a:b] holds prefix[b] - prefix[a] tokens; with the estimate this equals
+    count_tokens(text[a:b]) whenever a and b fall outside words (e.g. on whitespace).
+    The text is scanned once, vectorized for ASCII text.
+
+    Returns:
+        int32 numpy array of len(text) + 1 entries
+    """
+    import numpy as np
+
+    counts = np.zeros(len(text), dtype=np.int32)
+    tokenizer = _load_tokenizer()
+    if tokenizer is not None:
+        starts = [start for start, _ in tokenizer.encode(text, add_special_tokens=False).offsets]
+        np.add.at(counts, np.asarray(starts, dtype=np.int64), 1)
+    elif text.isascii():
+        # Each word counts a token at every fourth character from its start; each
+        # punctuation character counts one
+        global _ascii_classes
+        if _ascii_classes is None:
+            _ascii_classes = (
+                np.array([bool(re.match(r"\w", chr(c))) for c in range(128)]),
+                np.array([bool(re.match(r"\s", chr(c))) for c in range(128)]),
+            )
+        codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        word, space = _ascii_classes[0][codes], _ascii_classes[1][codes]
+        positions = np.arange(len(codes))
+        word_start = np.where(word & ~np.concatenate(([False], word[:-1])), positions, 0)
+        np.maximum.accumulate(word_start, out=word_start)
+        counts[:] = (word & ((positions - word_start) % 4 == 0)) | ~(word | space)
+    else:
+        for match in _WORD_PATTERN.finditer(text):
+            counts[match.start():match.end():4] = 1
+    prefix = np.zeros(len(text) + 1, dtype=np.int32)
+    np.cumsum(counts, out=prefix[1:])
+    return prefix
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text so that it fits in max_tokens
+
+    Cuts at the last whitespace that fits (spaces, newlines, ...); text without any there
+    (a long URL, CJK) is cut between characters rather than dropped.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    import numpy as np
+
+    # Furthest character position whose prefix fits
+    fits = int(np.searchsorted(token_prefix(text), max_tokens, side="right")) - 1
+    while fits > 0:
+        cut = fits
+        while cut > 0 and not text[cut].isspace():
+            cut -= 1
+        truncated = text[:cut].rstrip() or text[:fits]
+        # A real tokenizer can merge differently at the cut; step back until it fits
+        if count_tokens(truncated) <= max_tokens:
+            return truncated
+        fits = len(truncated) - 1
+    return ""
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def _is_duplicate(shingles: set, kept: list, threshold: float) -> bool:
+    for other in kept:
+        overlap = len(shingles & other) / (len(shingles | other) or 1)
+        if overlap >= threshold:
+            return True
+    return False
+
+
+def select_chunks(docs: list, budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+                  duplicate_threshold: float = DUPLICATE_THRESHOLD) -> list:
+    """
+    Pick retrieved chunks, best first, until the token budget is full
+
+    Args:
+        docs: Retrieved Documents, best first
+        budget_tokens: Token budget for the document context
+        duplicate_threshold: Shingle overlap above which a chunk is skipped as a near-duplicate
+
+    Returns:
+        List of (Document, text) pairs; the last text may be truncated to fit
+    """
+    selected = []
+    kept_shingles = []
+    remaining = budget_tokens
+    for doc in docs:
+        if remaining <= 0:
+            break
+        shingles = _shingles(doc.page_content)
+        if _is_duplicate(shingles, kept_shingles, duplicate_threshold):
+            continue
+
+        text = doc.page_content
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            # Only worth a partial chunk if a meaningful piece still fits
+            if remaining < 64:
+                break
+            text = truncate_to_tokens(text, remaining)
+            tokens = count_tokens(text)
+
+        selected.append((doc, text))
+        kept_shingles.append(shingles)
+        remaining -= tokens
+    return selected
+
+
+def select_history(chat_history: list, budget_tokens: int = HISTORY_TOKEN_BUDGET) -> list:
+    """
+    Most recent messages that fit in the token budget, in chronological order
+
+    A single message longer than the whole budget is truncated rather than dropped
+    when it is the most recent one.
+    """
+    selected = []
+    remaining = budget_tokens
+    for msg in reversed(chat_history or []):
+        tokens = count_tokens(msg["content"]) + 2  # role label
+        if tokens > remaining:
+            if not selected and remaining > 2:
+                selected.append({**msg, "content": truncate_to_tokens(msg["content"], remaining - 2)})
+            break
+        selected.append(msg)
+        remaining -= tokens
+    return list(reversed(selected))
+
+
+def log_prompt_tokens(kind: str, prompt: str, **parts):
+    """Log the token count of a prompt and of its parts (texts are counted, numbers logged as-is)"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    details = ", ".join(
+        f"{name} {count_tokens(value) if isinstance(value, str) else value}" for name, value in parts.items()
+    )
+    logger.info("%s prompt: %d tokens (%s)", kind, count_tokens(prompt), details)
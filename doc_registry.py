@@ -0,0 +1,254 @@
+"""
+Per-document registry on top of a single FAISS vector store
+Tracks which chunk IDs came from which uploaded file, so adding, replacing or removing
+one file only embeds (or deletes) that file's chunks instead of rebuilding the corpus.
+Synced corpora are published to the shared index registry, so every session with the
+same uploads uses one memory-mapped index; changing it makes a private copy first.
+"""
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from index_cache import corpus_key_from_digests, file_digest
+from index_registry import IndexLease, get_index_registry
+from ingest import (
+    NO_PROGRESS, IngestCancelled, IngestProgress, IngestStats, SpooledFile,
+    chunking_key, ingest_files, spool_uploads,
+)
+import llm_logic
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+
+@dataclass
+class FileRecord:
+    """One indexed file version"""
+    file_name: str
+    digest: str
+    chunk_ids: list = field(default_factory=list)
+
+
+class DocumentRegistry:
+    """
+    Map uploaded files to their chunks in a FAISS vector store
+
+    Usage:
+        registry = DocumentRegistry()
+        changes = registry.sync(uploaded_files)   # embeds only new/changed files
+        answer = get_rag_response(question, registry.vector_store)
+    """
+
+    def __init__(self, use_cache: bool = True):
+        self.use_cache = use_cache
+        self.vector_store = None
+        self.files = {}
+        self.last_stats = None
+        self._lease = None
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self.files
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @property
+    def chunk_count(self) -> int:
+        return sum(len(record.chunk_ids) for record in self.files.values())
+
+    @property
+    def shared_sessions(self) -> int:
+        """Sessions using the same shared index as this one (0 if the index is private)"""
+        return self._lease.sessions if self._lease is not None else 0
+
+    @classmethod
+    def from_vector_store(cls, vector_store: "FAISS", use_cache: bool = True) -> "DocumentRegistry":
+        """Rebuild a registry from an index whose chunks carry source/file_digest metadata"""
+        registry = cls(use_cache=use_cache)
+        registry._adopt(vector_store)
+        return registry
+
+    def _adopt(self, vector_store: "FAISS"):
+        self.vector_store = vector_store
+        self.files = {}
+        for chunk_id in vector_store.index_to_docstore_id.values():
+            metadata = vector_store.docstore.search(chunk_id).metadata
+            record = self.files.setdefault(
+                metadata["source"], FileRecord(metadata["source"], metadata["file_digest"])
+            )
+            record.chunk_ids.append(chunk_id)
+
+    def _share(self, lease: IndexLease):
+        """Switch to a shared index, releasing the previous one"""
+        if self._lease is not None:
+            self._lease.release()
+        self._lease = lease
+        self._adopt(lease.vector_store)
+
+    def _make_writable(self):
+        """Swap a shared, read-only index for a private copy before changing it"""
+        if self._lease is not None:
+            self.vector_store = self.vector_store.copy()
+            self._lease.release()
+            self._lease = None
+
+    def add_file(self, file_name: str, data: bytes) -> FileRecord:
+        """
+        Load, split and embed one file
+
+        Raises:
+            ValueError: If a file with this name is already registered
+        """
+        self.add_files([(file_name, data)])
+        return self.files[file_name]
+
+    def add_files(self, files: list, max_workers: int = None, progress: IngestProgress = None) -> IngestStats:
+        """
+        Load and split several files in parallel and embed them into the index
+
+        Args:
+            files: List of (file_name, raw_bytes) tuples or SpooledFile
+            max_workers: Worker processes for load+split
+            progress: Optional IngestProgress to report to / cancel through
+
+        Returns:
+            IngestStats with per-stage timings
+
+        Raises:
+            ValueError: If any file name is already registered
+            IngestCancelled: If progress cancelled the run; files finished before that stay indexed
+        """
+        progress = progress or NO_PROGRESS
+        for file in files:
+            file_name = file.file_name if isinstance(file, SpooledFile) else file[0]
+            if file_name in self.files:
+                raise ValueError(f"{file_name} is already indexed; use replace_file")
+        self._make_writable()
+
+        def register(result):
+            self.files[result.file_name] = FileRecord(result.file_name, result.digest, result.ids)
+
+        try:
+            self.vector_store, stats = ingest_files(
+                files, llm_logic.get_embeddings(), self.vector_store, max_workers,
+                on_file=register, progress=progress
+            )
+        except IngestCancelled as cancelled:
+            self.vector_store = cancelled.vector_store if self.files else None
+            self.last_stats = cancelled.stats
+            raise
+        progress.stage("indexing")
+        from ann_index import INDEX_TYPE, VECTOR_ENCODING, ensure_index_type
+        self.vector_store = ensure_index_type(self.vector_store, INDEX_TYPE, VECTOR_ENCODING)
+        self.last_stats = stats
+        return stats
+
+    def remove_file(self, file_name: str) -> FileRecord:
+        """
+        Delete one file's chunks from the index by ID
+
+        Raises:
+            KeyError: If the file is not registered
+        """
+        record = self.files.pop(file_name)
+        self._make_writable()
+        if record.chunk_ids:
+            from ann_index import delete_vectors
+            delete_vectors(self.vector_store, record.chunk_ids, llm_logic.get_embeddings())
+        if not self.files:
+            self.vector_store = None
+        return record
+
+    def replace_file(self, file_name: str, data: bytes) -> FileRecord:
+        """Re-index a file if its content changed; a no-op for identical content"""
+        record = self.files.get(file_name)
+        if record is not None and record.digest == file_digest(data):
+            return record
+        if record is not None:
+            self.remove_file(file_name)
+        return self.add_file(file_name, data)
+
+    def sync(self, uploaded_files, progress: IngestProgress = None) -> dict:
+        """
+        Make the index match the current set of uploads
+
+        Args:
+            uploaded_files: List of uploaded files from Streamlit (or SpooledFile)
+            progress: Optional IngestProgress to report to / cancel through
+
+        Returns:
+            Dict of file-name lists: added, replaced, removed, unchanged
+
+        Raises:
+            IngestCancelled: If progress cancelled the run. Files embedded so far stay
+                indexed, so syncing the same uploads again resumes where it stopped.
+        """
+        progress = progress or NO_PROGRESS
+        with spool_uploads(uploaded_files) as spooled:
+            return self._sync({file.file_name: file for file in spooled}, progress)
+
+    def _sync(self, files: dict, progress: IngestProgress) -> dict:
+        key = corpus_key_from_digests(
+            [(file_name, file.digest) for file_name, file in files.items()],
+            chunking_key(),
+            llm_logic.EMBEDDING_MODEL_NAME,
+            llm_logic.index_key()
+        )
+
+        if not self.use_cache:
+            return self._apply(files, progress)
+
+        # Sessions uploading the same corpus wait for the first one to embed it, then share it
+        index_registry = get_index_registry()
+        progress.stage("waiting")
+        with index_registry.building(key):
+            if self._lease is None or self._lease.key != key:
+                lease = index_registry.acquire(key, llm_logic.get_embeddings())
+                if lease is not None:
+                    changes = self._changes(files)
+                    progress.plan(changes)
+                    self._share(lease)
+                    return changes
+
+            changes = self._apply(files, progress)
+            # A private index (new, changed, or copied for an earlier remove_file) is published
+            if self._lease is None and self.vector_store is not None:
+                progress.stage("publishing")
+                self._share(index_registry.publish(key, self.vector_store))
+        return changes
+
+    def _changes(self, files: dict) -> dict:
+        """Compare the registered files with {file_name: SpooledFile}"""
+        removed = [file_name for file_name in self.files if file_name not in files]
+        changes = {"added": [], "replaced": [], "removed": removed, "unchanged": []}
+        for file_name, file in files.items():
+            record = self.files.get(file_name)
+            if record is None:
+                changes["added"].append(file_name)
+            elif record.digest != file.digest:
+                changes["replaced"].append(file_name)
+            else:
+                changes["unchanged"].append(file_name)
+        return changes
+
+    def _apply(self, files: dict, progress: IngestProgress) -> dict:
+        changes = self._changes(files)
+        progress.plan(changes)
+
+        # Changed files are dropped first, then everything new is ingested in one parallel batch
+        progress.stage("removing")
+        for file_name in changes["removed"] + changes["replaced"]:
+            self.remove_file(file_name)
+        to_ingest = [files[file_name] for file_name in changes["added"] + changes["replaced"]]
+        if to_ingest:
+            self.add_files(to_ingest, progress=progress)
+
+        return changes
+
+    def clear(self):
+        """Forget every file and drop the index"""
+        if self._lease is not None:
+            self._lease.release()
+            self._lease = None
+        self.vector_store = None
+        self.files = {}
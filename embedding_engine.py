@@ -0,0 +1,206 @@
+"""
+Batched, cached embedding layer
+Wraps a LangChain embeddings model so that:
+- identical chunks (repeated headers, footers, boilerplate pages) are embedded once
+- vectors computed before are read from a persistent cache keyed by text hash
+- the remaining texts are sorted by length and embedded in fixed-size batches,
+  so each batch pads to similar lengths
+- results come back as one float32 numpy matrix, ready for FAISS
+- repeated questions reuse their query embedding from an in-memory LRU cache
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Persistent vector cache (override with the GEMMA3_EMBEDDING_CACHE environment variable)
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "GEMMA3_EMBEDDING_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "gemma3-assistant", "embeddings.sqlite")
+)
+
+# Texts per model call
+EMBED_BATCH_SIZE = 32
+
+# Query embeddings kept in memory (override with GEMMA3_QUERY_CACHE_SIZE)
+QUERY_CACHE_SIZE = int(os.environ.get("GEMMA3_QUERY_CACHE_SIZE", 1024))
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed map of (model, text hash) -> float32 vector
+
+    Args:
+        path: Database file, or ":memory:" for a process-local cache
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+
+    def get_many(self, keys: list) -> dict:
+        """Return {key: vector} for the keys that are cached"""
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: dict):
+        """Store {key: vector}"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Drop-in LangChain Embeddings with chunk-level dedup, a persistent cache
+    and length-sorted batching
+
+    Args:
+        base: The embeddings model that computes vectors on a cache miss
+        model_name: Part of every cache key, so models never share vectors
+        batch_size: Texts per call to the base model
+        cache: EmbeddingCache instance (None disables the persistent cache)
+        query_cache_size: Query embeddings kept in the in-memory LRU (0 disables it)
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, batch_size: int = EMBED_BATCH_SIZE,
+                 cache: EmbeddingCache = None, query_cache_size: int = QUERY_CACHE_SIZE):
+        self.base = base
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        self._query_lock = threading.Lock()
+        self.stats = {"texts": 0, "unique": 0, "cache_hits": 0, "computed": 0, "queries": 0, "query_hits": 0}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def embed_array(self, texts: list) -> np.ndarray:
+        """
+        Embed texts into a (len(texts), dim) float32 matrix
+
+        Duplicates are embedded once, cached vectors are reused, and the rest are
+        computed shortest-first in batches of batch_size.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        keys = [self._key(text) for text in texts]
+        unique = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+
+        vectors = self.cache.get_many(list(unique)) if self.cache is not None else {}
+        hits = len(vectors)
+
+        # Sorting by length keeps padding per batch small
+        missing = sorted((key for key in unique if key not in vectors), key=lambda k: len(unique[k]))
+        computed = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            batch_vectors = np.asarray(
+                self.base.embed_documents([unique[key] for key in batch]), dtype=np.float32
+            )
+            computed.update(zip(batch, batch_vectors))
+
+        if computed and self.cache is not None:
+            self.cache.put_many(computed)
+        vectors.update(computed)
+
+        self.stats["texts"] += len(texts)
+        self.stats["unique"] += len(unique)
+        self.stats["cache_hits"] += hits
+        self.stats["computed"] += len(computed)
+
+        return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+
+    def embed_documents(self, texts: list) -> list:
+        return self.embed_array(texts).tolist()
+
+    def embed_queries(self, texts: list) -> np.ndarray:
+        """
+        Embed questions into a (len(texts), dim) float32 matrix
+
+        Recently seen questions come from the LRU cache; the rest are embedded together
+        in batches of batch_size. The sentence-transformers models used here embed a
+        query exactly like a document, so batching does not change the vectors.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        vectors = {}
+        with self._query_lock:
+            for text in texts:
+                vector = self._query_cache.get(text)
+                if vector is not None:
+                    self._query_cache.move_to_end(text)
+                    vectors[text] = vector
+        hits = sum(text in vectors for text in texts)
+
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if len(missing) == 1:
+            vectors[missing[0]] = np.asarray(self.base.embed_query(missing[0]), dtype=np.float32)
+        else:
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                vectors.update(zip(batch, np.asarray(self.base.embed_documents(batch), dtype=np.float32)))
+
+        if missing and self.query_cache_size > 0:
+            with self._query_lock:
+                for text in missing:
+                    self._query_cache[text] = vectors[text]
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+
+        self.stats["queries"] += len(texts)
+        self.stats["query_hits"] += hits
+        return np.stack([vectors[text] for text in texts])
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_queries([text])[0].tolist()
+
+    def clear_query_cache(self):
+        with self._query_lock:
+            self._query_cache.clear()
+
+
+def embed_queries(embeddings: Embeddings, texts: list) -> np.ndarray:
+    """Query matrix from any LangChain Embeddings; cached and batched for CachedEmbeddings"""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return np.asarray([embeddings.embed_query(text) for text in texts], dtype=np.float32)
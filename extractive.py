@@ -0,0 +1,169 @@
+"""
+Extractive answers for RAG: skip generation when a retrieved chunk states the answer
+Many document questions are answered word for word by one sentence of a retrieved chunk.
+ExtractiveAnswerer splits the chunks selected for the prompt into sentences, embeds them
+(through the embedding cache, so chunks seen before cost nothing) and scores them against
+the question embedding from retrieval. The best sentence is returned with its citation,
+in milliseconds, only if it is:
+
+- similar enough to the question (EXTRACTIVE_MIN_SIMILARITY),
+- clearly ahead of the next best distinct sentence (EXTRACTIVE_MARGIN), and
+- more than a restatement of the question (it has words the question does not).
+
+Otherwise the caller generates an answer as usual. metrics() reports the hit rate, the time
+spent extracting and the generation time saved, estimated from the running mean of
+generated answers.
+"""
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+# The extractive stage is optional (GEMMA3_EXTRACTIVE=1 enables it)
+EXTRACTIVE_ENABLED = os.environ.get("GEMMA3_EXTRACTIVE", "0") != "0"
+
+# Cosine similarity the best sentence needs (override with GEMMA3_EXTRACTIVE_MIN_SIMILARITY)
+EXTRACTIVE_MIN_SIMILARITY = float(os.environ.get("GEMMA3_EXTRACTIVE_MIN_SIMILARITY", 0.7))
+
+# Lead over the runner-up sentence; closer calls go to the LLM
+EXTRACTIVE_MARGIN = 0.05
+
+# Sentences outside this range are not answers on their own (headings, whole paragraphs)
+MIN_SENTENCE_WORDS = 4
+MAX_SENTENCE_WORDS = 80
+
+# Weight of the latest generation in the running mean used to estimate time saved
+GENERATION_SMOOTHING = 0.2
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+
+
+def split_sentences(text: str) -> list:
+    """Sentences (and stand-alone lines) of a chunk with MIN..MAX_SENTENCE_WORDS words"""
+    sentences = (" ".join(part.split()) for part in _SENTENCE_BREAK.split(text))
+    return [s for s in sentences if MIN_SENTENCE_WORDS <= len(s.split()) <= MAX_SENTENCE_WORDS]
+
+
+def _adds_information(sentence: str, question: str) -> bool:
+    """Whether a sentence has a word the question lacks (a number or a word of 3+ letters)"""
+    asked = {word.lower() for word in _WORD.findall(question)}
+    return any(
+        word.lower() not in asked and (len(word) >= 3 or word.isdigit()) for word in _WORD.findall(sentence)
+    )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def citation(source) -> str:
+    """Where a Source is from: "file, page N", or just the file for formats without pages"""
+    return f"{source.file}, page {source.page}" if source.page is not None else source.file
+
+
+@dataclass
+class Extract:
+    """
+    An extractive answer
+
+    Attributes:
+        span: The answering sentence, as it appears in the chunk
+        source: The Source (retrieved chunk) it was taken from
+        similarity: Its cosine similarity to the question
+        answer: The span with its citation, as shown to the user
+    """
+    span: str
+    source: object
+    similarity: float
+
+    @property
+    def answer(self) -> str:
+        return f"{self.span}\n\n(Source: {citation(self.source)})"
+
+
+class ExtractiveAnswerer:
+    """
+    Find a sentence of the retrieved chunks that answers the question outright
+
+    Args:
+        min_similarity: Cosine similarity the best sentence needs
+        margin: Lead it needs over the next best distinct sentence
+    """
+
+    def __init__(self, min_similarity: float = EXTRACTIVE_MIN_SIMILARITY, margin: float = EXTRACTIVE_MARGIN):
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._generation_ms = None
+        self.stats = {"attempts": 0, "hits": 0, "extract_ms": 0.0, "saved_ms": 0.0}
+
+    def extract(self, question: str, query_embedding, sources: list, embed) -> Extract:
+        """
+        Look for a sentence that answers the question, and count the attempt
+
+        Args:
+            question: The user's question
+            query_embedding: Its embedding, from retrieval
+            sources: Sources used for the prompt, best first
+            embed: embed(texts) -> (len(texts), dim) array, e.g. CachedEmbeddings.embed_array
+
+        Returns:
+            The Extract, or None when no sentence answers confidently enough
+        """
+        start = time.perf_counter()
+        extract = self._best(question, query_embedding, sources, embed)
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        with self._lock:
+            self.stats["attempts"] += 1
+            self.stats["extract_ms"] += elapsed_ms
+            if extract is not None:
+                self.stats["hits"] += 1
+                if self._generation_ms is not None:
+                    self.stats["saved_ms"] += max(0.0, self._generation_ms - elapsed_ms)
+        return extract
+
+    def _best(self, question: str, query_embedding, sources: list, embed) -> Extract:
+        candidates, seen = [], set()
+        for source in sources:
+            for sentence in split_sentences(source.document.page_content):
+                if sentence.lower() not in seen:
+                    seen.add(sentence.lower())
+                    candidates.append((sentence, source))
+        if not candidates:
+            return None
+
+        vectors = _normalize(np.asarray(embed([sentence for sentence, _ in candidates]), dtype=np.float32))
+        scores = vectors @ _normalize(np.asarray(query_embedding, dtype=np.float32))
+        order = np.argsort(-scores)
+        best = order[0]
+        runner_up = scores[order[1]] if len(order) > 1 else -1.0
+        sentence, source = candidates[best]
+        if (scores[best] < self.min_similarity or scores[best] - runner_up < self.margin
+                or not _adds_information(sentence, question)):
+            return None
+        return Extract(sentence, source, float(scores[best]))
+
+    def record_generation(self, generation_ms: float):
+        """Note how long a generated answer took (the estimate of what a hit saves)"""
+        with self._lock:
+            if self._generation_ms is None:
+                self._generation_ms = generation_ms
+            else:
+                self._generation_ms += GENERATION_SMOOTHING * (generation_ms - self._generation_ms)
+
+    def metrics(self) -> dict:
+        """stats plus misses, hit rate, mean extraction time and the generation time estimate"""
+        with self._lock:
+            metrics = dict(self.stats)
+            metrics["mean_generation_ms"] = self._generation_ms
+        attempts = metrics["attempts"]
+        metrics["misses"] = attempts - metrics["hits"]
+        metrics["hit_rate"] = metrics["hits"] / attempts if attempts else 0.0
+        metrics["mean_extract_ms"] = metrics["extract_ms"] / attempts if attempts else 0.0
+        return metrics
@@ -0,0 +1,163 @@
+"""
+Minimal fake Ollama HTTP server for tests and benchmarks
+Streams a fixed list of tokens as NDJSON from /api/generate (or as OpenAI-style
+server-sent events from /v1/chat/completions), with configurable delays.
+Simulates Ollama's KV cache: only the part of a prompt (after any `context` tokens) that
+differs from the previous request is "prefilled", and the final event reports it as
+prompt_eval_count along with the `context` to continue from.
+"""
+
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer:
+    """
+    Local stand-in for `ollama serve`
+
+    Args:
+        tokens: Tokens to stream back for every request
+        first_token_delay: Seconds to wait before the first token (simulated prefill)
+        token_delay: Seconds to wait between tokens (simulated decode)
+        max_parallel: Requests generated at once, like OLLAMA_NUM_PARALLEL (others wait); None for no limit
+        prefill_token_delay: Extra seconds before the first token per prompt token not in the KV cache
+
+    Usage:
+        with FakeOllamaServer(["Hello", " world"]) as server:
+            llm = Ollama(model="gemma3:1b", base_url=server.url)
+    """
+
+    def __init__(self, tokens: list = None, first_token_delay: float = 0.0, token_delay: float = 0.0,
+                 max_parallel: int = None, prefill_token_delay: float = 0.0):
+        self.tokens = tokens or ["Hello", " from", " the", " fake", " Ollama", " server."]
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.prefill_token_delay = prefill_token_delay
+        self._slots = threading.BoundedSemaphore(max_parallel) if max_parallel else None
+        self._kv_cache = []
+        self._kv_lock = threading.Lock()
+        self.requests = []
+        self._httpd = None
+        self._thread = None
+
+    @staticmethod
+    def tokenize(text: str) -> list:
+        """Whitespace "tokens" as stable ids"""
+        return [zlib.crc32(word.encode()) & 0x7FFFFFFF for word in text.split()]
+
+    def _prefill(self, payload: dict) -> tuple:
+        """Token ids of the full prompt and how many of them miss the KV cache"""
+        context = payload.get("context") or []
+        system = "" if context else payload.get("system", "")
+        prompt = payload.get("prompt", "")
+        if "messages" in payload:
+            prompt = " ".join(message["content"] for message in payload["messages"])
+        tokens = list(context) + self.tokenize(system) + self.tokenize(prompt)
+        with self._kv_lock:
+            cached = 0
+            for a, b in zip(tokens, self._kv_cache):
+                if a != b:
+                    break
+                cached += 1
+        return tokens, len(tokens) - cached
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                record = {"path": self.path, "payload": payload}
+                server.requests.append(record)
+
+                openai = self.path == "/v1/chat/completions"
+                if self.path != "/api/generate" and not openai:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream" if openai else "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                if server._slots:
+                    server._slots.acquire()
+                try:
+                    prompt_tokens, prefilled = server._prefill(payload)
+                    record["prompt_eval_count"] = prefilled
+                    prefill_seconds = server.first_token_delay + prefilled * server.prefill_token_delay
+                    time.sleep(prefill_seconds)
+                    for i, token in enumerate(server.tokens):
+                        if i:
+                            time.sleep(server.token_delay)
+                        if openai:
+                            self._write_event({"model": payload.get("model"), "choices": [{"delta": {"content": token}}]})
+                        else:
+                            self._write_chunk({"model": payload.get("model"), "response": token, "done": False})
+                    if openai:
+                        self._write_event("[DONE]")
+                        self.wfile.write(b"0\r\n\r\n")
+                        return
+
+                    context = prompt_tokens + server.tokenize("".join(server.tokens))
+                    with server._kv_lock:
+                        server._kv_cache = context
+                    self._write_chunk({
+                        "model": payload.get("model"), "response": "", "done": True, "context": context,
+                        "prompt_eval_count": prefilled, "prompt_eval_duration": int(prefill_seconds * 1e9),
+                        "eval_count": len(server.tokens),
+                    })
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the generation
+                    self.close_connection = True
+                finally:
+                    if server._slots:
+                        server._slots.release()
+
+            def _write_chunk(self, obj: dict):
+                self._write_raw(json.dumps(obj).encode() + b"\n")
+
+            def _write_event(self, data):
+                """One server-sent event (OpenAI streaming format)"""
+                data = data if isinstance(data, str) else json.dumps(data)
+                self._write_raw(f"data: {data}\n\n".encode())
+
+            def _write_raw(self, line: bytes):
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,227 @@
+"""
+FAISS vector store with a BM25 lexical index kept next to it
+Dense and lexical rankings are combined with reciprocal-rank fusion in hybrid_search.
+The lexical index is saved and loaded together with the FAISS files, and so is the
+docstore, in CompactDocstore's layout (see compact_docstore).
+"""
+
+import copy
+import math
+import os
+import pickle
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from compact_docstore import DOCSTORE_LAYOUT, CompactDocstore
+
+# Candidates taken from each retriever before fusion
+HYBRID_FETCH_K = 20
+
+
+class HybridFAISS(FAISS):
+    """
+    langchain FAISS store plus a BM25Index over the same docstore IDs
+
+    Chunks added through ingest.add_chunks are indexed lexically as they are embedded;
+    anything added another way is picked up by sync_lexical_index before the next search.
+
+    Stores loaded read-only (shared and memory-mapped, see index_registry) refuse changes;
+    modify a copy() instead.
+    """
+
+    @property
+    def read_only(self) -> bool:
+        return getattr(self, "_read_only", False)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError("This index is shared and read-only; modify a copy() of it")
+
+    def copy(self) -> "HybridFAISS":
+        """Writable in-memory copy of the store (vectors, docstore and lexical index)"""
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+
+        self.sync_lexical_index()
+        store = copy.copy(self)
+        # clone_index would keep viewing a memory-mapped index; a serialized round trip owns its data
+        store.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        if isinstance(self.docstore, CompactDocstore):
+            store.docstore = self.docstore.copy()
+        else:
+            store.docstore = InMemoryDocstore(dict(self.docstore._dict))
+        store.index_to_docstore_id = dict(self.index_to_docstore_id)
+        store._lexical_index = copy.deepcopy(self.lexical_index)
+        store._read_only = False
+        return store
+
+    def add_texts(self, *args, **kwargs) -> list:
+        self._check_writable()
+        return super().add_texts(*args, **kwargs)
+
+    def add_embeddings(self, *args, **kwargs) -> list:
+        self._check_writable()
+        return super().add_embeddings(*args, **kwargs)
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        if getattr(self, "_lexical_index", None) is None:
+            self._lexical_index = BM25Index()
+        return self._lexical_index
+
+    def sync_lexical_index(self):
+        """Rebuild the lexical index from the docstore if it has drifted from the vector index"""
+        if len(self.lexical_index) == len(self.index_to_docstore_id):
+            return
+        self._lexical_index = BM25Index()
+        doc_ids = list(self.index_to_docstore_id.values())
+        self._lexical_index.add(doc_ids, [self.docstore.search(doc_id).page_content for doc_id in doc_ids])
+
+    def delete(self, ids: list = None, **kwargs):
+        self._check_writable()
+        result = super().delete(ids, **kwargs)
+        self.lexical_index.remove(ids)
+        return result
+
+    def _l2_distances(self, distances: np.ndarray) -> np.ndarray:
+        """
+        Squared-L2 distances between unit vectors, whatever the index measured
+
+        Binary indexes return Hamming distances; h differing sign bits out of d estimate
+        the angle between the vectors as pi * h / d.
+        """
+        import faiss
+        if not isinstance(self.index, faiss.IndexLSH):
+            return distances
+        return 2.0 - 2.0 * np.cos(math.pi * np.asarray(distances) / self.index.nbits)
+
+    def similarity_search_with_score_by_vector(self, embedding: list, k: int = 4, **kwargs) -> list:
+        results = super().similarity_search_with_score_by_vector(embedding, k, **kwargs)
+        distances = self._l2_distances(np.array([distance for _, distance in results], dtype=np.float32))
+        return [(doc, float(distance)) for (doc, _), distance in zip(results, distances)]
+
+    def lexical_search(self, query: str, k: int = 4) -> list:
+        """BM25-only search; returns (Document, score) pairs"""
+        self.sync_lexical_index()
+        return [(self.docstore.search(doc_id), score) for doc_id, score in self.lexical_index.search(query, k)]
+
+    def hybrid_search_with_scores(self, query: str, k: int = 4, fetch_k: int = HYBRID_FETCH_K,
+                                  embedding: list = None) -> list:
+        """
+        Dense + BM25 retrieval fused with reciprocal-rank fusion, keeping each retriever's score
+
+        Args:
+            query: The user's question
+            k: Number of Documents to return
+            fetch_k: Candidates taken from each retriever before fusion
+            embedding: Precomputed query embedding (the query is embedded if None)
+
+        Returns:
+            List of (Document, fused_score, dense_distance, bm25_score), best first; a score
+            is None when that retriever did not return the Document
+        """
+        self.sync_lexical_index()
+        if embedding is None:
+            embedding = self._embed_query(query)
+        dense = self.similarity_search_with_score_by_vector(embedding, k=fetch_k)
+        return self._fuse(query, dense, k, fetch_k)
+
+    def _fuse(self, query: str, dense: list, k: int, fetch_k: int) -> list:
+        """Fuse dense (Document, distance) results with a BM25 search for the same query"""
+        distances = {doc.id: distance for doc, distance in dense}
+        lexical = dict(self.lexical_index.search(query, fetch_k))
+
+        return [
+            (self.docstore.search(doc_id), score, distances.get(doc_id), lexical.get(doc_id))
+            for doc_id, score in reciprocal_rank_fusion([list(distances), list(lexical)], k)
+        ]
+
+    def similarity_search_with_score_by_vectors(self, embeddings: np.ndarray, k: int = 4) -> list:
+        """
+        similarity_search_with_score_by_vector for many queries in one FAISS search
+
+        Args:
+            embeddings: (n_queries, dim) matrix of query embeddings
+            k: Documents per query
+
+        Returns:
+            One list of (Document, distance) per query, best first
+        """
+        import faiss
+
+        # A copy: normalize_L2 works in place
+        vectors = np.array(embeddings, dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vectors)
+        distances, indices = self.index.search(vectors, k)
+        distances = self._l2_distances(distances)
+        return [
+            [(self.docstore.search(self.index_to_docstore_id[i]), float(distance))
+             for i, distance in zip(row_indices, row_distances) if i != -1]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+
+    def hybrid_search_batch_with_scores(self, queries: list, embeddings: np.ndarray, k: int = 4,
+                                        fetch_k: int = HYBRID_FETCH_K) -> list:
+        """
+        hybrid_search_with_scores for many queries, with one FAISS search for all of them
+
+        Args:
+            queries: The questions (for BM25)
+            embeddings: (len(queries), dim) matrix of their embeddings
+            k: Documents per query
+            fetch_k: Candidates taken from each retriever before fusion
+
+        Returns:
+            One list of (Document, fused_score, dense_distance, bm25_score) per query
+        """
+        self.sync_lexical_index()
+        dense = self.similarity_search_with_score_by_vectors(embeddings, fetch_k)
+        return [self._fuse(query, results, k, fetch_k) for query, results in zip(queries, dense)]
+
+    def hybrid_search(self, query: str, k: int = 4, fetch_k: int = HYBRID_FETCH_K) -> list:
+        """
+        Dense + BM25 retrieval fused with reciprocal-rank fusion
+
+        Args:
+            query: The user's question
+            k: Number of Documents to return
+            fetch_k: Candidates taken from each retriever before fusion
+
+        Returns:
+            List of Documents, best first
+        """
+        return [doc for doc, *_ in self.hybrid_search_with_scores(query, k, fetch_k)]
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        if DOCSTORE_LAYOUT == "compact":
+            # langchain's pickle only gets an empty docstore; load_local opens the compact one
+            from langchain_community.docstore.in_memory import InMemoryDocstore
+            os.makedirs(folder_path, exist_ok=True)
+            CompactDocstore.from_store(self).save(folder_path, index_name)
+            shell = copy.copy(self)
+            shell.docstore, shell.index_to_docstore_id = InMemoryDocstore({}), {}
+            FAISS.save_local(shell, folder_path, index_name)
+        else:
+            super().save_local(folder_path, index_name)
+        self.sync_lexical_index()
+        with open(os.path.join(folder_path, f"{index_name}.bm25"), "wb") as f:
+            pickle.dump(self.lexical_index, f)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings, index_name: str = "index", **kwargs) -> "HybridFAISS":
+        store = super().load_local(folder_path, embeddings, index_name=index_name, **kwargs)
+        import faiss
+        store._read_only = bool(kwargs.get("io_flags", 0) & faiss.IO_FLAG_READ_ONLY)
+        if CompactDocstore.exists(folder_path, index_name):
+            store.docstore = CompactDocstore.load(folder_path, index_name)
+            positions = store.docstore.positions()
+            # A writable store gets a dict it can update as chunks are added and deleted
+            store.index_to_docstore_id = positions if store.read_only else dict(positions)
+        lexical_path = os.path.join(folder_path, f"{index_name}.bm25")
+        if os.path.exists(lexical_path):
+            with open(lexical_path, "rb") as f:
+                store._lexical_index = pickle.load(f)
+        return store
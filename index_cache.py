@@ -0,0 +1,129 @@
+"""
+Persistent, content-addressed cache of FAISS indexes
+An index is stored under a key derived from the uploaded file contents, the chunking
+parameters and the embedding model name, so re-uploading a known corpus skips parsing,
+splitting and embedding entirely.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+# Where indexes are stored (override with the GEMMA3_INDEX_CACHE environment variable)
+INDEX_CACHE_DIR = os.environ.get(
+    "GEMMA3_INDEX_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "gemma3-assistant", "indexes")
+)
+
+
+# Bump when the stored chunk layout/metadata changes so stale entries are not reused
+INDEX_FORMAT_VERSION = 3
+
+
+def file_digest(data: bytes) -> str:
+    """SHA-256 hex digest of a file's raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def corpus_key(files: list, chunking: str, model_name: str, index_type: str = "flat") -> str:
+    """
+    Compute the cache key of a corpus
+
+    Args:
+        files: List of (file_name, raw_bytes) tuples
+        chunking: Chunking method and parameters (see ingest.chunking_key)
+        model_name: Embedding model name
+        index_type: FAISS index type the corpus is stored with
+
+    Returns:
+        Hex digest identifying the index built from these inputs
+    """
+    file_digests = [(name, file_digest(data)) for name, data in files]
+    return corpus_key_from_digests(file_digests, chunking, model_name, index_type)
+
+
+def corpus_key_from_digests(file_digests: list, chunking: str, model_name: str,
+                            index_type: str = "flat") -> str:
+    """corpus_key for files whose digests are already known, as (file_name, digest) tuples"""
+    h = hashlib.sha256()
+    h.update(f"v{INDEX_FORMAT_VERSION}|{model_name}|{chunking}|{index_type}".encode())
+    # Sort so the key does not depend on upload order; names are stored in chunk metadata
+    for name, digest in sorted(file_digests):
+        h.update(f"|{name}:{digest}".encode())
+    return h.hexdigest()
+
+
+def _index_path(key: str, cache_dir: str = None) -> str:
+    return os.path.join(cache_dir or INDEX_CACHE_DIR, key)
+
+
+def has_index(key: str, cache_dir: str = None) -> bool:
+    return os.path.exists(os.path.join(_index_path(key, cache_dir), "index.faiss"))
+
+
+def load_index(key: str, embeddings, cache_dir: str = None, io_flags: int = 0):
+    """
+    Load a cached index
+
+    Args:
+        key: corpus_key of the index
+        embeddings: Embeddings model for queries
+        cache_dir: Cache directory (defaults to INDEX_CACHE_DIR)
+        io_flags: FAISS read flags, e.g. index_registry.mmap_flags() for a shared read-only map
+
+    Returns:
+        The HybridFAISS vector store, or None if the key is not cached
+    """
+    if not has_index(key, cache_dir):
+        return None
+
+    from hybrid_store import HybridFAISS
+
+    # The cache only ever contains indexes written by save_index below
+    return HybridFAISS.load_local(
+        _index_path(key, cache_dir), embeddings, allow_dangerous_deserialization=True, io_flags=io_flags
+    )
+
+
+def save_index(key: str, vector_store: "FAISS", cache_dir: str = None) -> str:
+    """
+    Save an index under its key, replacing any previous entry
+
+    Readers see the previous entry or the new one, never a partial one. A directory
+    cannot be renamed over a non-empty one, so the previous entry is first moved aside;
+    a load in that instant (or after a crash there) finds no entry and is a cache miss.
+
+    Returns:
+        The directory the index was written to
+    """
+    path = _index_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a sibling temp dir first so readers never see a half-written index
+    tmp_path = tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=os.path.dirname(path))
+    old_path = None
+    try:
+        vector_store.save_local(tmp_path)
+        if os.path.exists(path):
+            old_path = f"{tmp_path}-old"
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+    finally:
+        if old_path is not None and not os.path.exists(path):
+            # The swap failed; put the previous entry back
+            os.replace(old_path, path)
+        for leftover in (tmp_path, old_path):
+            if leftover is not None and os.path.exists(leftover):
+                shutil.rmtree(leftover, ignore_errors=True)
+
+    return path
+
+
+def clear_cache(cache_dir: str = None):
+    """Delete every cached index"""
+    shutil.rmtree(cache_dir or INDEX_CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,198 @@
+"""
+Process-wide registry of shared, memory-mapped vector indexes
+Indexes live on disk in the index cache, keyed by corpus (see index_cache.corpus_key).
+Sessions that upload the same documents get the same read-only store, opened with FAISS
+memory mapping, so the vectors are paged in from the OS page cache once and shared by
+every session and every process that opens the same files. Memory therefore grows with
+the number of distinct corpora rather than the number of users.
+
+Each session holds an IndexLease; an index whose last lease is released stays open for
+reuse until more than MAX_IDLE_INDEXES idle indexes are open.
+"""
+
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from index_cache import has_index, load_index, save_index
+
+if TYPE_CHECKING:
+    from hybrid_store import HybridFAISS
+
+logger = logging.getLogger(__name__)
+
+# Unused indexes kept open (override with GEMMA3_MAX_IDLE_INDEXES)
+MAX_IDLE_INDEXES = int(os.environ.get("GEMMA3_MAX_IDLE_INDEXES", 4))
+
+
+def mmap_flags() -> int:
+    """FAISS read flags that map the stored vectors instead of copying them into memory"""
+    import faiss
+    # IO_FLAG_MMAP_IFC (FAISS >= 1.8) maps flat, HNSW and IVF storage; plain IO_FLAG_MMAP
+    # only maps IVF inverted lists
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+@dataclass
+class _Entry:
+    vector_store: "HybridFAISS"
+    refs: int = 0
+
+
+class IndexLease:
+    """
+    A session's hold on a shared index
+
+    The lease is released by release() or when it is garbage collected, whichever
+    comes first.
+    """
+
+    def __init__(self, registry: "IndexRegistry", key: str, vector_store: "HybridFAISS"):
+        self.key = key
+        self.vector_store = vector_store
+        self._registry = registry
+        self._finalizer = weakref.finalize(self, registry._release, key)
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    @property
+    def sessions(self) -> int:
+        """Leases currently held on this index, this one included"""
+        return self._registry.refs(self.key)
+
+    def release(self):
+        self._finalizer()
+
+
+class IndexRegistry:
+    """
+    Open each cached index once, memory-mapped and read-only, and share it
+
+    Usage:
+        registry = get_index_registry()
+        lease = registry.acquire(key, embeddings)       # None if not cached
+        if lease is None:
+            with registry.building(key):                # one session embeds, others wait
+                ...
+                lease = registry.publish(key, vector_store)
+        answer = get_rag_response(question, lease.vector_store)
+        lease.release()
+    """
+
+    def __init__(self, max_idle: int = MAX_IDLE_INDEXES, cache_dir: str = None):
+        self.max_idle = max_idle
+        self.cache_dir = cache_dir
+        self._entries = {}
+        self._idle = OrderedDict()
+        self._build_locks = {}
+        # Reentrant: a lease collected by the GC releases itself from whatever code is running
+        self._lock = threading.RLock()
+        self.stats = {"opened": 0, "shared": 0, "published": 0, "evicted": 0}
+
+    def _lease(self, key: str, entry: _Entry) -> IndexLease:
+        entry.refs += 1
+        self._idle.pop(key, None)
+        return IndexLease(self, key, entry.vector_store)
+
+    def acquire(self, key: str, embeddings) -> IndexLease:
+        """
+        Lease the index cached under key, opening it if no session has it open
+
+        Returns:
+            IndexLease, or None if no index is cached under key
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.stats["shared"] += 1
+                return self._lease(key, entry)
+
+        # Opened outside the lock; if two sessions race, the first one stored wins
+        vector_store = load_index(key, embeddings, self.cache_dir, io_flags=mmap_flags())
+        if vector_store is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(vector_store)
+                self.stats["opened"] += 1
+                logger.info("Opened shared index %s (%d vectors)", key[:12], vector_store.index.ntotal)
+            else:
+                self.stats["shared"] += 1
+            return self._lease(key, entry)
+
+    def publish(self, key: str, vector_store: "HybridFAISS") -> IndexLease:
+        """
+        Save a freshly built index under key and lease its shared, memory-mapped copy
+
+        The caller can drop its in-memory store afterwards.
+        """
+        # Keys are content-addressed: an index already on disk holds the same corpus
+        if not has_index(key, self.cache_dir):
+            save_index(key, vector_store, self.cache_dir)
+            self.stats["published"] += 1
+        return self.acquire(key, vector_store.embeddings)
+
+    @contextmanager
+    def building(self, key: str):
+        """Serialize builds of one corpus, so concurrent uploads embed it once"""
+        with self._lock:
+            lock, users = self._build_locks.get(key, (threading.Lock(), 0))
+            self._build_locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._build_locks[key]
+                if users == 1:
+                    del self._build_locks[key]
+                else:
+                    self._build_locks[key] = (lock, users - 1)
+
+    def refs(self, key: str) -> int:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.refs if entry is not None else 0
+
+    def _release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            self._idle[key] = entry
+            while len(self._idle) > self.max_idle:
+                evicted, _ = self._idle.popitem(last=False)
+                del self._entries[evicted]
+                self.stats["evicted"] += 1
+                logger.info("Closed idle shared index %s", evicted[:12])
+
+    def __len__(self) -> int:
+        """Indexes currently open, in use or idle"""
+        with self._lock:
+            return len(self._entries)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_index_registry() -> IndexRegistry:
+    """The process-wide IndexRegistry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = IndexRegistry()
+    return _registry
@@ -0,0 +1,392 @@
+"""
+Async inference service shared by all chat sessions
+Generations run on one asyncio event loop in a background thread and talk to Ollama
+(or an OpenAI-compatible server, see llm_backends) through a pooled HTTP client. At most `max_inflight` generations run at once (match it to
+OLLAMA_NUM_PARALLEL, which batches concurrent requests on the server); everything else
+waits in per-session priority queues that are served round-robin, so one busy session
+cannot starve the others. Identical concurrent requests share a single generation, a
+session can only queue a bounded number of requests, and requests are cancelled when
+their consumer goes away.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from typing import Iterator
+
+# Generations running against Ollama at once (override with GEMMA3_MAX_INFLIGHT)
+MAX_INFLIGHT = int(os.environ.get("GEMMA3_MAX_INFLIGHT", 2))
+
+# Requests one session may have waiting before new ones are rejected
+MAX_QUEUED_PER_SESSION = int(os.environ.get("GEMMA3_MAX_QUEUED_PER_SESSION", 4))
+
+# Seconds to wait for Ollama to connect / to send the next token
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 300.0
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+DEFAULT_SESSION = "default"
+
+# Streaming formats: Ollama's NDJSON (/api/generate) or OpenAI-style server-sent events
+PROTOCOLS = ("ollama", "openai")
+
+_DONE = object()
+
+
+class ServiceBusyError(RuntimeError):
+    """Raised when a session already has MAX_QUEUED_PER_SESSION requests waiting"""
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised by a stream whose request was cancelled (cancel_session, cancel_all, close)"""
+
+
+def parse_stream_line(protocol: str, line: str) -> tuple:
+    """
+    Decode one line of a streamed completion
+
+    Returns:
+        (token, final): the text it adds ("" if none) and, on the last event, the final
+        event (Ollama's, with context and counts, or {} / the usage for OpenAI), else None
+
+    Raises:
+        RuntimeError: The server reported an error
+    """
+    if protocol == "openai":
+        if not line.startswith("data:"):
+            return "", None
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return "", {}
+        event = json.loads(data)
+        if event.get("error"):
+            raise RuntimeError(f"LLM server error: {event['error']}")
+        choice = (event.get("choices") or [{}])[0]
+        token = (choice.get("delta") or {}).get("content") or choice.get("text") or ""
+        return token, None
+    event = json.loads(line)
+    if event.get("error"):
+        raise RuntimeError(f"Ollama error: {event['error']}")
+    return event.get("response") or "", event if event.get("done") else None
+
+
+class _Job:
+    """One generation, possibly shared by several identical requests"""
+
+    def __init__(self, key: str, url: str, payload: dict, session_id: str, priority: int, seq: int,
+                 protocol: str = "ollama"):
+        self.key = key
+        self.url = url
+        self.payload = payload
+        self.protocol = protocol
+        self.session_id = session_id
+        self.priority = priority
+        self.seq = seq
+        self.subscribers = {}   # subscriber id -> (session_id, sink)
+        self.tokens = []        # everything produced so far, replayed to late subscribers
+        self.final = {}         # Ollama's last event: context, prompt_eval_count, durations...
+        self.task = None
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished = False
+
+    def publish(self, event):
+        if event is not _DONE and not isinstance(event, BaseException):
+            self.tokens.append(event)
+        for _, sink in list(self.subscribers.values()):
+            sink(event)
+
+
+class InferenceService:
+    """
+    Concurrency-limited, fair scheduler for streaming generations (Ollama or OpenAI-compatible)
+
+    Args:
+        max_inflight: Generations running at once
+        max_queued_per_session: Waiting requests allowed per session
+    """
+
+    def __init__(self, max_inflight: int = MAX_INFLIGHT, max_queued_per_session: int = MAX_QUEUED_PER_SESSION):
+        self.max_inflight = max_inflight
+        self.max_queued_per_session = max_queued_per_session
+        self._loop = None
+        self._client = None
+        self._start_lock = threading.Lock()
+        # State below is only touched on the event loop thread
+        self._pending = {}       # session_id -> heap of (priority, seq, job)
+        self._last_served = {}   # session_id -> dispatch number of its last started job
+        self._running = set()
+        self._jobs_by_key = {}
+        self._seq = itertools.count()
+        self._dispatches = itertools.count(1)
+        self._subscriber_ids = itertools.count()
+        self._metrics = {"submitted": 0, "coalesced": 0, "completed": 0, "cancelled": 0,
+                         "rejected": 0, "failed": 0, "started": 0, "queue_seconds": 0.0}
+
+    # -- event loop ---------------------------------------------------------
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="inference-service", daemon=True)
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _call(self, fn, *args):
+        """Run fn(*args) on the event loop thread and return its result"""
+        loop = self._ensure_started()
+
+        async def _run():
+            return fn(*args)
+
+        return asyncio.run_coroutine_threadsafe(_run(), loop).result()
+
+    def start(self):
+        """Start the event loop and create the HTTP client ahead of the first request"""
+        self._call(self._get_client)
+        return self
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_inflight,
+                                    max_keepalive_connections=self.max_inflight),
+            )
+        return self._client
+
+    def close(self):
+        """Cancel everything, close the HTTP client and stop the event loop"""
+        if self._loop is None:
+            return
+        self.cancel_all()
+
+        async def _close():
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    # -- scheduling (event loop thread) --------------------------------------
+
+    def _subscribe(self, url: str, payload: dict, session_id: str, priority: int, sink,
+                   protocol: str = "ollama") -> tuple:
+        key = url + "\0" + json.dumps(payload, sort_keys=True)
+        job = self._jobs_by_key.get(key)
+        if job is not None:
+            self._metrics["coalesced"] += 1
+        else:
+            waiting = len(self._pending.get(session_id, ()))
+            if waiting >= self.max_queued_per_session:
+                self._metrics["rejected"] += 1
+                raise ServiceBusyError(
+                    f"Session {session_id!r} already has {waiting} requests waiting; try again shortly"
+                )
+            job = _Job(key, url, payload, session_id, priority, next(self._seq), protocol)
+            self._jobs_by_key[key] = job
+            heapq.heappush(self._pending.setdefault(session_id, []), (priority, job.seq, job))
+            self._metrics["submitted"] += 1
+
+        subscriber_id = next(self._subscriber_ids)
+        job.subscribers[subscriber_id] = (session_id, sink)
+        for token in job.tokens:
+            sink(token)
+        self._dispatch()
+        return job, subscriber_id
+
+    def _unsubscribe(self, job: _Job, subscriber_id: int):
+        if job.subscribers.pop(subscriber_id, None) is None or job.subscribers or job.finished:
+            return
+        # Nobody is listening any more
+        self._metrics["cancelled"] += 1
+        self._jobs_by_key.pop(job.key, None)
+        job.finished = True
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            heap = self._pending.get(job.session_id, [])
+            heap[:] = [entry for entry in heap if entry[2] is not job]
+            heapq.heapify(heap)
+            if not heap:
+                self._pending.pop(job.session_id, None)
+
+    def _next_job(self):
+        """Best priority first; among equals, the session served longest ago, then FIFO"""
+        best = None
+        for session_id, heap in self._pending.items():
+            priority, seq, job = heap[0]
+            rank = (priority, self._last_served.get(session_id, 0), seq)
+            if best is None or rank < best[0]:
+                best = (rank, session_id)
+        if best is None:
+            return None
+        session_id = best[1]
+        heap = self._pending[session_id]
+        job = heapq.heappop(heap)[2]
+        if not heap:
+            del self._pending[session_id]
+        self._last_served[session_id] = next(self._dispatches)
+        return job
+
+    def _dispatch(self):
+        while len(self._running) < self.max_inflight:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running.add(job)
+            job.task = self._loop.create_task(self._run(job))
+            # A callback rather than a finally: a task cancelled before its first step never runs its body
+            job.task.add_done_callback(lambda _, job=job: self._finish(job))
+
+    async def _run(self, job: _Job):
+        job.started_at = time.perf_counter()
+        self._metrics["started"] += 1
+        self._metrics["queue_seconds"] += job.started_at - job.submitted_at
+        try:
+            async with self._get_client().stream("POST", job.url, json=job.payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    token, final = parse_stream_line(job.protocol, line)
+                    if token:
+                        job.publish(token)
+                    if final is not None:
+                        job.final = final
+                        break
+            self._metrics["completed"] += 1
+            job.publish(_DONE)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._metrics["failed"] += 1
+            job.publish(e)
+
+    def _finish(self, job: _Job):
+        """Free a finished or cancelled job's slot and start the next one"""
+        job.finished = True
+        if self._jobs_by_key.get(job.key) is job:
+            del self._jobs_by_key[job.key]
+        self._running.discard(job)
+        self._dispatch()
+
+    def _cancel_where(self, predicate):
+        for job in list(self._running) + [entry[2] for heap in self._pending.values() for entry in heap]:
+            for subscriber_id, (session_id, sink) in list(job.subscribers.items()):
+                if predicate(session_id):
+                    self._unsubscribe(job, subscriber_id)
+                    sink(asyncio.CancelledError())
+
+    # -- public API (any thread) ---------------------------------------------
+
+    def stream(self, url: str, payload: dict, session_id: str = DEFAULT_SESSION,
+               priority: int = PRIORITY_INTERACTIVE, on_done=None, protocol: str = "ollama") -> Iterator[str]:
+        """
+        Queue a generation and stream its tokens (blocking iterator for synchronous callers)
+
+        Closing the iterator early, or dropping it, cancels the request.
+
+        Args:
+            url: Ollama /api/generate URL, or an OpenAI-compatible /chat/completions URL
+            payload: Request body; "stream" is forced on
+            session_id: Fairness/cancellation group, typically one per browser session
+            priority: PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND or any int (lower first)
+            on_done: Optional callable(final_event) run after the last token, with Ollama's
+                final event (context, prompt_eval_count, ...)
+            protocol: "ollama" or "openai", the server's streaming format
+
+        Yields:
+            Response tokens as Ollama produces them
+
+        Raises:
+            ServiceBusyError: The session already has too many requests waiting
+            GenerationCancelled: The request was cancelled before it finished, so the
+                tokens so far are not a complete answer
+        """
+        events = queue.SimpleQueue()
+        job, subscriber_id = self._call(self._subscribe, url, {**payload, "stream": True},
+                                        session_id, priority, events.put, protocol)
+        try:
+            while True:
+                event = events.get()
+                if event is _DONE:
+                    if on_done is not None:
+                        on_done(job.final)
+                    return
+                if isinstance(event, asyncio.CancelledError):
+                    raise GenerationCancelled("Generation cancelled")
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._unsubscribe, job, subscriber_id)
+
+    async def astream(self, url: str, payload: dict, session_id: str = DEFAULT_SESSION,
+                      priority: int = PRIORITY_INTERACTIVE, on_done=None, protocol: str = "ollama"):
+        """Async-iterator version of stream(), usable from any event loop (raises the same errors)"""
+        consumer_loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def sink(event):
+            consumer_loop.call_soon_threadsafe(events.put_nowait, event)
+
+        service_loop = self._ensure_started()
+        job, subscriber_id = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            self._async_subscribe(url, {**payload, "stream": True}, session_id, priority, sink, protocol),
+            service_loop
+        ))
+        try:
+            while True:
+                event = await events.get()
+                if event is _DONE:
+                    if on_done is not None:
+                        on_done(job.final)
+                    return
+                if isinstance(event, asyncio.CancelledError):
+                    raise GenerationCancelled("Generation cancelled")
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            service_loop.call_soon_threadsafe(self._unsubscribe, job, subscriber_id)
+
+    async def _async_subscribe(self, *args):
+        return self._subscribe(*args)
+
+    def cancel_session(self, session_id: str):
+        """Cancel every waiting and running request of a session (e.g. when its user leaves)"""
+        if self._loop is not None:
+            self._call(self._cancel_where, lambda owner: owner == session_id)
+
+    def cancel_all(self):
+        if self._loop is not None:
+            self._call(self._cancel_where, lambda owner: True)
+
+    def stats(self) -> dict:
+        """Counters plus current queue depth, in-flight count and mean queue wait"""
+        def _snapshot():
+            metrics = dict(self._metrics)
+            metrics["in_flight"] = len(self._running)
+            metrics["queued"] = sum(len(heap) for heap in self._pending.values())
+            return metrics
+
+        metrics = self._call(_snapshot) if self._loop is not None else dict(self._metrics)
+        started = metrics["started"]
+        metrics["mean_queue_ms"] = 1000 * metrics.pop("queue_seconds") / started if started else 0.0
+        return metrics
@@ -0,0 +1,506 @@
+"""
+Document ingestion pipeline: load, split and embed uploaded files
+Loading and splitting run in parallel across a process pool (PDF parsing is CPU-bound
+pure Python); chunks are handed to the embedding stage as soon as each file finishes,
+so embedding overlaps with parsing of the remaining files.
+
+Memory stays bounded by the batch size rather than the corpus size: uploads are spooled
+to disk and workers get paths, not bytes; pages are loaded lazily and their chunks spilled
+to disk in batches; the embedding stage reads one batch at a time into the index.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# Chunking: "structure" (chunker.StructureChunker, token-measured, per file type) or
+# "recursive" (the character-based LangChain splitter below); override with GEMMA3_CHUNKER
+CHUNKER = os.environ.get("GEMMA3_CHUNKER", "structure")
+
+# Recursive splitter parameters, in characters
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Worker processes for loading/splitting (override with GEMMA3_INGEST_WORKERS)
+INGEST_WORKERS = int(os.environ.get("GEMMA3_INGEST_WORKERS", os.cpu_count() or 1))
+
+# Chunks embedded and added to the index at a time (override with GEMMA3_INGEST_BATCH)
+INGEST_BATCH_CHUNKS = int(os.environ.get("GEMMA3_INGEST_BATCH", 256))
+
+# Copy size when spooling uploads, and the block a TXT file is read in as one "page"
+SPOOL_BLOCK_BYTES = 1024 * 1024
+TEXT_BLOCK_CHARS = 64 * 1024
+
+
+# Loader class (in langchain_community.document_loaders) for each supported upload type;
+# imported on first use to keep module import cheap for the worker processes
+LOADERS = {
+    'pdf': 'PyPDFLoader',
+    'docx': 'Docx2txtLoader',
+    'txt': 'TextLoader',
+}
+
+
+@dataclass
+class SpooledFile:
+    """An upload copied to a file on disk, with the digest of its contents"""
+    file_name: str
+    path: str
+    digest: str
+    size: int
+
+
+def spool_upload(upload, spool_dir: str) -> SpooledFile:
+    """
+    Copy one upload to spool_dir, hashing it on the way
+
+    Args:
+        upload: A file-like object with a name (e.g. a Streamlit UploadedFile), a
+            (file_name, raw_bytes) tuple, or an already spooled file (returned as is)
+        spool_dir: Directory to write to
+
+    Returns:
+        SpooledFile
+    """
+    if isinstance(upload, SpooledFile):
+        return upload
+
+    digest = hashlib.sha256()
+    if isinstance(upload, tuple):
+        file_name, data = upload
+        blocks = [data]
+    else:
+        # Read in blocks: getvalue() would make another full copy of the upload
+        file_name = upload.name
+        upload.seek(0)
+        blocks = iter(lambda: upload.read(SPOOL_BLOCK_BYTES), b"")
+
+    file_extension = file_name.split('.')[-1].lower()
+    fd, path = tempfile.mkstemp(suffix=f".{file_extension}", dir=spool_dir)
+    size = 0
+    with os.fdopen(fd, "wb") as spool:
+        for block in blocks:
+            digest.update(block)
+            spool.write(block)
+            size += len(block)
+    return SpooledFile(file_name, path, digest.hexdigest(), size)
+
+
+@contextmanager
+def spool_uploads(uploads) -> Iterator[list]:
+    """
+    Spool uploads to a temporary directory that is deleted afterwards
+
+    Usage:
+        with spool_uploads(uploaded_files) as files:
+            vector_store, stats = ingest_files(files, embeddings)
+
+    Yields:
+        List of SpooledFile, in upload order
+    """
+    spool_dir = tempfile.mkdtemp(prefix="gemma3-ingest-")
+    try:
+        yield [spool_upload(upload, spool_dir) for upload in uploads]
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+def _iter_text_blocks(path: str) -> Iterator:
+    """
+    TXT files as a series of ~TEXT_BLOCK_CHARS Documents, cut at paragraph (or line) breaks
+
+    Files under two blocks come back whole, as TextLoader would return them.
+    """
+    from langchain_core.documents import Document
+
+    with open(path) as f:
+        text = ""
+        for block in iter(lambda: f.read(TEXT_BLOCK_CHARS), ""):
+            text += block
+            while len(text) >= 2 * TEXT_BLOCK_CHARS:
+                cut = text.rfind("\n\n", 0, TEXT_BLOCK_CHARS)
+                if cut <= 0:
+                    cut = text.rfind("\n", 0, TEXT_BLOCK_CHARS)
+                if cut <= 0:
+                    cut = TEXT_BLOCK_CHARS
+                yield Document(page_content=text[:cut], metadata={})
+                text = text[cut:].lstrip("\n")
+        if text.strip():
+            yield Document(page_content=text, metadata={})
+
+
+def load_file(file: SpooledFile) -> Iterator:
+    """
+    Parse one spooled file into Documents, one page at a time
+
+    Args:
+        file: The spooled upload (the extension of its name selects the loader)
+
+    Yields:
+        Documents tagged with the file name and content digest; nothing for
+        unsupported file types
+    """
+    file_extension = file.file_name.split('.')[-1].lower()
+    if file_extension not in LOADERS:
+        return
+
+    if file_extension == 'txt':
+        pages = _iter_text_blocks(file.path)
+    else:
+        from langchain_community import document_loaders
+        loader_class = getattr(document_loaders, LOADERS[file_extension])
+        pages = loader_class(file.path).lazy_load()
+
+    for doc in pages:
+        doc.metadata["source"] = file.file_name
+        doc.metadata["file_digest"] = file.digest
+        yield doc
+
+
+@lru_cache(maxsize=1)
+def _get_recursive_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+    )
+
+
+def get_splitter(file_type: str, chunker: str = None):
+    """
+    Splitter for the pages of one file
+
+    Args:
+        file_type: File extension without the dot, selecting the chunk config
+        chunker: "structure" or "recursive" (defaults to CHUNKER)
+
+    Returns:
+        An object with split_documents(documents); structure chunkers keep state across
+        the pages of a file, so get a new one per file
+    """
+    chunker = chunker or CHUNKER
+    if chunker == "recursive":
+        return _get_recursive_splitter()
+    if chunker != "structure":
+        raise ValueError(f"Unknown chunker {chunker!r}, expected 'structure' or 'recursive'")
+    from chunker import StructureChunker, chunk_config
+    return StructureChunker(chunk_config(file_type))
+
+
+def split_documents(documents: list, file_type: str = "txt") -> list:
+    """Split the pages of one file into chunks for embedding"""
+    return get_splitter(file_type).split_documents(documents)
+
+
+def chunking_key(chunker: str = None) -> str:
+    """The chunking method and its parameters, as part of the index cache key"""
+    chunker = chunker or CHUNKER
+    if chunker == "recursive":
+        return f"recursive:{CHUNK_SIZE}/{CHUNK_OVERLAP}"
+    from chunker import config_key
+    return f"{chunker}:{config_key()}"
+
+
+def chunk_ids(file_name: str, digest: str, count: int) -> list:
+    """Stable vector-store IDs for the chunks of one file version"""
+    file_id = hashlib.sha1(f"{file_name}:{digest}".encode()).hexdigest()[:16]
+    return [f"{file_id}-{i}" for i in range(count)]
+
+
+class IngestCancelled(Exception):
+    """
+    Raised by ingest_files when its IngestProgress asks it to stop
+
+    Files embedded before the request stay in `vector_store`; chunks of the file that was
+    being embedded are removed again.
+    """
+
+    def __init__(self, vector_store: "FAISS", stats: "IngestStats"):
+        super().__init__("Ingestion cancelled")
+        self.vector_store = vector_store
+        self.stats = stats
+
+
+class IngestProgress:
+    """
+    Progress hooks for ingest_files and DocumentRegistry.sync, and the way to cancel them
+
+    The base class ignores progress and never cancels; ingest_jobs.IngestJob records it.
+    """
+
+    def plan(self, changes: dict):
+        """The file names that will be added, replaced, removed and left unchanged"""
+
+    def stage(self, stage: str):
+        """The run moved to a new stage: waiting, removing, ingesting, indexing or publishing"""
+
+    def file_parsed(self, result: "FileChunks"):
+        """A file was loaded and split; its chunks are about to be embedded"""
+
+    def batch_embedded(self, result: "FileChunks", embedded: int):
+        """`embedded` of the file's chunks are now in the index"""
+
+    def file_done(self, result: "FileChunks"):
+        """All of a file's chunks are in the index"""
+
+    def cancelled(self) -> bool:
+        return False
+
+
+NO_PROGRESS = IngestProgress()
+
+
+@dataclass
+class IngestStats:
+    """Per-stage timings of one ingestion run, in seconds (load/split are summed across workers)"""
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    batches: int = 0
+    workers: int = 1
+    load_seconds: float = 0.0
+    split_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    per_file: dict = field(default_factory=dict)
+
+    def summary(self) -> str:
+        return (
+            f"{self.files} files, {self.pages} pages, {self.chunks} chunks in {self.wall_seconds:.2f}s "
+            f"({self.workers} workers; load {self.load_seconds:.2f}s, split {self.split_seconds:.2f}s, "
+            f"embed {self.embed_seconds:.2f}s)"
+        )
+
+
+@dataclass
+class FileChunks:
+    """Output of the load+split stage for one file; the chunks themselves wait on disk"""
+    file_name: str
+    digest: str
+    pages: int
+    chunk_count: int
+    ids: list
+    spill_path: str
+    load_seconds: float
+    split_seconds: float
+
+    def iter_batches(self) -> Iterator[list]:
+        """Read the chunks back, one batch of Documents at a time"""
+        with open(self.spill_path, "rb") as spill:
+            while True:
+                try:
+                    yield pickle.load(spill)
+                except EOFError:
+                    return
+
+    def discard(self):
+        if os.path.exists(self.spill_path):
+            os.unlink(self.spill_path)
+
+
+def load_and_split(file: SpooledFile, batch_size: int = INGEST_BATCH_CHUNKS) -> FileChunks:
+    """
+    Load and split one file page by page, spilling chunks in batches next to the
+    spooled file; runs inside a worker process
+    """
+    pages = chunk_count = 0
+    load_seconds = split_seconds = 0.0
+    splitter = get_splitter(file.file_name.split('.')[-1].lower())
+    fd, spill_path = tempfile.mkstemp(suffix=".chunks", dir=os.path.dirname(file.path))
+    with os.fdopen(fd, "wb") as spill:
+        batch = []
+        doc_iter = load_file(file)
+        while True:
+            start = time.perf_counter()
+            doc = next(doc_iter, None)
+            loaded = time.perf_counter()
+            load_seconds += loaded - start
+            if doc is None:
+                break
+            pages += 1
+            batch.extend(splitter.split_documents([doc]))
+            split_seconds += time.perf_counter() - loaded
+            while len(batch) >= batch_size:
+                pickle.dump(batch[:batch_size], spill, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk_count += batch_size
+                batch = batch[batch_size:]
+        if batch:
+            pickle.dump(batch, spill, protocol=pickle.HIGHEST_PROTOCOL)
+            chunk_count += len(batch)
+
+    return FileChunks(
+        file_name=file.file_name,
+        digest=file.digest,
+        pages=pages,
+        chunk_count=chunk_count,
+        ids=chunk_ids(file.file_name, file.digest, chunk_count),
+        spill_path=spill_path,
+        load_seconds=load_seconds,
+        split_seconds=split_seconds,
+    )
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Shared worker pool, reused across ingestion runs to avoid per-run startup cost"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn, not fork: the Streamlit server process is multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = max_workers
+        return _pool
+
+
+def iter_file_chunks(files: list, max_workers: int = None) -> Iterator[FileChunks]:
+    """
+    Load and split files in parallel, yielding each file's chunks as soon as it is done
+
+    Args:
+        files: List of SpooledFile (workers are sent paths, not file contents)
+        max_workers: Worker processes (defaults to INGEST_WORKERS)
+
+    Yields:
+        FileChunks in completion order; the caller discards each one's spill file
+    """
+    max_workers = min(max_workers or INGEST_WORKERS, len(files))
+
+    # Pool startup costs more than it saves for a single file
+    if max_workers <= 1:
+        for file in files:
+            yield load_and_split(file)
+        return
+
+    pool = _get_pool(max_workers)
+    futures = [pool.submit(load_and_split, file) for file in files]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def add_chunks(vector_store: "FAISS", chunks: list, ids: list, embeddings) -> "FAISS":
+    """
+    Embed chunks and add them to a FAISS store (a HybridFAISS if new) and its lexical index
+
+    Embeddings that provide embed_array (see embedding_engine) hand FAISS a float32
+    matrix directly instead of per-vector Python lists.
+    """
+    from hybrid_store import HybridFAISS
+
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+
+    if hasattr(embeddings, "embed_array"):
+        vectors = embeddings.embed_array(texts)
+    else:
+        vectors = embeddings.embed_documents(texts)
+
+    if vector_store is None:
+        vector_store = HybridFAISS.from_embeddings(zip(texts, vectors), embeddings, metadatas=metadatas, ids=ids)
+    else:
+        vector_store.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    # Keep the BM25 index next to the vectors in step
+    if isinstance(vector_store, HybridFAISS):
+        vector_store.lexical_index.add(ids, texts)
+    return vector_store
+
+
+def ingest_files(files: list, embeddings, vector_store: "FAISS" = None, max_workers: int = None,
+                 on_file=None, progress: IngestProgress = None) -> tuple:
+    """
+    Run the full pipeline: parallel load+split, then embed into a FAISS store in batches
+
+    Args:
+        files: List of SpooledFile, uploads or (file_name, raw_bytes) tuples (see spool_upload)
+        embeddings: Embeddings model used for the index
+        vector_store: Existing store to add to (a new one is created if None)
+        max_workers: Worker processes for load+split (defaults to INGEST_WORKERS)
+        on_file: Optional callback(FileChunks) invoked after each file is embedded
+        progress: IngestProgress to report to and to check for cancellation between batches
+
+    Returns:
+        (vector_store, IngestStats); vector_store is None if no chunks were produced
+
+    Raises:
+        IngestCancelled: If progress.cancelled() became true
+    """
+    progress = progress or NO_PROGRESS
+    stats = IngestStats(workers=max(1, min(max_workers or INGEST_WORKERS, len(files))))
+    start = time.perf_counter()
+
+    progress.stage("ingesting")
+    with spool_uploads(files) as spooled:
+        for result in iter_file_chunks(spooled, max_workers):
+            progress.file_parsed(result)
+            stats.files += 1
+            stats.pages += result.pages
+            stats.chunks += result.chunk_count
+            stats.load_seconds += result.load_seconds
+            stats.split_seconds += result.split_seconds
+
+            # Only one batch of chunks (and its vectors) is in memory at a time
+            embed_start = time.perf_counter()
+            offset = 0
+            try:
+                for batch in result.iter_batches():
+                    if progress.cancelled():
+                        # Leave no half-indexed file behind (IVF/HNSW indexes cannot remove_ids)
+                        if offset:
+                            from ann_index import delete_vectors
+                            vector_store = delete_vectors(vector_store, result.ids[:offset], embeddings)
+                        stats.wall_seconds = time.perf_counter() - start
+                        raise IngestCancelled(vector_store, stats)
+                    ids = result.ids[offset:offset + len(batch)]
+                    vector_store = add_chunks(vector_store, batch, ids, embeddings)
+                    offset += len(batch)
+                    stats.batches += 1
+                    progress.batch_embedded(result, offset)
+            finally:
+                result.discard()
+            embed_seconds = time.perf_counter() - embed_start
+            stats.embed_seconds += embed_seconds
+
+            stats.per_file[result.file_name] = {
+                "chunks": result.chunk_count,
+                "load_seconds": result.load_seconds,
+                "split_seconds": result.split_seconds,
+                "embed_seconds": embed_seconds,
+            }
+            if on_file is not None:
+                on_file(result)
+            progress.file_done(result)
+
+    stats.wall_seconds = time.perf_counter() - start
+    logger.info("Ingested %s", stats.summary())
+    return vector_store, stats
@@ -0,0 +1,264 @@
+"""
+Background ingestion jobs with progress reporting
+Processing documents runs DocumentRegistry.sync on a worker thread instead of inside the
+Streamlit script, so the page stays usable (Normal Chat keeps working) while a corpus
+is indexed. Each job records per-file and per-stage progress for the sidebar to poll,
+and can be cancelled between embedding batches.
+
+Jobs outlive the script run that started them: a rerun finds its job again by id, and a
+cancelled or failed job leaves the files it finished in the index, so submitting the
+same uploads again only embeds the rest.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from ingest import IngestCancelled, IngestProgress, spool_upload
+
+logger = logging.getLogger(__name__)
+
+# Jobs run at the same time (override with GEMMA3_INGEST_JOBS); each already uses the
+# ingestion worker pool, so more mostly helps when one job waits on another's corpus
+JOB_WORKERS = int(os.environ.get("GEMMA3_INGEST_JOBS", 1))
+
+# Finished jobs kept for status lookups
+MAX_FINISHED_JOBS = 64
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class FileProgress:
+    """
+    Where one file of a job is
+
+    stage is one of: queued, parsing, embedding, done, unchanged, removed
+    """
+    file_name: str
+    size: int
+    stage: str = "queued"
+    chunks: int = None
+    embedded: int = 0
+
+
+class IngestJob(IngestProgress):
+    """
+    One DocumentRegistry.sync run in the background
+
+    Attributes:
+        job_id: Id to look the job up with (IngestJobQueue.get)
+        status: queued, running, done, failed or cancelled
+        current_stage: waiting, removing, ingesting, indexing, publishing (while running)
+        files: {file_name: FileProgress}
+        changes: The sync result (added/replaced/removed/unchanged) once done
+        error: The error message if the job failed
+    """
+
+    def __init__(self, registry, files: list, spool_dir: str):
+        self.job_id = uuid.uuid4().hex
+        self.registry = registry
+        self.status = QUEUED
+        self.current_stage = QUEUED
+        self.files = {file.file_name: FileProgress(file.file_name, file.size) for file in files}
+        self.changes = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._spooled = files
+        self._spool_dir = spool_dir
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    # IngestProgress hooks, called from the job's thread
+
+    def plan(self, changes: dict):
+        for file_name in changes["unchanged"]:
+            self.files[file_name].stage = "unchanged"
+        for file_name in changes["added"] + changes["replaced"]:
+            self.files[file_name].stage = "parsing"
+        for file_name in changes["removed"]:
+            self.files[file_name] = FileProgress(file_name, 0, "removed")
+
+    def stage(self, stage: str):
+        self.current_stage = stage
+
+    def file_parsed(self, result):
+        progress = self.files[result.file_name]
+        progress.chunks = result.chunk_count
+        progress.stage = "embedding"
+
+    def batch_embedded(self, result, embedded: int):
+        self.files[result.file_name].embedded = embedded
+
+    def file_done(self, result):
+        progress = self.files[result.file_name]
+        progress.embedded = result.chunk_count
+        progress.stage = "done"
+
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    # Status
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the files to embed that are done, counting partly embedded files pro rata"""
+        if self.status == DONE:
+            return 1.0
+        work = [f for f in self.files.values() if f.stage in ("queued", "parsing", "embedding", "done")]
+        if not work:
+            return 0.0
+        done = 0.0
+        for file in work:
+            if file.stage == "done":
+                done += 1
+            elif file.stage == "embedding" and file.chunks:
+                # Parsing is roughly the first tenth of a file's work
+                done += 0.1 + 0.9 * file.embedded / file.chunks
+        return done / len(work)
+
+    def summary(self) -> str:
+        """One line for the progress bar"""
+        work = [f for f in self.files.values() if f.stage in ("queued", "parsing", "embedding", "done")]
+        done = sum(f.stage == "done" for f in work)
+        if self.status == QUEUED:
+            return "Waiting for another job to finish"
+        if self.current_stage == "waiting":
+            return "Waiting for the shared index of these files"
+        if self.current_stage in ("indexing", "publishing"):
+            return f"Finishing the index ({self.current_stage})"
+        chunks = sum(f.chunks or 0 for f in work)
+        embedded = sum(f.embedded for f in work)
+        return f"Indexed {done}/{len(work)} files · {embedded:,}/{chunks:,} chunks embedded"
+
+    def cancel(self):
+        """Stop after the current embedding batch; finished files stay indexed"""
+        self._cancel.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the job has finished; False on timeout"""
+        return self._finished.wait(timeout)
+
+    def run(self, registry_lock: threading.Lock):
+        try:
+            with registry_lock:
+                if self.cancelled():
+                    self.status = CANCELLED
+                    return
+                self.status = RUNNING
+                self.started_at = time.time()
+                try:
+                    self.changes = self.registry.sync(self._spooled, progress=self)
+                    self.status = DONE
+                except IngestCancelled:
+                    self.status = CANCELLED
+                except Exception as e:
+                    logger.exception("Ingestion job %s failed", self.job_id)
+                    self.error = str(e)
+                    self.status = FAILED
+        finally:
+            self.current_stage = self.status
+            self.finished_at = time.time()
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+            # Finished jobs are kept for a while; they must not keep a closed session's index alive
+            self.registry = None
+            self._spooled = []
+            self._finished.set()
+
+
+class IngestJobQueue:
+    """
+    Thread pool running IngestJobs; jobs on the same DocumentRegistry run one at a time
+
+    Usage:
+        job = get_job_queue().submit(registry, uploaded_files)
+        ...                                   # later, from any script run
+        job = get_job_queue().get(job_id)
+        st.progress(job.progress, text=job.summary())
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._jobs = OrderedDict()
+        self._registry_locks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def submit(self, registry, uploads) -> IngestJob:
+        """
+        Sync a registry with a set of uploads in the background
+
+        The uploads are spooled to disk before returning, since Streamlit's UploadedFiles
+        belong to the script run. An unfinished earlier job for the same registry is
+        cancelled; the new one starts when it has stopped.
+
+        Args:
+            registry: The session's DocumentRegistry
+            uploads: Uploaded files (see ingest.spool_upload)
+
+        Returns:
+            The queued IngestJob
+        """
+        spool_dir = tempfile.mkdtemp(prefix="gemma3-job-")
+        try:
+            files = [spool_upload(upload, spool_dir) for upload in uploads]
+        except BaseException:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+
+        job = IngestJob(registry, files, spool_dir)
+        with self._lock:
+            for other in self._jobs.values():
+                if other.registry is registry and not other.is_finished:
+                    other.cancel()
+            registry_lock = self._registry_locks.setdefault(registry, threading.Lock())
+            self._jobs[job.job_id] = job
+            self._trim()
+        self._executor.submit(job.run, registry_lock)
+        return job
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> IngestJob:
+        """The job with this id, or None if unknown (or long finished)"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job(self, registry) -> IngestJob:
+        """The most recent unfinished job for a registry, if any"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.registry is registry and not job.is_finished:
+                    return job
+        return None
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> IngestJobQueue:
+    """The process-wide IngestJobQueue"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestJobQueue()
+    return _queue
@@ -0,0 +1,136 @@
+"""
+Ollama KV-cache reuse across the turns of a chat session
+Ollama keeps the KV cache of the last prompt processed by a loaded model and only
+prefills the part of a new prompt that differs from it. Two things keep that part small:
+
+- Carried context: /api/generate returns `context`, the token ids of the prompt and the
+  answer. Sending it back with only the new question continues the conversation without
+  re-tokenizing or re-prefilling the earlier turns.
+- Stable prefixes: when a full prompt has to be built (first turn, history edited,
+  context too long), the system prompt and history come first, and the history window
+  only moves forward in large steps rather than by one message every turn.
+
+`keep_alive` keeps the model, and with it the cache, loaded between turns.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# How long Ollama keeps the model (and its KV cache) loaded after a request
+KEEP_ALIVE = os.environ.get("GEMMA3_KEEP_ALIVE", "30m")
+
+# Carried context is dropped, and the history re-windowed, beyond this many tokens
+# (keep it below the model's num_ctx, 2048 by default, minus room for an answer)
+KV_CONTEXT_TOKENS = int(os.environ.get("GEMMA3_KV_CONTEXT_TOKENS", 1536))
+
+MAX_SESSIONS = 256
+
+# Callers that pass no session id share this one
+DEFAULT_SESSION = "default"
+
+
+def history_key(messages: list) -> str:
+    """Fingerprint of a list of chat messages"""
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(f"{msg['role']}\0{msg['content']}\0".encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class SessionState:
+    history_start: int = 0
+    start_key: str = field(default_factory=lambda: history_key([]))
+    context: list = None
+    context_key: str = ""
+
+
+class SessionKVCache:
+    """
+    Per-session Ollama context and history window, LRU-bounded
+
+    Every lookup checks that the stored state belongs to the conversation being continued
+    (by fingerprinting the messages it covers), so an edited or cleared chat simply
+    starts over.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_context_tokens: int = KV_CONTEXT_TOKENS):
+        self.max_sessions = max_sessions
+        self.max_context_tokens = max_context_tokens
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"continued": 0, "full_prompts": 0, "prefill_tokens": 0}
+
+    def _state(self, session_id: str) -> SessionState:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = SessionState()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def context_for(self, session_id: str, chat_history: list) -> list:
+        """Context to continue from, or None if the next prompt must be built in full"""
+        with self._lock:
+            state = self._state(session_id)
+            if (state.context is not None and state.context_key == history_key(chat_history or [])
+                    and len(state.context) <= self.max_context_tokens):
+                self.stats["continued"] += 1
+                return state.context
+            self.stats["full_prompts"] += 1
+            return None
+
+    def history_window(self, session_id: str, chat_history: list, count_tokens, budget: int) -> list:
+        """
+        Messages to include in a full prompt, with a start that rarely moves
+
+        The window keeps its start while everything from there fits the budget; once it
+        doesn't, the start jumps ahead until the window fits half the budget, so the next
+        several turns again share the same prefix.
+        """
+        chat_history = chat_history or []
+        with self._lock:
+            state = self._state(session_id)
+            start = state.history_start
+            if start > len(chat_history) or history_key(chat_history[:start]) != state.start_key:
+                start = 0
+
+            sizes = [count_tokens(msg["content"]) + 2 for msg in chat_history]
+            if sum(sizes[start:]) > budget:
+                target = budget // 2
+                while start < len(chat_history) - 1 and sum(sizes[start:]) > target:
+                    start += 1
+
+            state.history_start = start
+            state.start_key = history_key(chat_history[:start])
+            return chat_history[start:]
+
+    def update(self, session_id: str, messages: list, final: dict):
+        """
+        Remember the context from Ollama's final event
+
+        Args:
+            session_id: The chat session
+            messages: The history the context now covers (previous messages, question, answer)
+            final: Ollama's last streamed event (context, prompt_eval_count, prompt_eval_duration)
+        """
+        context = final.get("context")
+        prefilled = final.get("prompt_eval_count") or 0
+        with self._lock:
+            state = self._state(session_id)
+            state.context = list(context) if context else None
+            state.context_key = history_key(messages)
+            self.stats["prefill_tokens"] += prefilled
+        logger.info("Session %s: prefilled %d prompt tokens in %.0f ms", session_id, prefilled,
+                    final.get("prompt_eval_duration", 0) / 1e6)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
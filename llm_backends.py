@@ -0,0 +1,238 @@
+"""
+LLM backends: where generations run
+Every backend streams a completion for a prompt and an optional system prompt:
+
+- OllamaBackend: an Ollama server (/api/generate). The only backend that can continue
+  from a session's carried context (see kv_cache).
+- OpenAIBackend: any OpenAI-compatible local server (llama.cpp's llama-server, vLLM,
+  LM Studio, LocalAI...) via /chat/completions.
+- LlamaCppBackend: a GGUF model loaded in-process with llama-cpp-python (optional
+  dependency). One generation at a time, outside the InferenceService queue.
+
+HTTP backends go through the shared InferenceService when one is passed in, so they are
+queued, coalesced and cancelled like any other generation. Backends are configured with
+specs like "ollama:gemma3:1b", "openai:qwen2.5-1.5b-instruct@http://localhost:8080/v1" or
+"llamacpp:/models/gemma-3-1b-it-Q4_K_M.gguf" (see backend_from_spec).
+"""
+
+import os
+import threading
+from contextlib import closing
+from typing import Iterator
+
+from inference_service import DEFAULT_SESSION, parse_stream_line
+from kv_cache import KEEP_ALIVE
+
+BACKEND_KINDS = ("ollama", "openai", "llamacpp")
+
+DEFAULT_URLS = {"ollama": "http://localhost:11434", "openai": "http://localhost:8080/v1"}
+
+TEMPERATURE = 0.7
+
+# Context window of in-process llama.cpp models (override with GEMMA3_LLAMACPP_CTX)
+LLAMACPP_CTX = int(os.environ.get("GEMMA3_LLAMACPP_CTX", 4096))
+
+
+class LLMBackend:
+    """
+    A model that streams completions
+
+    Attributes:
+        kind: "ollama", "openai" or "llamacpp"
+        model: Model name (file name for llama.cpp)
+        supports_context: Whether stream() accepts an Ollama context to continue from
+    """
+    kind = None
+    supports_context = False
+
+    def __init__(self, model: str, temperature: float = TEMPERATURE):
+        self.model = model
+        self.temperature = temperature
+
+    @property
+    def name(self) -> str:
+        """The backend as "<kind>:<model>", as recorded by the router's telemetry"""
+        return f"{self.kind}:{self.model}"
+
+    def load(self):
+        """Get ready for the first request (no-op for servers)"""
+
+    def stream(self, prompt: str, system: str = None, service=None, session_id: str = None,
+               context: list = None, on_done=None, priority: int = None) -> Iterator[str]:
+        """
+        Stream a completion
+
+        Args:
+            prompt: The prompt, or only the new question when continuing from `context`
+            system: System prompt (already part of `context` when one is given)
+            service: InferenceService to queue the request on, or None to call the backend
+                directly
+            session_id: Caller's session, for fair scheduling and cancellation
+            context: Ollama context returned by the session's previous turn
+            on_done: Called with the final event (service path only)
+            priority: Queue priority (service path only; interactive by default)
+
+        Yields:
+            Text fragments as the model produces them
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class OllamaBackend(LLMBackend):
+    """
+    A model served by Ollama
+
+    Args:
+        model: Ollama model tag
+        base_url: Ollama server URL
+        temperature: Sampling temperature
+        keep_alive: How long Ollama keeps the model loaded after a request
+    """
+    kind = "ollama"
+    supports_context = True
+
+    def __init__(self, model: str, base_url: str = DEFAULT_URLS["ollama"], temperature: float = TEMPERATURE,
+                 keep_alive: str = KEEP_ALIVE):
+        super().__init__(model, temperature)
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+
+    def stream(self, prompt: str, system: str = None, service=None, session_id: str = None,
+               context: list = None, on_done=None, priority: int = None) -> Iterator[str]:
+        if service is None:
+            from langchain_community.llms import Ollama
+            client = Ollama(model=self.model, base_url=self.base_url, temperature=self.temperature,
+                            keep_alive=self.keep_alive)
+            for chunk in client.stream(prompt, system=system):
+                if chunk:
+                    yield chunk
+            return
+
+        payload = {"model": self.model, "prompt": prompt, "options": {"temperature": self.temperature}}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if context is not None:
+            payload["context"] = context
+        elif system:
+            payload["system"] = system
+        options = {"priority": priority} if priority is not None else {}
+        yield from service.stream(
+            f"{self.base_url}/api/generate", payload, session_id=session_id or DEFAULT_SESSION, on_done=on_done,
+            **options
+        )
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    A model behind an OpenAI-compatible chat completions endpoint
+
+    Args:
+        model: Model name as the server knows it
+        base_url: API root, including the /v1 part
+        temperature: Sampling temperature
+    """
+    kind = "openai"
+
+    def __init__(self, model: str, base_url: str = DEFAULT_URLS["openai"], temperature: float = TEMPERATURE):
+        super().__init__(model, temperature)
+        self.base_url = base_url.rstrip("/")
+
+    def _payload(self, prompt: str, system: str = None) -> dict:
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return {"model": self.model, "messages": messages, "temperature": self.temperature, "stream": True}
+
+    def stream(self, prompt: str, system: str = None, service=None, session_id: str = None,
+               context: list = None, on_done=None, priority: int = None) -> Iterator[str]:
+        url = f"{self.base_url}/chat/completions"
+        if service is not None:
+            options = {"priority": priority} if priority is not None else {}
+            yield from service.stream(url, self._payload(prompt, system), session_id=session_id or DEFAULT_SESSION,
+                                      on_done=on_done, protocol="openai", **options)
+            return
+
+        import httpx
+        from inference_service import CONNECT_TIMEOUT, READ_TIMEOUT
+        timeout = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        with httpx.stream("POST", url, json=self._payload(prompt, system), timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                token, final = parse_stream_line("openai", line)
+                if token:
+                    yield token
+                if final is not None:
+                    return
+
+
+class LlamaCppBackend(LLMBackend):
+    """
+    A GGUF model run in-process by llama-cpp-python
+
+    The model is loaded on first use (or by load(), e.g. from warm_up) and generates one
+    answer at a time; other callers wait for it.
+
+    Args:
+        model_path: Path of the .gguf file
+        temperature: Sampling temperature
+        n_ctx: Context window in tokens
+    """
+    kind = "llamacpp"
+
+    def __init__(self, model_path: str, temperature: float = TEMPERATURE, n_ctx: int = LLAMACPP_CTX):
+        super().__init__(os.path.basename(model_path), temperature)
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self._llama = None
+        self._load_lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+
+    def load(self):
+        if self._llama is None:
+            with self._load_lock:
+                if self._llama is None:
+                    try:
+                        from llama_cpp import Llama
+                    except ImportError as e:
+                        raise RuntimeError(
+                            "The llamacpp backend needs llama-cpp-python: pip install llama-cpp-python"
+                        ) from e
+                    self._llama = Llama(model_path=self.model_path, n_ctx=self.n_ctx, verbose=False)
+        return self._llama
+
+    def stream(self, prompt: str, system: str = None, service=None, session_id: str = None,
+               context: list = None, on_done=None, priority: int = None) -> Iterator[str]:
+        llama = self.load()
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        with self._generate_lock:
+            chunks = llama.create_chat_completion(messages=messages, temperature=self.temperature, stream=True)
+            with closing(chunks):
+                for chunk in chunks:
+                    token = chunk["choices"][0]["delta"].get("content")
+                    if token:
+                        yield token
+
+
+def backend_from_spec(spec: str, temperature: float = TEMPERATURE) -> LLMBackend:
+    """
+    Create a backend from a "<kind>:<model>[@<url>]" spec
+
+    Examples: "ollama:gemma3:1b", "ollama:gemma3:4b@http://gpu-box:11434",
+    "openai:qwen2.5-1.5b-instruct@http://localhost:8080/v1", "llamacpp:/models/model.gguf"
+
+    Raises:
+        ValueError: Unknown backend kind or missing model
+    """
+    kind, _, rest = spec.partition(":")
+    model, _, url = rest.partition("@")
+    if kind not in BACKEND_KINDS or not model:
+        raise ValueError(f"Invalid LLM backend {spec!r}; expected <{'|'.join(BACKEND_KINDS)}>:<model>[@<url>]")
+    if kind == "llamacpp":
+        return LlamaCppBackend(model, temperature)
+    backend_class = OllamaBackend if kind == "ollama" else OpenAIBackend
+    return backend_class(model, url or DEFAULT_URLS[kind], temperature)
@@ -1,181 +1,800 @@
-from langchain_community.llms import Ollama
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
-import tempfile
+from typing import TYPE_CHECKING, Iterator
 import os
+import threading
+import time
+
+from context_builder import (
+    CONTEXT_TOKEN_BUDGET, HISTORY_TOKEN_BUDGET, count_tokens, log_prompt_tokens, select_chunks, select_history
+)
+from extractive import EXTRACTIVE_ENABLED
+from index_cache import corpus_key_from_digests, load_index, save_index
+from ingest import chunking_key, ingest_files, spool_uploads
+from kv_cache import DEFAULT_SESSION, SessionKVCache
+from llm_router import Replacement, collect, stream_with_draft
+from reranker import RERANK_CANDIDATES, RERANK_ENABLED
+from session_memory import MEMORY_ENABLED
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from extractive import Extract, ExtractiveAnswerer
+    from llm_backends import LLMBackend
+    from llm_router import RouteDecision, Router
+    from rag_response import RAGResponse, Timings
+    from session_memory import SessionMemory
+
+# Retrieval for RAG: "hybrid" (dense + BM25, fused) or "dense"
+RETRIEVAL_MODE = os.environ.get("GEMMA3_RETRIEVAL_MODE", "hybrid")
+
+# Candidate chunks retrieved per question; as many as fit CONTEXT_TOKEN_BUDGET are used
+RAG_FETCH_K = 8
+
+# Answer cache for repeated questions (GEMMA3_ANSWER_CACHE=0 disables it; set
+# GEMMA3_ANSWER_CACHE_PATH to a SQLite file to keep answers across restarts)
+ANSWER_CACHE_ENABLED = os.environ.get("GEMMA3_ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_PATH = os.environ.get("GEMMA3_ANSWER_CACHE_PATH")
+
+# Generations go through the shared, concurrency-limited InferenceService
+# (GEMMA3_INFERENCE_SERVICE=0 calls the Ollama client directly instead)
+INFERENCE_SERVICE_ENABLED = os.environ.get("GEMMA3_INFERENCE_SERVICE", "1") != "0"
 
 # Local lightweight model
-llm = Ollama(
-    model="gemma3:1b",
-    temperature=0.7
+LLM_MODEL_NAME = "gemma3:1b"
+
+# Main LLM as "<backend>:<model>[@<url>]", backend being ollama, openai or llamacpp (see llm_backends)
+LLM_BACKEND = os.environ.get("GEMMA3_LLM", f"ollama:{LLM_MODEL_NAME}")
+
+# Optional smaller or faster LLM for short factual and extractive questions, same format (see llm_router)
+FAST_LLM_BACKEND = os.environ.get("GEMMA3_FAST_LLM", "")
+
+# With a fast LLM: stream its draft of open-ended answers until the main LLM's answer replaces it
+DRAFT_ENABLED = os.environ.get("GEMMA3_DRAFT", "0") != "0"
+
+# System prompts are sent unchanged every turn so they stay at the front of Ollama's KV cache
+TEXT_SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. "
+    "Answer clearly in simple language. "
+    "Use bullet points when listing multiple items. "
+    "Be conversational and remember the context of previous messages."
+)
+RAG_SYSTEM_PROMPT = "You are a helpful AI assistant that answers questions based on the provided documents."
+
+# Folds messages that left the prompt window into the session's running summary
+SUMMARY_PROMPT = (
+    "Update the summary of a conversation with its next messages. Keep names, numbers, "
+    "facts, decisions and open questions; drop small talk. Answer with the summary only, "
+    "in at most {words} words.\n\n"
+    "Summary so far:\n{summary}\n\n"
+    "Next messages:\n{transcript}\n\n"
+    "Updated summary:"
 )
 
 # Embeddings for RAG - using sentence-transformers (runs locally, no Ollama model needed)
 # This is a small, efficient model that works great for embeddings
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'},
-    encode_kwargs={'normalize_embeddings': True}
-)
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# The LLM backends and the embeddings model (torch + MiniLM weights) are created on first
+# use, so importing this module stays cheap and Normal Chat never loads the RAG stack
+_router = None
+_embeddings = None
+_answer_cache = None
+_extractive_answerer = None
+_inference_service = None
+_session_memory = None
+# Ollama context and history window per chat session, for KV-cache reuse between turns
+_session_kv = SessionKVCache()
+_llm_lock = threading.Lock()
+_embeddings_lock = threading.Lock()
+_warm_up_threads = {}
+
+
+def get_router() -> "Router":
+    """Return the shared Router over the main and fast LLM backends, creating it on first use (thread-safe)"""
+    global _router
+    if _router is None:
+        with _llm_lock:
+            if _router is None:
+                from llm_backends import backend_from_spec
+                from llm_router import Router
+                _router = Router(
+                    main=backend_from_spec(LLM_BACKEND),
+                    fast=backend_from_spec(FAST_LLM_BACKEND) if FAST_LLM_BACKEND else None,
+                    draft=DRAFT_ENABLED
+                )
+    return _router
+
+
+def get_llm() -> "LLMBackend":
+    """Return the main LLM backend"""
+    return get_router().main
+
+
+def get_embeddings():
+    """Return the shared embeddings model, loading it on first use (thread-safe)"""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+                from embedding_engine import EMBED_BATCH_SIZE, CachedEmbeddings, EmbeddingCache
+                _embeddings = CachedEmbeddings(
+                    HuggingFaceEmbeddings(
+                        model_name=EMBEDDING_MODEL_NAME,
+                        model_kwargs={'device': 'cpu'},
+                        encode_kwargs={'normalize_embeddings': True, 'batch_size': EMBED_BATCH_SIZE}
+                    ),
+                    model_name=EMBEDDING_MODEL_NAME,
+                    batch_size=EMBED_BATCH_SIZE,
+                    cache=EmbeddingCache()
+                )
+    return _embeddings
+
+
+def get_answer_cache():
+    """Return the shared AnswerCache, creating it on first use (thread-safe)"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _llm_lock:
+            if _answer_cache is None:
+                from answer_cache import AnswerCache
+                _answer_cache = AnswerCache(path=ANSWER_CACHE_PATH)
+    return _answer_cache
+
+
+def get_extractive_answerer() -> "ExtractiveAnswerer":
+    """Return the shared ExtractiveAnswerer, creating it on first use (thread-safe)"""
+    global _extractive_answerer
+    if _extractive_answerer is None:
+        with _llm_lock:
+            if _extractive_answerer is None:
+                from extractive import ExtractiveAnswerer
+                _extractive_answerer = ExtractiveAnswerer()
+    return _extractive_answerer
+
+
+def get_inference_service():
+    """Return the shared InferenceService, creating it on first use (thread-safe)"""
+    global _inference_service
+    if _inference_service is None:
+        with _llm_lock:
+            if _inference_service is None:
+                from inference_service import InferenceService
+                _inference_service = InferenceService()
+    return _inference_service
+
+
+def get_session_memory() -> "SessionMemory":
+    """Return the shared session memory (summaries and recall of older messages)"""
+    global _session_memory
+    if _session_memory is None:
+        with _llm_lock:
+            if _session_memory is None:
+                from session_memory import SessionMemory
+                _session_memory = SessionMemory(summarize=_summarize_history, embed=_embed_history)
+    return _session_memory
 
-def get_text_response(question: str, chat_history: list = None) -> str:
+
+def cancel_session(session_id: str):
+    """Cancel a session's queued and running generations (no-op if nothing was started)"""
+    if _inference_service is not None:
+        _inference_service.cancel_session(session_id)
+
+
+def warm_up(embeddings: bool = True) -> threading.Thread:
     """
-    Get a response from the LLM with chat history context
+    Load the models in a background thread so the first request does not pay for it
     
     Args:
-        question: The user's question
-        chat_history: List of previous messages [{"role": "user/assistant", "content": "..."}]
+        embeddings: Also load the embeddings model (only needed for Document Chat)
     
     Returns:
-        The AI's response
+        The warm-up thread (started at most once per process for each setting)
+    """
+    def _run():
+        router = get_router()
+        router.main.load()
+        if router.fast is not None:
+            router.fast.load()
+        if INFERENCE_SERVICE_ENABLED:
+            get_inference_service().start()
+        if embeddings:
+            get_embeddings().base.embed_query("warm up")
+            if RERANK_ENABLED:
+                from reranker import get_reranker
+                get_reranker().load()
+    
+    with _llm_lock:
+        if embeddings not in _warm_up_threads:
+            thread = threading.Thread(target=_run, name="llm-warm-up", daemon=True)
+            thread.start()
+            _warm_up_threads[embeddings] = thread
+        return _warm_up_threads[embeddings]
+
+
+def __getattr__(name: str):
+    # Keep `llm_logic.llm` / `llm_logic.embeddings` working for existing callers
+    if name == "llm":
+        return get_llm()
+    if name == "embeddings":
+        return get_embeddings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _format_history(chat_history: list = None, session_id: str = None) -> str:
+    """
+    Serialize the most recent messages that fit HISTORY_TOKEN_BUDGET as a Human/Assistant transcript
+    
+    With a session_id, the start of the window only moves when the budget overflows (see
+    SessionKVCache.history_window), so consecutive prompts of the session share a prefix;
+    messages before the window go to the session's memory (see _memory_context).
     """
-    # Build chat history context
-    history_context = ""
+    history_text = ""
     if chat_history:
-        recent_history = chat_history[-6:]  # Last 3 exchanges (6 messages)
+        if session_id is not None:
+            window = _session_kv.history_window(session_id, chat_history, count_tokens, HISTORY_TOKEN_BUDGET)
+            if MEMORY_ENABLED:
+                get_session_memory().update(session_id, chat_history[:len(chat_history) - len(window)])
+            chat_history = window
+        recent_history = select_history(chat_history, HISTORY_TOKEN_BUDGET)
         for msg in recent_history:
             role = "Human" if msg["role"] == "user" else "Assistant"
-            history_context += f"{role}: {msg['content']}\n"
+            history_text += f"{role}: {msg['content']}\n"
+    return history_text
+
+
+def _memory_context(question: str, session_id: str = None) -> tuple:
+    """
+    Prompt sections for the session's messages older than the history window
     
-    # Create prompt with history
-    if history_context:
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a helpful AI assistant. "
-                "Answer clearly in simple language. "
-                "Use bullet points when listing multiple items. "
-                "Be conversational and remember the context of previous messages."
-            ),
-            ("human", f"Previous conversation:\n{history_context}\n\nCurrent question: {question}")
-        ])
-    else:
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a helpful AI assistant. "
-                "Answer clearly in simple language. "
-                "Use bullet points when listing multiple items."
-            ),
-            ("human", "{question}")
-        ])
-
-    chain = prompt | llm
+    The question is only embedded for recall when the embeddings model is already loaded,
+    so Normal Chat on its own gets the rolling summary but no recall.
+    
+    Returns:
+        (summary_text, recalled_text), each "" when there is nothing to add
+    """
+    if not MEMORY_ENABLED or session_id is None or _session_memory is None:
+        return "", ""
+    embed_query = _embeddings.embed_query if _embeddings is not None else None
+    summary, recalled = _session_memory.context(session_id, question, embed_query)
+    summary_text = f"Summary of the earlier conversation:\n{summary}\n\n" if summary else ""
+    recalled_text = "Earlier messages related to this question:\n" + "\n\n".join(recalled) + "\n\n" if recalled else ""
+    return summary_text, recalled_text
+
+
+def _summarize_history(session_id: str, summary: str, transcript: str) -> str:
+    """Fold messages into a session's running summary (SessionMemory's summarize callback)"""
+    from inference_service import PRIORITY_BACKGROUND
+    from session_memory import SUMMARY_TOKENS
+    prompt = SUMMARY_PROMPT.format(words=SUMMARY_TOKENS * 3 // 4, summary=summary or "(empty)", transcript=transcript)
+    # A separate fast model also leaves the main model's KV cache alone
+    return "".join(_generate(prompt, session_id, priority=PRIORITY_BACKGROUND, backend=get_router().background))
+
+
+def _embed_history(texts: list):
+    """Embed past exchanges for recall (SessionMemory's embed callback)"""
+    # Normal Chat does not load the embeddings model just for recall
+    if _embeddings is None:
+        return None
+    return _embeddings.embed_array(texts)
+
+
+def _cached_stream(mode: str, question: str, chat_history: list, vector_store, generate,
+                   embed_query=None, cacheable=None) -> Iterator[str]:
+    """
+    Serve an answer from the answer cache, or stream it from generate() and cache it
+    
+    Args:
+        mode: "text" or "rag" (part of the cache scope)
+        question: The user's question
+        chat_history: Previous messages; the part used in the prompt is part of the scope
+        vector_store: Document store for RAG (its fingerprint is part of the scope), or None
+        generate: Zero-argument callable returning the token iterator on a cache miss
+        embed_query: Question embedder for near-duplicate lookup (RAG passes the retrieval
+            embedding; without one only exact repeats hit)
+        cacheable: Optional callable telling, once generate() is exhausted, whether its
+            answer may be cached
+    """
+    if not ANSWER_CACHE_ENABLED:
+        yield from generate()
+        return
+    
+    from answer_cache import corpus_fingerprint, make_scope
+    fingerprint = corpus_fingerprint(vector_store)
+    if fingerprint is None:
+        # The store's documents cannot be identified, so neither can the answer's scope
+        yield from generate()
+        return
+    
+    cache = get_answer_cache()
+    scope = make_scope(mode, fingerprint, _format_history(chat_history))
+    cached = cache.get(scope, question, embed_query)
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    for chunk in generate():
+        if isinstance(chunk, Replacement):
+            parts.clear()
+        parts.append(chunk)
+        yield chunk
+    if cacheable is None or cacheable():
+        cache.put(scope, question, "".join(parts), embed_query)
+
+
+def _generate(prompt: str, session_id: str = None, system: str = None, context: list = None,
+              on_done=None, priority: int = None, backend: "LLMBackend" = None) -> Iterator[str]:
+    """
+    Stream a completion for a prompt from an LLM backend
+    
+    HTTP backends go through the shared InferenceService (queued fairly per session,
+    cancelled when the iterator is closed) unless INFERENCE_SERVICE_ENABLED is off.
     
+    Args:
+        prompt: The prompt, or only the new question when continuing from `context`
+        session_id: Caller's session, for fair scheduling and cancellation
+        system: System prompt (already part of `context` when one is given)
+        context: Ollama context returned by the session's previous turn
+        on_done: Called with the backend's final event (service path only)
+        priority: Queue priority (service path only; interactive by default)
+        backend: The backend to use (the main one by default)
+    """
+    backend = backend if backend is not None else get_llm()
+    service = get_inference_service() if INFERENCE_SERVICE_ENABLED else None
+    yield from backend.stream(prompt, system, service=service, session_id=session_id or DEFAULT_SESSION,
+                              context=context, on_done=on_done, priority=priority)
+
+
+def _with_draft(decision: "RouteDecision", stream: Iterator[str], prompt: str, session_id: str,
+                system: str) -> Iterator[str]:
+    """
+    Put the routing decision's draft, if any, in front of an answer stream and record the
+    answer in the router's telemetry
+    
+    Args:
+        decision: The router's decision for the question
+        stream: The answer from decision.backend
+        prompt: Full prompt for the draft backend
+        session_id: Caller's session
+        system: System prompt
+    
+    Yields:
+        Text fragments; in draft mode the answer arrives as a Replacement of the draft
+    """
+    if decision.draft is not None:
+        stream = stream_with_draft(_generate(prompt, session_id, system, backend=decision.draft), stream)
+    return get_router().telemetry.track(decision, stream)
+
+
+def _build_text_prompt(question: str, chat_history: list = None, session_id: str = DEFAULT_SESSION,
+                       carry_context: bool = True) -> tuple:
+    """
+    Build the prompt used by normal chat mode
+    
+    Args:
+        carry_context: Whether the answering backend can continue from an Ollama context
+    
+    Returns:
+        (prompt, context): when the session's previous turn left an Ollama context that
+        covers chat_history, the prompt is just the question and the context carries the
+        rest; otherwise context is None and the prompt is history first, question last
+    """
+    carry_context = carry_context and INFERENCE_SERVICE_ENABLED
+    context = _session_kv.context_for(session_id, chat_history) if carry_context else None
+    if context is not None:
+        log_prompt_tokens("text", question, carried_context=len(context))
+        return question, context
+    
+    history_context = _format_history(chat_history, session_id)
+    # Summary first: it changes rarely, so it stays part of the prefix Ollama has cached
+    summary_text, recalled_text = _memory_context(question, session_id)
     if history_context:
-        return chain.invoke({"question": question})
+        prompt = f"{summary_text}Previous conversation:\n{history_context}\n{recalled_text}Current question: {question}"
     else:
-        return chain.invoke({"question": question})
+        prompt = question
+    
+    log_prompt_tokens("text", prompt, history=history_context, summary=summary_text, recalled=recalled_text)
+    return prompt, None
+
+
+def _stream_text(question: str, chat_history: list = None, session_id: str = None) -> Iterator[str]:
+    """
+    Stream a normal-chat answer from the routed backend
+    
+    Only the main backend's Ollama context is kept for the session's next turn: a turn
+    answered by another model leaves the stored context behind the chat, so the next
+    main-model turn sends a full prompt.
+    """
+    session_id = session_id or DEFAULT_SESSION
+    router = get_router()
+    decision = router.route(question, "text")
+    carry_context = decision.backend is router.main and router.main.supports_context
+    prompt, context = _build_text_prompt(question, chat_history, session_id, carry_context)
+    parts = []
+    
+    def remember(final: dict):
+        messages = list(chat_history or []) + [
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": "".join(parts)}
+        ]
+        _session_kv.update(session_id, messages, final)
+    
+    def answer():
+        on_done = remember if carry_context else None
+        for chunk in _generate(prompt, session_id, TEXT_SYSTEM_PROMPT, context, on_done, backend=decision.backend):
+            parts.append(chunk)
+            yield chunk
+    
+    # The draft model cannot continue from the main model's context, so it gets the full prompt
+    draft_prompt = prompt
+    if decision.draft is not None and context is not None:
+        draft_prompt, _ = _build_text_prompt(question, chat_history, session_id, carry_context=False)
+    yield from _with_draft(decision, answer(), draft_prompt, session_id, TEXT_SYSTEM_PROMPT)
+
+
+def get_text_response(question: str, chat_history: list = None, session_id: str = None) -> str:
+    """
+    Get a response from the LLM with chat history context
+    
+    Args:
+        question: The user's question
+        chat_history: List of previous messages [{"role": "user/assistant", "content": "..."}]
+        session_id: Caller's session, for fair scheduling and cancellation
+    
+    Returns:
+        The AI's response
+    """
+    def generate():
+        yield collect(_stream_text(question, chat_history, session_id))
+    
+    return "".join(_cached_stream("text", question, chat_history, None, generate))
+
+
+def stream_text_response(question: str, chat_history: list = None, session_id: str = None) -> Iterator[str]:
+    """
+    Stream a response from the LLM token by token as Ollama produces it
+    
+    Args:
+        question: The user's question
+        chat_history: List of previous messages [{"role": "user/assistant", "content": "..."}]
+        session_id: Caller's session, for fair scheduling and cancellation
+    
+    Yields:
+        Text fragments of the AI's response
+    """
+    def generate():
+        return _stream_text(question, chat_history, session_id)
+    
+    yield from _cached_stream("text", question, chat_history, None, generate)
 
 
-def process_documents(uploaded_files) -> FAISS:
+def index_key() -> str:
+    """Index type and vector encoding (ann_index settings), as part of the index cache key"""
+    from ann_index import INDEX_TYPE, VECTOR_ENCODING
+    # float32 keeps the plain type, so indexes cached before encodings existed stay valid
+    return INDEX_TYPE if VECTOR_ENCODING == "float32" else f"{INDEX_TYPE}/{VECTOR_ENCODING}"
+
+
+def process_documents(uploaded_files, use_cache: bool = True) -> "FAISS":
     """
     Process uploaded documents and create a vector store
     
     Args:
         uploaded_files: List of uploaded files from Streamlit
+        use_cache: Load/save the index from the on-disk cache keyed by file contents
     
     Returns:
         FAISS vector store
     """
-    documents = []
-    
-    for uploaded_file in uploaded_files:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
+    # Uploads are spooled to disk (and hashed) in blocks rather than copied whole into memory
+    with spool_uploads(uploaded_files) as files:
+        # Re-uploading a known corpus loads the saved index instead of re-embedding it
+        cache_key = corpus_key_from_digests(
+            [(file.file_name, file.digest) for file in files],
+            chunking_key(), EMBEDDING_MODEL_NAME, index_key()
+        )
+        if use_cache:
+            cached_store = load_index(cache_key, get_embeddings())
+            if cached_store is not None:
+                return cached_store
         
-        try:
-            # Load document based on file type
-            file_extension = uploaded_file.name.split('.')[-1].lower()
-            
-            if file_extension == 'pdf':
-                loader = PyPDFLoader(tmp_file_path)
-            elif file_extension == 'docx':
-                loader = Docx2txtLoader(tmp_file_path)
-            elif file_extension == 'txt':
-                loader = TextLoader(tmp_file_path)
-            else:
-                continue
-            
-            # Load and add documents
-            docs = loader.load()
-            documents.extend(docs)
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
-    
-    # Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-    )
-    splits = text_splitter.split_documents(documents)
+        # Files are parsed and split in parallel; chunks are embedded in batches as they arrive
+        vector_store, stats = ingest_files(files, get_embeddings())
     
-    # Create vector store with HuggingFace embeddings
-    vector_store = FAISS.from_documents(splits, embeddings)
+    # Switch large corpora from exact search to an ANN index (GEMMA3_INDEX_TYPE)
+    from ann_index import INDEX_TYPE, VECTOR_ENCODING, ensure_index_type
+    vector_store = ensure_index_type(vector_store, INDEX_TYPE, VECTOR_ENCODING)
+    
+    if use_cache and vector_store is not None:
+        save_index(cache_key, vector_store)
     
     return vector_store
 
 
-def get_rag_response(question: str, vector_store: FAISS, chat_history: list = None) -> str:
+def retrieve(question: str, vector_store: "FAISS", k: int = 3) -> list:
     """
-    Get a response using RAG (Retrieval-Augmented Generation)
+    Get the chunks most relevant to a question
+    
+    Uses dense + BM25 hybrid search when the store supports it (RETRIEVAL_MODE="hybrid"),
+    plain similarity search otherwise.
+    """
+    sources, _ = retrieve_scored(question, vector_store, k)
+    return [source.document for source in sources]
+
+
+def retrieve_scored(question: str, vector_store: "FAISS", k: int = 3, timings: "Timings" = None) -> tuple:
+    """
+    Get the chunks most relevant to a question, with their scores
     
     Args:
         question: The user's question
         vector_store: FAISS vector store containing documents
-        chat_history: List of previous messages
+        k: Number of chunks to return
+        timings: Optional Timings to record embed_ms / search_ms in
     
     Returns:
-        The AI's response based on the documents
+        (sources, query_embedding): list of Sources, best first, and the question's
+        embedding (None for stores that embed internally)
     """
-    if vector_store is None:
-        return "Please upload and process documents first."
+    from rag_response import Source, Timings
+    timings = timings if timings is not None else Timings()
+    
+    if not hasattr(vector_store, "similarity_search_with_score_by_vector"):
+        # Minimal stores (e.g. test doubles) only offer similarity_search
+        start = time.perf_counter()
+        docs = vector_store.similarity_search(question, k=k)
+        timings.search_ms = _ms_since(start)
+        return [Source(doc, rank) for rank, doc in enumerate(docs, start=1)], None
     
-    # Get relevant documents using similarity search
-    relevant_docs = vector_store.similarity_search(question, k=3)
-    context = "\n\n".join([doc.page_content for doc in relevant_docs])
+    start = time.perf_counter()
+    embedding = vector_store.embeddings.embed_query(question)
+    timings.embed_ms = _ms_since(start)
+    
+    start = time.perf_counter()
+    if RETRIEVAL_MODE == "hybrid" and hasattr(vector_store, "hybrid_search_with_scores"):
+        sources = _hybrid_sources(vector_store.hybrid_search_with_scores(question, k=k, embedding=embedding))
+    else:
+        sources = _dense_sources(vector_store.similarity_search_with_score_by_vector(embedding, k=k))
+    timings.search_ms = _ms_since(start)
+    return sources, embedding
+
+
+def retrieve_batch(questions: list, vector_store: "FAISS", k: int = 3) -> list:
+    """
+    Get the chunks most relevant to each of many questions (evaluation runs, query expansion)
+    
+    The questions are embedded as one batch (repeats come from the query-embedding cache)
+    and searched with a single FAISS call; only the BM25 side of hybrid search runs per
+    question.
+    
+    Args:
+        questions: The questions
+        vector_store: FAISS vector store containing documents
+        k: Number of chunks per question
+    
+    Returns:
+        One list of Sources per question, best first
+    """
+    if not questions:
+        return []
+    if not hasattr(vector_store, "similarity_search_with_score_by_vectors"):
+        return [retrieve_scored(question, vector_store, k)[0] for question in questions]
+    
+    from embedding_engine import embed_queries
+    embeddings = embed_queries(vector_store.embeddings, questions)
+    if RETRIEVAL_MODE == "hybrid":
+        results = vector_store.hybrid_search_batch_with_scores(questions, embeddings, k=k)
+        return [_hybrid_sources(result) for result in results]
+    return [_dense_sources(result) for result in vector_store.similarity_search_with_score_by_vectors(embeddings, k)]
+
+
+def _hybrid_sources(results: list) -> list:
+    """Sources from hybrid_search_with_scores results"""
+    from rag_response import Source, similarity_from_l2
+    return [
+        Source(doc, rank, score, similarity_from_l2(distance) if distance is not None else None, bm25)
+        for rank, (doc, score, distance, bm25) in enumerate(results, start=1)
+    ]
+
+
+def _dense_sources(results: list) -> list:
+    """Sources from (Document, L2 distance) results, ranked by cosine similarity"""
+    from rag_response import Source, similarity_from_l2
+    sources = []
+    for rank, (doc, distance) in enumerate(results, start=1):
+        similarity = similarity_from_l2(distance)
+        sources.append(Source(doc, rank, similarity, similarity))
+    return sources
+
+
+def _ms_since(start: float) -> float:
+    return 1000 * (time.perf_counter() - start)
+
+
+def _build_rag_prompt(question: str, vector_store: "FAISS", chat_history: list = None,
+                      session_id: str = None, result: "RAGResponse" = None) -> tuple:
+    """
+    Retrieve the top chunks for the question and assemble the RAG prompt
+    
+    The history comes before the documents: it is the part shared with the previous turn,
+    so Ollama can reuse its KV cache for it (RAG_SYSTEM_PROMPT is sent separately)
+    
+    Returns:
+        (full_prompt, query_embedding); the chunks used and the retrieval and prompt
+        timings are recorded in `result` when given
+    """
+    from rag_response import RAGResponse
+    result = result if result is not None else RAGResponse(question)
+    if RERANK_ENABLED:
+        # Fetch a wider candidate set and let the cross-encoder pick the best of it
+        from reranker import get_reranker
+        sources, embedding = retrieve_scored(question, vector_store, RERANK_CANDIDATES, result.timings)
+        start = time.perf_counter()
+        sources, _ = get_reranker().rerank(question, sources)
+        result.timings.rerank_ms = _ms_since(start)
+    else:
+        sources, embedding = retrieve_scored(question, vector_store, RAG_FETCH_K, result.timings)
+    
+    start = time.perf_counter()
+    # Fill the context budget best-first, skipping near-duplicate chunks
+    selected = select_chunks([source.document for source in sources], CONTEXT_TOKEN_BUDGET)
+    context = "\n\n".join([text for _, text in selected])
+    used = {id(doc) for doc, _ in selected}
+    result.sources = [source for source in sources if id(source.document) in used]
     
     # Build history context
-    history_text = ""
-    if chat_history:
-        recent_history = chat_history[-6:]  # Last 3 exchanges
-        for msg in recent_history:
-            role = "Human" if msg["role"] == "user" else "Assistant"
-            history_text += f"{role}: {msg['content']}\n"
+    history_text = _format_history(chat_history, session_id)
+    summary_text, recalled_text = _memory_context(question, session_id)
     
-    # Create prompt with context and history
+    # Create prompt with history and context
     if history_text:
-        full_prompt = f"""You are a helpful AI assistant that answers questions based on the provided documents.
-
+        full_prompt = f"""{summary_text}Previous conversation:
+{history_text}
+{recalled_text}
 Context from documents:
 {context}
 
-Previous conversation:
-{history_text}
-
 Current question: {question}
 
 Please answer based on the context provided. If the answer is not in the documents, say so clearly."""
     else:
-        full_prompt = f"""You are a helpful AI assistant that answers questions based on the provided documents.
-
-Context from documents:
+        full_prompt = f"""Context from documents:
 {context}
 
 Question: {question}
 
 Please answer based on the context provided. If the answer is not in the documents, say so clearly."""
     
-    # Get response
-    response = llm.invoke(full_prompt)
+    result.timings.prompt_ms = _ms_since(start)
+    log_prompt_tokens(
+        "rag", full_prompt,
+        chunks=len(selected), context=context, history=history_text, summary=summary_text, recalled=recalled_text
+    )
+    return full_prompt, embedding
+
+
+def _extract_answer(question: str, vector_store: "FAISS", embedding, result: "RAGResponse") -> "Extract":
+    """
+    Answer with a sentence of the chunks in result.sources if one clearly does (see extractive)
+    
+    On a hit, result.sources is narrowed to the cited chunk and result.extractive is set.
+    
+    Returns:
+        The Extract, or None to generate an answer instead
+    """
+    embeddings = vector_store.embeddings
+    if hasattr(embeddings, "embed_array"):
+        embed = embeddings.embed_array
+    else:
+        def embed(texts):
+            return embeddings.embed_documents(texts)
+    
+    start = time.perf_counter()
+    extract = get_extractive_answerer().extract(question, embedding, result.sources, embed)
+    result.timings.extract_ms = _ms_since(start)
+    if extract is not None:
+        result.extractive = True
+        result.sources = [extract.source]
+    return extract
+
+
+def get_rag_result(question: str, vector_store: "FAISS", chat_history: list = None,
+                   session_id: str = None) -> "RAGResponse":
+    """
+    Get a RAG answer together with its sources and timing breakdown
+    
+    Args:
+        question: The user's question
+        vector_store: FAISS vector store containing documents
+        chat_history: List of previous messages
+        session_id: Caller's session, for fair scheduling and cancellation
+    
+    Returns:
+        RAGResponse with answer, sources (chunks used, with file/page and scores) and timings
+    """
+    from rag_response import RAGResponse
+    result = RAGResponse(question)
+    for _ in stream_rag_response(question, vector_store, chat_history, session_id, result=result):
+        pass
+    return result
+
+
+def get_rag_response(question: str, vector_store: "FAISS", chat_history: list = None,
+                     session_id: str = None) -> str:
+    """
+    Get a response using RAG (Retrieval-Augmented Generation)
+    
+    Args:
+        question: The user's question
+        vector_store: FAISS vector store containing documents
+        chat_history: List of previous messages
+        session_id: Caller's session, for fair scheduling and cancellation
+    
+    Returns:
+        The AI's response based on the documents
+    """
+    if vector_store is None:
+        return "Please upload and process documents first."
+    return get_rag_result(question, vector_store, chat_history, session_id).answer
+
+
+def stream_rag_response(question: str, vector_store: "FAISS", chat_history: list = None,
+                        session_id: str = None, result: "RAGResponse" = None) -> Iterator[str]:
+    """
+    Stream a RAG response token by token as Ollama produces it
+    
+    Args:
+        question: The user's question
+        vector_store: FAISS vector store containing documents
+        chat_history: List of previous messages
+        session_id: Caller's session, for fair scheduling and cancellation
+        result: Optional RAGResponse to fill in: sources once retrieval is done, answer
+            and timings once the stream is exhausted
+    
+    Yields:
+        Text fragments of the AI's response based on the documents
+    """
+    if vector_store is None:
+        yield "Please upload and process documents first."
+        return
+    
+    from rag_response import RAGResponse
+    result = result if result is not None else RAGResponse(question)
+    start = time.perf_counter()
+    full_prompt, embedding = _build_rag_prompt(
+        question, vector_store, chat_history, session_id or DEFAULT_SESSION, result
+    )
+    
+    def generate():
+        result.from_cache = False
+        # A follow-up may depend on the history, which the retrieval query does not include
+        if EXTRACTIVE_ENABLED and embedding is not None and not chat_history:
+            extract = _extract_answer(question, vector_store, embedding, result)
+            if extract is not None:
+                yield extract.answer
+                return
+        decision = get_router().route(question, "rag")
+        answer = _generate(full_prompt, session_id, RAG_SYSTEM_PROMPT, backend=decision.backend)
+        yield from _with_draft(decision, answer, full_prompt, session_id, RAG_SYSTEM_PROMPT)
+    
+    # The answer cache's near-duplicate lookup reuses the question embedding from retrieval
+    embed_query = (lambda _: embedding) if embedding is not None else None
+    result.from_cache = True
+    generation_start = time.perf_counter()
+    parts = []
+    # Extractive answers are cheaper to redo than to replay without their flag and cited source
+    stream = _cached_stream("rag", question, chat_history, vector_store, generate, embed_query,
+                            cacheable=lambda: not result.extractive)
+    for chunk in stream:
+        if not parts:
+            result.timings.ttft_ms = _ms_since(start)
+        if isinstance(chunk, Replacement):
+            parts.clear()
+        parts.append(chunk)
+        yield chunk
     
-    return response
+    result.answer = "".join(parts)
+    result.timings.generation_ms = _ms_since(generation_start)
+    result.timings.total_ms = _ms_since(start)
+    if EXTRACTIVE_ENABLED and not result.from_cache and not result.extractive:
+        # What an extractive hit saves, on average
+        get_extractive_answerer().record_generation(result.timings.generation_ms)
@@ -0,0 +1,301 @@
+"""
+Routing questions between a fast and a main LLM, with optional draft answers
+With a fast backend configured (GEMMA3_FAST_LLM), each question is classified by a cheap
+heuristic:
+
+- "factual" (normal chat) and "extractive" (RAG): short what/who/when/which questions,
+  answered by the fast model
+- "open": explanations, comparisons, summaries, writing, long questions, answered by
+  the main model
+
+In draft mode (GEMMA3_DRAFT=1) open questions are sent to both models at once: the fast
+model's draft streams right away and the main model's answer replaces it when the draft
+is done (see stream_with_draft). Every routed answer is recorded by RoutingTelemetry
+(query class, backend, time to first token, total time), in memory and optionally as
+JSON lines in GEMMA3_ROUTING_LOG, so the policy can be tuned on real traffic.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# JSON-lines file to append one record per routed answer to (unset: in memory only)
+ROUTING_LOG_PATH = os.environ.get("GEMMA3_ROUTING_LOG")
+
+# Questions longer than this are treated as open-ended (override with GEMMA3_ROUTE_MAX_WORDS)
+ROUTE_MAX_WORDS = int(os.environ.get("GEMMA3_ROUTE_MAX_WORDS", 16))
+
+# Query classes answered by the fast model
+FAST_CLASSES = ("factual", "extractive")
+
+TELEMETRY_RECORDS = 1000
+
+_SHORT_ANSWER = re.compile(
+    r"^\s*(what|who|whom|whose|when|where|which|define|name|is|are|was|were|does|do|did|can|"
+    r"how (many|much|long|old|far|big|often))\b",
+    re.IGNORECASE,
+)
+_OPEN_ENDED = re.compile(
+    r"\b(why|explain|describe|compare|contrast|discuss|summari[sz]e|analy[sz]e|elaborate|evaluate|"
+    r"write|draft|brainstorm|suggest|recommend|pros and cons|in detail|step by step|"
+    r"how (do|does|did|can|could|should|would|to))\b",
+    re.IGNORECASE,
+)
+
+_DONE = object()
+
+
+def classify_query(question: str, mode: str) -> str:
+    """
+    Classify a question for routing
+
+    Args:
+        question: The user's question
+        mode: "text" (normal chat) or "rag"
+
+    Returns:
+        "factual" or "extractive" (RAG) for short questions with a short answer, else "open"
+    """
+    if (len(question.split()) > ROUTE_MAX_WORDS or _OPEN_ENDED.search(question)
+            or not _SHORT_ANSWER.match(question)):
+        return "open"
+    return "extractive" if mode == "rag" else "factual"
+
+
+class Replacement(str):
+    """A stream fragment that replaces everything streamed before it (the final answer after a draft)"""
+
+
+def collect(fragments) -> str:
+    """Join a stream's fragments into the answer it ends with"""
+    parts = []
+    for fragment in fragments:
+        if isinstance(fragment, Replacement):
+            parts.clear()
+        parts.append(fragment)
+    return "".join(parts)
+
+
+def stream_with_draft(draft: Iterator[str], final: Iterator[str]) -> Iterator[str]:
+    """
+    Stream a draft answer, then the final answer as a Replacement of it
+
+    The final answer is generated at the same time on a background thread and buffered
+    while the draft streams; if it completes first, the rest of the draft is skipped. A
+    draft that fails is dropped. Closing this iterator closes both streams.
+
+    Args:
+        draft: Fragments of the fast model's answer
+        final: Fragments of the main model's answer
+
+    Yields:
+        The draft's fragments, then a Replacement with the final answer so far, then the
+        final answer's remaining fragments
+    """
+    events = queue.SimpleQueue()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for fragment in final:
+                if stop.is_set():
+                    break
+                events.put(fragment)
+            events.put(_DONE)
+        except BaseException as e:
+            events.put(e)
+        finally:
+            close = getattr(final, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=produce, name="final-answer", daemon=True).start()
+    buffered, finished, error = [], False, None
+
+    def drain(block: bool):
+        """Move final-answer events into `buffered`; blocking waits for one event"""
+        nonlocal finished, error
+        while not finished:
+            try:
+                event = events.get(block=block)
+            except queue.Empty:
+                return
+            if event is _DONE or isinstance(event, BaseException):
+                finished, error = True, event if event is not _DONE else None
+            else:
+                buffered.append(event)
+                if block:
+                    return
+
+    try:
+        fragments = iter(draft)
+        while not finished:
+            try:
+                fragment = next(fragments)
+            except StopIteration:
+                break
+            except Exception:
+                logger.warning("Draft failed; waiting for the final answer", exc_info=True)
+                break
+            yield fragment
+            drain(block=False)
+        close = getattr(draft, "close", None)
+        if close is not None:
+            close()
+
+        drain(block=False)
+        if not buffered and not finished:
+            drain(block=True)
+        if error is not None:
+            raise error
+        yield Replacement("".join(buffered))
+        while not finished:
+            buffered.clear()
+            drain(block=True)
+            if error is not None:
+                raise error
+            if buffered:
+                yield "".join(buffered)
+    finally:
+        stop.set()
+        close = getattr(draft, "close", None)
+        if close is not None:
+            close()
+
+
+@dataclass
+class RouteDecision:
+    """
+    Where one answer is generated
+
+    Attributes:
+        mode: "text" or "rag"
+        query_class: See classify_query
+        backend: The backend that writes the (final) answer
+        draft: The backend that writes a draft first, or None
+    """
+    mode: str
+    query_class: str
+    backend: object
+    draft: object = None
+
+
+class RoutingTelemetry:
+    """
+    Routing decisions and the latencies they led to
+
+    Args:
+        path: JSON-lines file to append records to, or None to keep them in memory only
+        max_records: Most recent records kept in memory for stats()
+    """
+
+    def __init__(self, path: str = ROUTING_LOG_PATH, max_records: int = TELEMETRY_RECORDS):
+        self.path = path
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def track(self, decision: RouteDecision, stream: Iterator[str]) -> Iterator[str]:
+        """
+        Pass a routed answer's fragments through and record it once the stream ends
+
+        The record has the time to the first fragment shown (the draft's, in draft mode),
+        the time the final answer started, the total time, and whether the stream
+        completed, failed or was closed early.
+        """
+        start = time.perf_counter()
+        first_ms = final_ms = None
+        outcome = "cancelled"
+        try:
+            for fragment in stream:
+                elapsed_ms = 1000 * (time.perf_counter() - start)
+                if isinstance(fragment, Replacement):
+                    final_ms = elapsed_ms
+                elif first_ms is None and fragment:
+                    first_ms = elapsed_ms
+                yield fragment
+            outcome = "ok"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            first_ms = first_ms if first_ms is not None else final_ms
+            self.record({
+                "time": time.time(), "mode": decision.mode, "query_class": decision.query_class,
+                "backend": decision.backend.name, "draft": decision.draft.name if decision.draft else None,
+                "ttft_ms": first_ms, "final_ms": final_ms if decision.draft else first_ms,
+                "total_ms": 1000 * (time.perf_counter() - start), "outcome": outcome,
+            })
+
+    def record(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record) + "\n")
+                except OSError:
+                    logger.warning("Could not write routing record to %s", self.path, exc_info=True)
+
+    def stats(self) -> dict:
+        """
+        Per query class and backend: answers, failures, and mean first-fragment, final and
+        total latency in milliseconds (completed answers only)
+        """
+        with self._lock:
+            records = list(self.records)
+        groups = {}
+        for record in records:
+            group = groups.setdefault(record["query_class"], {}).setdefault(
+                record["backend"], {"answers": 0, "errors": 0, "drafts": 0, "_done": []}
+            )
+            group["answers"] += 1
+            group["errors"] += record["outcome"] == "error"
+            group["drafts"] += record["draft"] is not None
+            if record["outcome"] == "ok" and record["ttft_ms"] is not None:
+                group["_done"].append(record)
+        for backends in groups.values():
+            for group in backends.values():
+                done = group.pop("_done")
+                for key in ("ttft_ms", "final_ms", "total_ms"):
+                    group[f"mean_{key}"] = sum(r[key] for r in done) / len(done) if done else None
+        return groups
+
+
+class Router:
+    """
+    Pick the backend for each question
+
+    Args:
+        main: Backend for open-ended questions, and for everything without a fast backend
+        fast: Smaller or faster backend for factual and extractive questions, or None
+        draft: Have the fast backend draft open-ended answers too (needs `fast`)
+        telemetry: Where decisions and latencies are recorded
+    """
+
+    def __init__(self, main, fast=None, draft: bool = False, telemetry: RoutingTelemetry = None):
+        self.main = main
+        self.fast = fast
+        self.draft = draft and fast is not None
+        self.telemetry = telemetry if telemetry is not None else RoutingTelemetry()
+
+    @property
+    def background(self):
+        """Backend for background work such as summaries: the fast one if there is one"""
+        return self.fast if self.fast is not None else self.main
+
+    def route(self, question: str, mode: str) -> RouteDecision:
+        query_class = classify_query(question, mode)
+        if self.fast is None:
+            return RouteDecision(mode, query_class, self.main)
+        if query_class in FAST_CLASSES:
+            return RouteDecision(mode, query_class, self.fast)
+        return RouteDecision(mode, query_class, self.main, draft=self.fast if self.draft else None)
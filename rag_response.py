@@ -0,0 +1,106 @@
+"""
+Structured RAG results: the answer, the chunks it was grounded on, and where the time went
+Filled in by llm_logic.stream_rag_response / get_rag_result and rendered by app.py.
+"""
+
+from dataclasses import asdict, dataclass, field
+
+EXCERPT_CHARS = 240
+
+
+def similarity_from_l2(distance: float) -> float:
+    """Cosine similarity from a FAISS squared-L2 distance between unit vectors"""
+    return 1.0 - distance / 2.0
+
+
+@dataclass
+class Source:
+    """
+    A retrieved chunk used in the prompt
+
+    Attributes:
+        document: The langchain Document
+        rank: Position in the retrieval ranking (1 = best)
+        score: Ranking score (fused RRF score for hybrid retrieval, similarity for dense)
+        similarity: Cosine similarity to the question, if found by dense search
+        bm25: BM25 score, if found by lexical search
+        rerank: Cross-encoder relevance score, if reranked (see reranker)
+    """
+    document: object
+    rank: int
+    score: float = None
+    similarity: float = None
+    bm25: float = None
+    rerank: float = None
+
+    def __post_init__(self):
+        # FAISS and numpy hand back float32s, which json cannot serialize
+        for name in ("score", "similarity", "bm25", "rerank"):
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, float(value))
+
+    @property
+    def file(self) -> str:
+        return self.document.metadata.get("source", "unknown")
+
+    @property
+    def page(self) -> int:
+        """1-based page number for paged formats (PDF), else None"""
+        page = self.document.metadata.get("page")
+        return page + 1 if isinstance(page, int) else None
+
+    @property
+    def excerpt(self) -> str:
+        text = " ".join(self.document.page_content.split())
+        return text if len(text) <= EXCERPT_CHARS else text[:EXCERPT_CHARS].rsplit(" ", 1)[0] + " …"
+
+    def to_dict(self) -> dict:
+        return {"file": self.file, "page": self.page, "rank": self.rank, "score": self.score,
+                "similarity": self.similarity, "bm25": self.bm25, "rerank": self.rerank, "excerpt": self.excerpt,
+                "chunk_id": getattr(self.document, "id", None)}
+
+
+@dataclass
+class Timings:
+    """
+    Latency breakdown of one RAG request, in milliseconds
+
+    ttft_ms and total_ms are measured from the start of the request; generation_ms from
+    the moment the prompt was ready (queueing, prefill and decoding).
+    """
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+    rerank_ms: float = 0.0
+    prompt_ms: float = 0.0
+    extract_ms: float = 0.0
+    ttft_ms: float = None
+    generation_ms: float = 0.0
+    total_ms: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def summary(self) -> str:
+        ttft = f"{self.ttft_ms:.0f} ms" if self.ttft_ms is not None else "n/a"
+        rerank = f"rerank {self.rerank_ms:.0f} ms · " if self.rerank_ms else ""
+        extract = f"extract {self.extract_ms:.0f} ms · " if self.extract_ms else ""
+        return (f"embed {self.embed_ms:.0f} ms · search {self.search_ms:.0f} ms · {rerank}"
+                f"prompt {self.prompt_ms:.0f} ms · {extract}first token {ttft} · "
+                f"generation {self.generation_ms / 1000:.1f} s · total {self.total_ms / 1000:.1f} s")
+
+
+@dataclass
+class RAGResponse:
+    question: str
+    answer: str = ""
+    sources: list = field(default_factory=list)
+    timings: Timings = field(default_factory=Timings)
+    from_cache: bool = False
+    # Answered by a sentence of a retrieved chunk instead of the LLM (see extractive)
+    extractive: bool = False
+
+    def to_dict(self) -> dict:
+        return {"question": self.question, "answer": self.answer, "from_cache": self.from_cache,
+                "extractive": self.extractive,
+                "sources": [source.to_dict() for source in self.sources], "timings": self.timings.to_dict()}
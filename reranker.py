@@ -0,0 +1,173 @@
+"""
+Second-stage reranking of retrieved chunks with a local cross-encoder
+The first stage (FAISS / hybrid search) fetches RERANK_CANDIDATES chunks; a small
+cross-encoder then scores each (question, chunk) pair on CPU, in batches, best first-stage
+candidates first. The stage has a hard latency budget: a batch only starts if the time
+it is expected to take (measured on earlier batches) still fits, and candidates left
+unscored keep their first-stage order after the reranked ones. Until the model has
+loaded, rankings pass through unchanged.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Reranking is optional (GEMMA3_RERANK=1 enables it) since it needs its own model
+RERANK_ENABLED = os.environ.get("GEMMA3_RERANK", "0") != "0"
+
+# ~22M parameters, a few ms per pair on CPU
+RERANK_MODEL_NAME = os.environ.get("GEMMA3_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# First-stage candidates to rerank (override with GEMMA3_RERANK_CANDIDATES)
+RERANK_CANDIDATES = int(os.environ.get("GEMMA3_RERANK_CANDIDATES", 20))
+
+# Latency budget of the stage in milliseconds (override with GEMMA3_RERANK_BUDGET_MS)
+RERANK_BUDGET_MS = float(os.environ.get("GEMMA3_RERANK_BUDGET_MS", 150))
+
+RERANK_BATCH_SIZE = 8
+
+# Weight of the latest batch in the per-pair cost estimate
+COST_SMOOTHING = 0.3
+
+
+@dataclass
+class RerankStats:
+    """
+    What one rerank call did
+
+    Attributes:
+        candidates: Chunks passed in
+        scored: Chunks the cross-encoder scored (a prefix of the first-stage order)
+        elapsed_ms: Time spent in the stage
+        fallback: None if every candidate was scored, "budget" if the budget ran out
+            first, "loading" if the model was not ready yet, "unavailable" if it failed
+            to load
+    """
+    candidates: int = 0
+    scored: int = 0
+    elapsed_ms: float = 0.0
+    fallback: str = None
+
+
+class Reranker:
+    """
+    Reorder Sources by cross-encoder relevance, within a latency budget
+
+    Args:
+        model: Object with a CrossEncoder-style predict(pairs, batch_size=...) -> scores;
+            defaults to RERANK_MODEL_NAME, loaded in the background on first use
+        budget_ms: Latency budget per call
+        batch_size: Pairs scored per model call
+    """
+
+    def __init__(self, model=None, budget_ms: float = RERANK_BUDGET_MS, batch_size: int = RERANK_BATCH_SIZE):
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self._model = model
+        self._pair_ms = None
+        self._load_lock = threading.Lock()
+        self._loader = None
+        self._lock = threading.Lock()
+        self.error = None
+        self.stats = {"calls": 0, "complete": 0, "budget": 0, "loading": 0, "unavailable": 0}
+
+    def load(self, wait: bool = True):
+        """Load the model (in a background thread unless wait), and time one batch"""
+        with self._load_lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._load, name="reranker-load", daemon=True)
+                self._loader.start()
+        if wait:
+            self._loader.join()
+
+    def _load(self):
+        try:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                model = CrossEncoder(RERANK_MODEL_NAME, device="cpu")
+            else:
+                model = self._model
+            # Warm up, and give the budget check a first cost estimate
+            pairs = [("warm up question", "warm up passage " * 40)] * self.batch_size
+            start = time.perf_counter()
+            model.predict(pairs, batch_size=self.batch_size)
+            self._pair_ms = 1000 * (time.perf_counter() - start) / len(pairs)
+            self._model = model
+            logger.info("Reranker ready (%.1f ms per pair)", self._pair_ms)
+        except Exception as e:
+            # Retrieval keeps working without the second stage
+            logger.exception("Could not load reranker %s", RERANK_MODEL_NAME)
+            self.error = str(e)
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None and self._pair_ms is not None
+
+    def rerank(self, question: str, sources: list, budget_ms: float = None) -> tuple:
+        """
+        Reorder first-stage results by cross-encoder score
+
+        Args:
+            question: The user's question
+            sources: rag_response.Sources in first-stage order
+            budget_ms: Override of the instance's latency budget
+
+        Returns:
+            (sources, RerankStats): scored sources by descending score, then unscored ones
+            in first-stage order; ranks are renumbered and `rerank` scores set
+        """
+        start = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        stats = RerankStats(candidates=len(sources))
+        if not self.ready:
+            self.load(wait=False)
+            stats.fallback = "unavailable" if self.error else "loading"
+            return self._finish(sources, [], stats, start)
+
+        scores = []
+        # One request at a time: concurrent calls would just share the same cores
+        with self._lock:
+            while len(scores) < len(sources):
+                batch = sources[len(scores):len(scores) + self.batch_size]
+                elapsed = 1000 * (time.perf_counter() - start)
+                if elapsed + self._pair_ms * len(batch) > budget_ms:
+                    stats.fallback = "budget"
+                    break
+                batch_start = time.perf_counter()
+                pairs = [(question, source.document.page_content) for source in batch]
+                scores.extend(float(score) for score in self._model.predict(pairs, batch_size=self.batch_size))
+                pair_ms = 1000 * (time.perf_counter() - batch_start) / len(batch)
+                self._pair_ms = COST_SMOOTHING * pair_ms + (1 - COST_SMOOTHING) * self._pair_ms
+        return self._finish(sources, scores, stats, start)
+
+    def _finish(self, sources: list, scores: list, stats: RerankStats, start: float) -> tuple:
+        scored = sorted(zip(sources, scores), key=lambda pair: pair[1], reverse=True)
+        for source, score in scored:
+            source.rerank = score
+        ranked = [source for source, _ in scored] + list(sources[len(scores):])
+        for rank, source in enumerate(ranked, start=1):
+            source.rank = rank
+
+        stats.scored = len(scores)
+        stats.elapsed_ms = 1000 * (time.perf_counter() - start)
+        self.stats["calls"] += 1
+        self.stats[stats.fallback or "complete"] += 1
+        return ranked, stats
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    """The process-wide Reranker (the model loads on first use)"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
@@ -0,0 +1,247 @@
+"""
+Long-term memory of a chat session, beyond the recent-message window
+Prompts carry only the recent messages that fit HISTORY_TOKEN_BUDGET (see
+SessionKVCache.history_window). Messages that fall out of that window are kept in two forms:
+
+- Recall: each past exchange is embedded into a small per-session vector store as it
+  leaves the window, and the exchanges most similar to the new question are quoted in
+  the prompt.
+- Rolling summary: once enough dropped messages have piled up, a background thread has
+  the LLM fold them into a short running summary. Summaries are cached by the
+  conversation prefix they cover, so reruns and restored chats reuse them.
+
+Summary and recall each have a token budget, so prompt size stays bounded however long
+the session gets. Summaries are only rewritten every SUMMARY_STEP_TOKENS of dropped
+history; the summary prompt displaces Ollama's KV cache, so it should stay rare.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from context_builder import count_tokens, truncate_to_tokens
+from kv_cache import history_key
+
+logger = logging.getLogger(__name__)
+
+# Session memory is on by default (GEMMA3_MEMORY=0 keeps only the recent-message window)
+MEMORY_ENABLED = os.environ.get("GEMMA3_MEMORY", "1") != "0"
+
+# Prompt budgets in tokens (override with GEMMA3_SUMMARY_TOKENS / GEMMA3_RECALL_TOKENS)
+SUMMARY_TOKENS = int(os.environ.get("GEMMA3_SUMMARY_TOKENS", 200))
+RECALL_TOKENS = int(os.environ.get("GEMMA3_RECALL_TOKENS", 300))
+
+# Past exchanges quoted per question, and the cosine similarity they need
+RECALL_K = 3
+RECALL_MIN_SIMILARITY = 0.3
+
+# Dropped history folded into the summary per LLM call; no call is made for less
+SUMMARY_STEP_TOKENS = 512
+
+# Longest single message fed to the summarizer or quoted by recall
+MESSAGE_TOKENS = 200
+
+MAX_SESSIONS = 256
+SUMMARY_CACHE_SIZE = 1024
+
+
+def format_messages(messages: list) -> str:
+    """Human/Assistant transcript of messages, each cut to MESSAGE_TOKENS"""
+    return "\n".join(
+        f"{'Human' if msg['role'] == 'user' else 'Assistant'}: {truncate_to_tokens(msg['content'], MESSAGE_TOKENS)}"
+        for msg in messages
+    )
+
+
+def _exchanges(messages: list) -> list:
+    """Split messages into exchanges (a question and its answers): lists of messages"""
+    exchanges = []
+    for msg in messages:
+        if msg["role"] == "user" or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(msg)
+    return exchanges
+
+
+@dataclass
+class _SessionState:
+    # Dropped messages known so far (indexed for recall) and how many the summary covers
+    messages: list = field(default_factory=list)
+    key: str = field(default_factory=lambda: history_key([]))
+    summarized: int = 0
+    summary: str = ""
+    # Recall store: one text per exchange; vectors for the first len(vectors) of them
+    texts: list = field(default_factory=list)
+    vectors: np.ndarray = None
+    summarizing: Future = None
+
+
+class SessionMemory:
+    """
+    Rolling summaries and recall of past exchanges, per chat session (LRU-bounded)
+
+    Args:
+        summarize: summarize(session_id, summary, transcript) -> updated summary text;
+            called on a background thread
+        embed: embed(texts) -> (len(texts), dim) array of unit vectors, or None when no
+            embeddings model is available (recall then waits until one is)
+        summary_tokens: Summary budget in tokens
+        recall_tokens: Budget for quoted past exchanges in tokens
+    """
+
+    def __init__(self, summarize, embed, summary_tokens: int = SUMMARY_TOKENS,
+                 recall_tokens: int = RECALL_TOKENS, max_sessions: int = MAX_SESSIONS):
+        self.summarize = summarize
+        self.embed = embed
+        self.summary_tokens = summary_tokens
+        self.recall_tokens = recall_tokens
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._summaries = OrderedDict()  # history_key of a prefix -> summary of it
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-memory")
+        self.stats = {"summaries": 0, "summary_cache_hits": 0, "summary_errors": 0, "recalls": 0}
+
+    def _state(self, session_id: str) -> _SessionState:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionState()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def update(self, session_id: str, dropped: list) -> Future:
+        """
+        Take in the messages that have left the session's prompt window
+
+        New exchanges are indexed for recall right away (a few embeddings); folding them
+        into the summary is scheduled on the background thread once SUMMARY_STEP_TOKENS
+        of them are waiting. An edited or cleared chat starts a fresh memory.
+
+        Args:
+            session_id: The chat session
+            dropped: The session's messages older than the prompt window, oldest first
+
+        Returns:
+            The running summary update, or None if none is running
+        """
+        with self._lock:
+            state = self._state(session_id)
+            known = len(state.messages)
+            if known > len(dropped) or history_key(dropped[:known]) != state.key:
+                state = self._sessions[session_id] = _SessionState()
+                known = 0
+            if len(dropped) > known:
+                state.messages = list(dropped)
+                state.key = history_key(dropped)
+                state.texts.extend(format_messages(exchange) for exchange in _exchanges(dropped[known:]))
+            texts = state.texts
+
+        self._index(state, texts)
+        with self._lock:
+            pending = sum(count_tokens(msg["content"]) for msg in state.messages[state.summarized:])
+            running = state.summarizing is not None and not state.summarizing.done()
+            if not running and pending >= SUMMARY_STEP_TOKENS:
+                state.summarizing = self._executor.submit(self._summarize, session_id, state)
+            return state.summarizing if state.summarizing is not None and not state.summarizing.done() else None
+
+    def _index(self, state: _SessionState, texts: list):
+        done = 0 if state.vectors is None else len(state.vectors)
+        if done >= len(texts):
+            return
+        vectors = self.embed(texts[done:])
+        if vectors is None:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            # Another call may have indexed the same texts meanwhile
+            if (0 if state.vectors is None else len(state.vectors)) == done:
+                state.vectors = vectors if state.vectors is None else np.vstack([state.vectors, vectors])
+
+    def _summarize(self, session_id: str, state: _SessionState):
+        """Fold dropped messages into the summary, a step at a time (background thread)"""
+        messages = state.messages
+        while True:
+            start, size, end = state.summarized, 0, state.summarized
+            while end < len(messages) and size < SUMMARY_STEP_TOKENS:
+                size += count_tokens(messages[end]["content"])
+                end += 1
+            if size < SUMMARY_STEP_TOKENS:
+                return
+
+            key = history_key(messages[:end])
+            with self._lock:
+                summary = self._summaries.get(key)
+                if summary is not None:
+                    self._summaries.move_to_end(key)
+                    self.stats["summary_cache_hits"] += 1
+            if summary is None:
+                try:
+                    summary = self.summarize(session_id, state.summary, format_messages(messages[start:end]))
+                except Exception:
+                    # Retried with the next update; meanwhile recall still covers these messages
+                    logger.exception("Could not summarize session %s", session_id)
+                    self.stats["summary_errors"] += 1
+                    return
+                summary = truncate_to_tokens(" ".join(summary.split()), self.summary_tokens)
+                with self._lock:
+                    self.stats["summaries"] += 1
+                    self._summaries[key] = summary
+                    while len(self._summaries) > SUMMARY_CACHE_SIZE:
+                        self._summaries.popitem(last=False)
+            with self._lock:
+                state.summary, state.summarized = summary, end
+
+    def context(self, session_id: str, question: str, embed_query=None) -> tuple:
+        """
+        Memory to put in a prompt
+
+        Args:
+            session_id: The chat session
+            question: The new question
+            embed_query: embed_query(question) -> unit vector; no recall without it (only
+                called when the session has indexed exchanges)
+
+        Returns:
+            (summary, recalled): the rolling summary ("" if none yet) and the past
+            exchanges most similar to the question that fit the recall budget, in
+            conversation order
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return "", []
+            summary, texts, vectors = state.summary, state.texts, state.vectors
+        if embed_query is None or vectors is None:
+            return summary, []
+
+        scores = vectors @ np.asarray(embed_query(question), dtype=np.float32)
+        best = [i for i in np.argsort(-scores)[:RECALL_K] if scores[i] >= RECALL_MIN_SIMILARITY]
+        recalled, remaining = [], self.recall_tokens
+        for i in best:
+            tokens = count_tokens(texts[i])
+            if tokens > remaining:
+                continue
+            recalled.append(i)
+            remaining -= tokens
+        if recalled:
+            self.stats["recalls"] += 1
+        return summary, [texts[i] for i in sorted(recalled)]
+
+    def wait(self, session_id: str):
+        """Block until the session's background summary update, if any, has finished"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            future = state.summarizing if state is not None else None
+        if future is not None:
+            future.result()
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,167 @@
+"""
+Deterministic synthetic document corpora for benchmarks
+Generates PDF, DOCX and TXT files of a given size from a seeded random generator, so
+every run (and every commit) ingests exactly the same bytes. PDFs are written directly
+(no PDF library needed); DOCX files use python-docx.
+"""
+
+import datetime
+import io
+import random
+import textwrap
+import zipfile
+
+WORDS = (
+    "system model data index query vector document page section table figure result method "
+    "value error network memory process thread request response latency cache server client "
+    "config module release version install update security policy account report budget "
+    "customer order invoice payment shipment warehouse product feature issue ticket support"
+).split()
+
+WORDS_PER_PAGE = 400
+LINE_CHARS = 90
+
+# Timestamp written into DOCX core properties and zip entries instead of the current time
+FIXED_TIMESTAMP = datetime.datetime(2024, 1, 1)
+LINES_PER_PDF_PAGE = 60
+KINDS = ("pdf", "docx", "txt")
+
+
+class SyntheticUpload(io.BytesIO):
+    """Stand-in for a Streamlit UploadedFile, which is a BytesIO with a name and size"""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def make_paragraph(rng: random.Random, words: int) -> str:
+    """A sentence-structured paragraph with occasional identifiers (ERR-123, v1.2.3)"""
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(8, 20))
+        sentence = [rng.choice(WORDS) for _ in range(length)]
+        if rng.random() < 0.2:
+            sentence[rng.randrange(length)] = rng.choice(
+                [f"ERR-{rng.randint(100, 999)}", f"v{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}"]
+            )
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def make_pages(rng: random.Random, pages: int, words_per_page: int = WORDS_PER_PAGE) -> list:
+    """Page texts: a heading plus paragraphs of roughly words_per_page words"""
+    texts = []
+    for page in range(pages):
+        paragraphs = [f"Section {page + 1}: {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}"]
+        remaining = words_per_page
+        while remaining > 0:
+            length = min(remaining, rng.randint(40, 120))
+            paragraphs.append(make_paragraph(rng, length))
+            remaining -= length
+        texts.append("\n\n".join(paragraphs))
+    return texts
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: list) -> bytes:
+    """Minimal valid PDF with one Helvetica text page per entry of `pages`"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in pages:
+        lines = []
+        for paragraph in text.split("\n\n"):
+            lines.extend(textwrap.wrap(paragraph, LINE_CHARS) or [""])
+        lines = lines[:LINES_PER_PDF_PAGE]
+        content = "BT /F1 9 Tf 12 TL 40 760 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = content.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(pages: list) -> bytes:
+    """DOCX with one heading and paragraphs per page of text"""
+    import docx
+    document = docx.Document()
+    document.core_properties.created = document.core_properties.modified = FIXED_TIMESTAMP
+    for text in pages:
+        heading, *paragraphs = text.split("\n\n")
+        document.add_heading(heading, level=2)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+    saved = io.BytesIO()
+    document.save(saved)
+
+    # python-docx stamps zip entries with the current time; rewrite them with a fixed one
+    out = io.BytesIO()
+    with zipfile.ZipFile(saved) as source, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as target:
+        for entry in source.infolist():
+            info = zipfile.ZipInfo(entry.filename, date_time=FIXED_TIMESTAMP.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            target.writestr(info, source.read(entry))
+    return out.getvalue()
+
+
+def make_txt(pages: list) -> bytes:
+    return "\n\n".join(pages).encode("utf-8")
+
+
+MAKERS = {"pdf": make_pdf, "docx": make_docx, "txt": make_txt}
+
+
+def make_corpus(pages: int, pages_per_file: int = 10, kinds: tuple = KINDS, seed: int = 0) -> list:
+    """
+    Build a corpus of about `pages` pages, split into files of pages_per_file pages and
+    cycling through `kinds`
+
+    Returns:
+        List of SyntheticUpload
+    """
+    rng = random.Random(seed)
+    files = []
+    remaining = pages
+    while remaining > 0:
+        count = min(pages_per_file, remaining)
+        kind = kinds[len(files) % len(kinds)]
+        data = MAKERS[kind](make_pages(rng, count))
+        files.append(SyntheticUpload(f"synthetic_{len(files):04d}.{kind}", data))
+        remaining -= count
+    return files
+
+
+def make_questions(count: int, seed: int = 1) -> list:
+    """Questions drawn from the same vocabulary as the corpus"""
+    rng = random.Random(seed)
+    return [
+        f"What does the {rng.choice(WORDS)} {rng.choice(WORDS)} say about {rng.choice(WORDS)}?"
+        for _ in range(count)
+    ]
@@ -0,0 +1,109 @@
+"""
+Answer cache test: exact and near-duplicate hits, TTL and LRU eviction, the SQLite backend,
+and a new scope once a file of the document set is replaced
+Uses bag-of-words embeddings (texts sharing words are similar), no model needed.
+Run with: python -m pytest -q test_answer_cache.py   (or: python test_answer_cache.py)
+"""
+
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ann_index import delete_vectors
+from answer_cache import AnswerCache, corpus_fingerprint, make_scope
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from ingest import add_chunks, chunk_ids
+
+
+def bag_of_words(text: str) -> list:
+    vector = np.zeros(256, dtype=np.float32)
+    for word in text.lower().replace("?", " ").split():
+        vector[zlib.crc32(word.encode()) % 256] += 1
+    return vector.tolist()
+
+
+class BagOfWords:
+    def embed_documents(self, texts: list) -> list:
+        return [bag_of_words(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return bag_of_words(text)
+
+
+def test_exact_semantic_and_eviction():
+    cache = AnswerCache(max_entries=2, ttl=60, threshold=0.75)
+    scope = make_scope("rag", "corpus")
+    cache.put(scope, "When was the company founded?", "In 1999.", bag_of_words)
+
+    # Case, spacing and trailing punctuation do not matter; the scope does
+    assert cache.get(scope, "  when was the company FOUNDED ") == "In 1999."
+    assert cache.get(make_scope("rag", "other corpus"), "When was the company founded?") is None
+    # A near-duplicate wording needs the embedder
+    assert cache.get(scope, "When was this company founded?") is None
+    assert cache.get(scope, "When was this company founded?", bag_of_words) == "In 1999."
+    assert cache.get(scope, "Who are the customers?", bag_of_words) is None
+
+    # The least recently used entry goes first
+    cache.put(scope, "Who are the customers?", "Retailers.")
+    cache.get(scope, "When was the company founded?")
+    cache.put(scope, "Where is the office?", "In a garage.")
+    assert cache.get(scope, "Who are the customers?") is None
+    assert cache.get(scope, "When was the company founded?") == "In 1999."
+
+    cache.ttl = 0.05
+    time.sleep(0.1)
+    assert cache.get(scope, "When was the company founded?") is None
+
+    metrics = cache.metrics()
+    assert (metrics["exact_hits"], metrics["semantic_hits"], metrics["evictions"], metrics["expired"]) == (3, 1, 1, 1)
+
+
+def test_sqlite_backend_survives_restart():
+    scope = make_scope("text")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "answers.sqlite")
+        AnswerCache(path=path).put(scope, "What is FAISS?", "A vector index.", bag_of_words)
+        reopened = AnswerCache(threshold=0.5, path=path)
+        assert len(reopened) == 1
+        assert reopened.get(scope, "What is FAISS, again?", bag_of_words) == "A vector index."
+        reopened.clear()
+        assert len(AnswerCache(path=path)) == 0
+
+
+def test_replacing_a_file_changes_the_scope():
+    embeddings = CachedEmbeddings(BagOfWords(), "bow", cache=EmbeddingCache(":memory:"))
+    chunks = [Document(page_content=f"Chunk {i} of the report.") for i in range(3)]
+    ids = chunk_ids("report.txt", "v0", 3)
+    vector_store = add_chunks(None, chunks, ids, embeddings)
+    first = corpus_fingerprint(vector_store)
+    seen = {first}
+
+    # Each new version gets a new fingerprint, whatever happens to the ID mapping dict
+    for version in range(1, 20):
+        vector_store = delete_vectors(vector_store, ids, embeddings)
+        ids = chunk_ids("report.txt", f"v{version}", 3)
+        vector_store = add_chunks(vector_store, chunks, ids, embeddings)
+        fingerprint = corpus_fingerprint(vector_store)
+        assert fingerprint not in seen
+        seen.add(fingerprint)
+
+    # Back to the first version in the same dict at the same size, as when a replaced
+    # mapping's address is reused
+    mapping = vector_store.index_to_docstore_id
+    for position, doc_id in zip(sorted(mapping), chunk_ids("report.txt", "v0", 3)):
+        mapping[position] = doc_id
+    assert corpus_fingerprint(vector_store) == first
+
+    assert corpus_fingerprint(None) == ""
+    assert corpus_fingerprint(object()) is None  # documents cannot be identified
+
+
+if __name__ == "__main__":
+    test_exact_semantic_and_eviction()
+    test_sqlite_backend_survives_restart()
+    test_replacing_a_file_changes_the_scope()
+    print("✅ Answer cache tests passed!")
@@ -0,0 +1,143 @@
+"""
+HTTP API test: ingestion, retrieval, chat and SSE streaming over a real uvicorn server,
+with JSON and msgpack bodies and keep-alive connections
+Uses a deterministic fake embeddings model and a fake Ollama server.
+Run with: python -m pytest -q test_api_server.py   (or: python test_api_server.py)
+"""
+
+import http.client
+import json
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import llm_logic
+from api_server import BackgroundServer, create_app
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from fake_ollama import FakeOllamaServer
+
+TOKENS = ["Paris", " is", " the", " capital."]
+FILES = {
+    "cities.txt": b"Paris is the capital of France. Berlin is the capital of Germany.",
+    "rivers.txt": b"The Seine flows through Paris. The Spree flows through Berlin.",
+}
+
+
+def _request(conn, method: str, path: str, body=None, msgpack: bool = False, headers: dict = None) -> tuple:
+    """(status, decoded body) of a request on a kept-alive connection"""
+    if msgpack:
+        ormsgpack = pytest.importorskip("ormsgpack")  # optional, like in api_server
+    headers = dict(headers or {})
+    if body is not None and not isinstance(body, bytes):
+        body = ormsgpack.packb(body) if msgpack else json.dumps(body).encode()
+        headers["Content-Type"] = "application/msgpack" if msgpack else "application/json"
+    if msgpack:
+        headers["Accept"] = "application/msgpack"
+    conn.request(method, path, body, headers)
+    response = conn.getresponse()
+    raw = response.read()
+    return response.status, ormsgpack.unpackb(raw) if msgpack else json.loads(raw)
+
+
+def _multipart(files: dict) -> tuple:
+    boundary = "gemma3-test-boundary"
+    body = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+        f"Content-Type: text/plain\r\n\r\n".encode() + data + b"\r\n"
+        for name, data in files.items()
+    ) + f"--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def _with_fakes(test):
+    original = (llm_logic._embeddings, llm_logic.ANSWER_CACHE_ENABLED, llm_logic.llm.base_url)
+    llm_logic._embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=64), "fake",
+                                             cache=EmbeddingCache(":memory:"))
+    llm_logic.ANSWER_CACHE_ENABLED = False
+    try:
+        with FakeOllamaServer(TOKENS) as ollama, BackgroundServer(create_app(use_cache=False, warm_up=False)) as api:
+            llm_logic.llm.base_url = ollama.url
+            conn = http.client.HTTPConnection("127.0.0.1", api.port, timeout=30)
+            try:
+                test(conn, ollama)
+            finally:
+                conn.close()
+    finally:
+        llm_logic._embeddings, llm_logic.ANSWER_CACHE_ENABLED, llm_logic.llm.base_url = original
+
+
+def test_ingest_retrieve_and_chat():
+    def test(conn, ollama):
+        body, headers = _multipart(FILES)
+        status, job = _request(conn, "POST", "/v1/collections/docs/documents?wait=1", body, headers=headers)
+        assert status == 200 and job["status"] == "done"
+        assert sorted(job["changes"]["added"]) == sorted(FILES)
+        socket = conn.sock
+
+        status, result = _request(conn, "POST", "/v1/retrieve", {"question": "capital of France", "collection": "docs",
+                                                                  "k": 2})
+        assert status == 200 and len(result["sources"]) == 2
+        assert {source["file"] for source in result["sources"]} <= set(FILES)
+        status, result = _request(conn, "POST", "/v1/retrieve", {"questions": ["Paris", "Berlin"],
+                                                                  "collection": "docs"})
+        assert status == 200 and [len(sources) for sources in result["results"]] == [2, 2]
+
+        status, result = _request(conn, "POST", "/v1/chat", {"question": "What is the capital of France?",
+                                                              "collection": "docs"})
+        assert status == 200 and result["answer"] == "".join(TOKENS) and result["sources"]
+        assert "capital of France" in ollama.requests[-1]["payload"]["prompt"]
+        status, result = _request(conn, "POST", "/v1/chat", {"question": "Hi", "history": [
+            {"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hello!"}]})
+        assert status == 200 and result["answer"] == "".join(TOKENS)
+
+        assert _request(conn, "POST", "/v1/chat", {"question": ""})[0] == 400
+        assert _request(conn, "POST", "/v1/chat", {"question": "Hi", "collection": "nope"})[0] == 404
+        assert _request(conn, "DELETE", "/v1/collections/docs")[0] == 200
+        assert _request(conn, "GET", "/health")[1]["collections"] == {}
+        # Every request, errors included, went over the one kept-alive connection
+        assert conn.sock is socket
+
+    _with_fakes(test)
+
+
+def test_msgpack_bodies():
+    def test(conn, ollama):
+        body, headers = _multipart(FILES)
+        assert _request(conn, "POST", "/v1/collections/docs/documents?wait=1", body, headers=headers)[0] == 200
+        status, result = _request(conn, "POST", "/v1/retrieve", {"question": "capital of France", "collection": "docs",
+                                                                  "k": 2}, msgpack=True)
+        assert status == 200 and len(result["sources"]) == 2
+        status, result = _request(conn, "POST", "/v1/chat", {"question": "Hi", "history": [
+            {"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hello!"}]}, msgpack=True)
+        assert status == 200 and result["answer"] == "".join(TOKENS)
+
+    _with_fakes(test)
+
+
+def test_chat_stream_sends_server_sent_events():
+    def test(conn, ollama):
+        conn.request("POST", "/v1/chat/stream", json.dumps({"question": "What is the capital of France?"}),
+                     {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.getheader("Content-Type").startswith("text/event-stream")
+
+        events = []
+        for block in response.read().decode().split("\n\n"):
+            if block:
+                name, data = block.split("\n", 1)
+                events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        assert [name for name, _ in events] == ["token"] * len(TOKENS) + ["done"]
+        assert "".join(data["text"] for _, data in events[:-1]) == events[-1][1]["answer"] == "".join(TOKENS)
+
+        # The connection stays usable after a stream
+        assert _request(conn, "GET", "/health")[1]["status"] == "ok"
+
+    _with_fakes(test)
+
+
+if __name__ == "__main__":
+    test_ingest_retrieve_and_chat()
+    test_msgpack_bodies()
+    test_chat_stream_sends_server_sent_events()
+    print("✅ API server tests passed!")
@@ -0,0 +1,84 @@
+"""
+Chunking test: structure-aware chunks stay within their token limit, are verbatim spans
+of their page, start at headings and never span pages; truncation keeps text without spaces
+Run with: python -m pytest -q test_chunker.py   (or: python test_chunker.py)
+"""
+
+import random
+import re
+
+from langchain_core.documents import Document
+
+from chunker import ChunkConfig, StructureChunker
+from context_builder import count_tokens, token_prefix, truncate_to_tokens
+from synthetic_corpus import make_pages
+
+
+def test_token_prefix_matches_count_tokens():
+    rng = random.Random(0)
+    for alphabet in ("abcdefgh_0123 \n\t.,;-!?()", "abcdé日本 \n.,-"):
+        for _ in range(500):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 100)))
+            cuts = [0] + [i for i, c in enumerate(text) if c.isspace()] + [len(text)]
+            start, end = sorted(rng.sample(cuts, 2)) if len(cuts) > 1 else (0, len(text))
+            prefix = token_prefix(text)
+            assert prefix[-1] == count_tokens(text)
+            assert prefix[end] - prefix[start] == count_tokens(text[start:end])
+
+
+def test_truncate_to_tokens():
+    assert truncate_to_tokens("alpha beta gamma delta", 3) == "alpha beta"
+    assert truncate_to_tokens("line one\nline two\nline three", 4) == "line one\nline two"
+    # No whitespace to cut at: cut between characters instead of dropping the text
+    for text in ("https://example.com/" + "abcdefgh" * 50, "这是一个很长的中文句子没有空格" * 10):
+        truncated = truncate_to_tokens(text, 10)
+        assert truncated and text.startswith(truncated) and count_tokens(truncated) <= 10
+    rng = random.Random(1)
+    for _ in range(300):
+        text = "".join(rng.choice("abcdefgh日本 \n.,-/") for _ in range(rng.randint(0, 200)))
+        budget = rng.randint(0, 40)
+        truncated = truncate_to_tokens(text, budget)
+        assert text.startswith(truncated) and count_tokens(truncated) <= budget
+        assert truncated or budget == 0 or not text.strip()
+
+
+def test_chunks_follow_structure():
+    config = ChunkConfig(chunk_tokens=64, overlap_tokens=8)
+    pages = make_pages(random.Random(1), 4)
+    chunker = StructureChunker(config)
+    chunks = chunker.split_documents([Document(page_content=text, metadata={"page": i}) for i, text in enumerate(pages)])
+
+    for chunk in chunks:
+        page = pages[chunk.metadata["page"]]
+        assert chunk.page_content in page
+        assert count_tokens(chunk.page_content) <= config.chunk_tokens
+        assert chunk.metadata["section"] == page.split("\n\n")[0]
+
+    # Every heading opens a chunk; every sentence lands in some chunk
+    for i, page in enumerate(pages):
+        heading = page.split("\n\n")[0]
+        page_chunks = [c.page_content for c in chunks if c.metadata["page"] == i]
+        assert page_chunks[0].startswith(heading)
+        for sentence in re.split(r"(?<=\.)\s+|\n\n", page):
+            assert any(sentence in chunk for chunk in page_chunks)
+
+
+def test_overlap_only_inside_paragraphs():
+    config = ChunkConfig(chunk_tokens=40, overlap_tokens=12)
+    paragraphs = ["First paragraph sentence number %d." % i for i in range(12)]
+    text = "# Title\n\n" + " ".join(paragraphs[:6]) + "\n\n" + " ".join(paragraphs[6:])
+    chunks = [chunk for chunk, _ in StructureChunker(config).split_text(text)]
+
+    # The cut inside the first paragraph repeats a sentence; the paragraph break does not
+    assert chunks[0].startswith("# Title")
+    repeated = [a.split(". ")[-1] in b for a, b in zip(chunks, chunks[1:])]
+    assert any(repeated)
+    assert not any(chunk.startswith(paragraphs[6]) and paragraphs[5] in chunk for chunk in chunks)
+
+
+if __name__ == "__main__":
+    test_token_prefix_matches_count_tokens()
+    test_truncate_to_tokens()
+    test_chunks_follow_structure()
+    test_overlap_only_inside_paragraphs()
+    print("✅ Chunker tests passed!")
@@ -0,0 +1,78 @@
+"""
+Compact storage test: quantized and binary indexes and the compact docstore survive the
+index cache round trip (memory-mapped, read-only) and still find the right chunks
+Uses a deterministic fake embeddings model, so no model or Ollama server is needed.
+Run with: python -m pytest -q test_compact_storage.py   (or: python test_compact_storage.py)
+"""
+
+import tempfile
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from ann_index import delete_vectors, encoding_of, ensure_index_type
+from compact_docstore import CompactDocstore, PositionIds
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from index_cache import load_index, save_index
+from index_registry import mmap_flags
+from ingest import add_chunks
+
+
+def _chunks(count: int) -> list:
+    return [
+        Document(page_content=f"Chunk {i}: Überblick über Abschnitt {i % 7}.",
+                 metadata={"source": f"file{i % 3}.pdf", "page": i % 5, "tags": ["a", i % 2]})
+        for i in range(count)
+    ]
+
+
+def test_compact_docstore_matches_documents():
+    chunks = _chunks(50)
+    ids = [f"id-{i}" for i in range(50)]
+    with tempfile.TemporaryDirectory() as folder:
+        CompactDocstore.from_documents(ids, chunks).save(folder)
+        store = CompactDocstore.load(folder)
+
+        for doc_id, chunk in zip(ids, chunks):
+            doc = store.search(doc_id)
+            assert (doc.id, doc.page_content, doc.metadata) == (doc_id, chunk.page_content, chunk.metadata)
+        assert store.search("missing") == "ID missing not found."
+        assert dict(store.positions()) == dict(enumerate(ids))
+
+        # Edits go to an overlay; copies do not see each other's edits
+        edited = store.copy()
+        edited.delete(["id-3"])
+        edited.add({"id-new": Document(page_content="new")})
+        assert edited.search("id-3") == "ID id-3 not found."
+        assert edited.search("id-new").page_content == "new"
+        assert len(edited) == 50 and store.search("id-3").page_content == chunks[3].page_content
+
+
+def test_encodings_round_trip_through_the_index_cache():
+    embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=64), "fake", cache=EmbeddingCache(":memory:"))
+    chunks = _chunks(300)
+    ids = [f"id-{i}" for i in range(300)]
+    for encoding in ("float32", "fp16", "int8", "binary"):
+        vector_store = ensure_index_type(add_chunks(None, chunks, ids, embeddings), "flat", encoding)
+        assert encoding_of(vector_store.index) == encoding
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            save_index("key", vector_store, cache_dir)
+            shared = load_index("key", embeddings, cache_dir, io_flags=mmap_flags())
+            assert shared.read_only and isinstance(shared.docstore, CompactDocstore)
+            assert isinstance(shared.index_to_docstore_id, PositionIds)
+            for i in (0, 123, 299):
+                doc, distance = shared.similarity_search_with_score(chunks[i].page_content, k=1)[0]
+                assert doc.id == f"id-{i}" and doc.metadata == chunks[i].metadata
+                assert distance < 0.05
+
+            # A writable copy can drop a file's chunks, whatever the index type
+            private = delete_vectors(shared.copy(), ids[:100], embeddings)
+            assert private.index.ntotal == 200
+            assert private.similarity_search(chunks[150].page_content, k=1)[0].id == "id-150"
+
+
+if __name__ == "__main__":
+    test_compact_docstore_matches_documents()
+    test_encodings_round_trip_through_the_index_cache()
+    print("✅ Compact storage tests passed!")
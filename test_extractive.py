@@ -0,0 +1,114 @@
+"""
+Extractive answer test: a retrieved sentence that answers the question is returned with
+its citation without calling the LLM; anything less clear-cut is generated as usual.
+Uses bag-of-words embeddings (texts sharing words are similar) and a fake Ollama server.
+Run with: python -m pytest -q test_extractive.py   (or: python test_extractive.py)
+"""
+
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import llm_logic
+from answer_cache import AnswerCache
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from extractive import ExtractiveAnswerer, split_sentences
+from fake_ollama import FakeOllamaServer
+from ingest import add_chunks
+from rag_response import Source
+
+CHUNKS = [
+    Document(page_content="Company history\nThe company was founded in 1999 by two engineers. "
+                          "Its first office opened in a garage.",
+             metadata={"source": "report.pdf", "page": 2}),
+    Document(page_content="Revenue grew every year since the first product shipped. "
+                          "Most customers are small retailers in Europe.",
+             metadata={"source": "report.pdf", "page": 5}),
+    Document(page_content="Support is available by email on weekdays. Phone support costs extra.",
+             metadata={"source": "faq.txt"}),
+]
+
+
+class BagOfWords(Embeddings):
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(256, dtype=np.float32)
+        for word in text.lower().replace("?", " ").replace(".", " ").split():
+            vector[zlib.crc32(word.encode()) % 256] += 1
+        return (vector / max(np.linalg.norm(vector), 1e-9)).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+def test_confident_sentences_are_extracted():
+    assert split_sentences(CHUNKS[0].page_content) == [
+        "The company was founded in 1999 by two engineers.", "Its first office opened in a garage."
+    ]
+    embeddings = BagOfWords()
+    sources = [Source(chunk, rank) for rank, chunk in enumerate(CHUNKS, start=1)]
+    answerer = ExtractiveAnswerer(min_similarity=0.5)
+
+    def ask(question: str):
+        return answerer.extract(question, embeddings.embed_query(question), sources, embeddings.embed_documents)
+
+    extract = ask("Which year was the company founded?")
+    assert extract.span == "The company was founded in 1999 by two engineers."
+    assert extract.answer.endswith("(Source: report.pdf, page 3)")
+    # Nothing answers it; and a sentence that only repeats the question is no answer
+    assert ask("What is the refund policy for damaged orders?") is None
+    assert ask("Company history") is None
+
+    answerer.record_generation(2000.0)
+    assert ask("Is phone support available on weekdays?") is not None
+    metrics = answerer.metrics()
+    assert (metrics["attempts"], metrics["hits"], metrics["misses"]) == (4, 2, 2)
+    assert 1900 < metrics["saved_ms"] <= 2000 and metrics["mean_extract_ms"] < 50
+
+
+def test_rag_skips_generation_on_a_hit():
+    embeddings = CachedEmbeddings(BagOfWords(), "bow", cache=EmbeddingCache(":memory:"))
+    vector_store = add_chunks(None, CHUNKS, [f"id-{i}" for i in range(len(CHUNKS))], embeddings)
+    original = (llm_logic.EXTRACTIVE_ENABLED, llm_logic._extractive_answerer, llm_logic.ANSWER_CACHE_ENABLED,
+                llm_logic._answer_cache)
+    llm_logic.EXTRACTIVE_ENABLED, llm_logic.ANSWER_CACHE_ENABLED, llm_logic._answer_cache = True, True, AnswerCache()
+    llm_logic._extractive_answerer = answerer = ExtractiveAnswerer(min_similarity=0.5)
+    history = [{"role": "user", "content": "Who started the company?"},
+               {"role": "assistant", "content": "Two engineers."}]
+    try:
+        with FakeOllamaServer(["Generated", " answer."]) as server:
+            original_url, llm_logic.llm.base_url = llm_logic.llm.base_url, server.url
+            try:
+                generated = llm_logic.get_rag_result("Where do most customers come from and why?", vector_store)
+                extracted = llm_logic.get_rag_result("Which year was the company founded?", vector_store)
+                # Extractive answers are not cached, so a repeat is extracted again
+                repeated = llm_logic.get_rag_result("Which year was the company founded?", vector_store)
+                # A follow-up may depend on the history, so it is generated
+                follow_up = llm_logic.get_rag_result("Which year was the company founded?", vector_store, history)
+            finally:
+                llm_logic.llm.base_url = original_url
+    finally:
+        (llm_logic.EXTRACTIVE_ENABLED, llm_logic._extractive_answerer, llm_logic.ANSWER_CACHE_ENABLED,
+         llm_logic._answer_cache) = original
+
+    print(f"\n   extractive answer in {extracted.timings.total_ms:.1f} ms, "
+          f"generated answer in {generated.timings.total_ms:.1f} ms")
+    assert generated.answer == "Generated answer." and not generated.extractive
+    assert extracted.extractive and not extracted.from_cache
+    assert repeated.extractive and not repeated.from_cache and repeated.sources == extracted.sources
+    assert follow_up.answer == "Generated answer." and not follow_up.extractive
+    assert len(server.requests) == 2
+    assert extracted.answer.startswith("The company was founded in 1999")
+    assert [source.file for source in extracted.sources] == ["report.pdf"]
+    assert extracted.timings.extract_ms > 0
+    assert answerer.metrics()["hits"] == 2 and answerer.metrics()["mean_generation_ms"] > 0
+
+
+if __name__ == "__main__":
+    test_confident_sentences_are_extracted()
+    test_rag_skips_generation_on_a_hit()
+    print("✅ Extractive answer tests passed!")
@@ -0,0 +1,101 @@
+"""
+Shared index test: sessions with the same uploads must share one memory-mapped index
+Uses a deterministic fake embeddings model and synthetic documents, so no model or
+Ollama server is needed.
+Run with: python -m pytest -q test_index_registry.py   (or: python test_index_registry.py)
+"""
+
+import gc
+import tempfile
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import index_registry
+import llm_logic
+from doc_registry import DocumentRegistry
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from index_registry import IndexRegistry
+from synthetic_corpus import make_corpus
+
+
+def _with_fresh_registry(test, max_idle: int = 4):
+    """Run test(registry) against an empty IndexRegistry and fake embeddings"""
+    original_registry, original_embeddings = index_registry._registry, llm_logic._embeddings
+    with tempfile.TemporaryDirectory() as cache_dir:
+        index_registry._registry = IndexRegistry(max_idle=max_idle, cache_dir=cache_dir)
+        llm_logic._embeddings = CachedEmbeddings(
+            DeterministicFakeEmbedding(size=64), "fake", cache=EmbeddingCache(":memory:")
+        )
+        try:
+            test(index_registry._registry)
+        finally:
+            index_registry._registry, llm_logic._embeddings = original_registry, original_embeddings
+
+
+def test_sessions_share_one_index():
+    def test(registry):
+        first, second = DocumentRegistry(), DocumentRegistry()
+        corpus = make_corpus(20)
+        first.sync(corpus)
+        computed = llm_logic._embeddings.stats["computed"]
+        time.sleep(1)  # DOCX timestamps have one-second resolution
+        again = make_corpus(20)
+        assert [f.getvalue() for f in again] == [f.getvalue() for f in corpus]  # byte-deterministic
+        changes = second.sync(again)
+
+        assert changes["added"] == [f.name for f in make_corpus(20)]
+        assert second.vector_store is first.vector_store
+        assert second.vector_store.read_only
+        assert first.shared_sessions == 2
+        assert llm_logic._embeddings.stats["computed"] == computed  # embedded once
+        assert len(registry) == 1
+        assert llm_logic.retrieve("system model", second.vector_store)
+
+    _with_fresh_registry(test)
+
+
+def test_changes_copy_the_shared_index():
+    def test(registry):
+        files = make_corpus(20)
+        first, second = DocumentRegistry(), DocumentRegistry()
+        first.sync(files)
+        second.sync(files)
+        shared_size = first.vector_store.index.ntotal
+
+        second.remove_file(files[0].name)
+        assert not second.vector_store.read_only
+        assert second.shared_sessions == 0
+        assert first.vector_store.index.ntotal == shared_size
+        assert first.shared_sessions == 1
+
+        # Re-syncing publishes the new corpus, and a third session picks it up
+        second.sync(files[1:])
+        third = DocumentRegistry()
+        third.sync(files[1:])
+        assert third.vector_store is second.vector_store
+        assert len(registry) == 2
+
+    _with_fresh_registry(test)
+
+
+def test_idle_indexes_are_evicted():
+    def test(registry):
+        sessions = [DocumentRegistry() for _ in range(3)]
+        for seed, session in enumerate(sessions):
+            session.sync(make_corpus(10, seed=seed))
+        assert len(registry) == 3
+
+        del session, sessions
+        gc.collect()
+        assert len(registry) == 1
+        assert registry.stats["evicted"] == 2
+
+    _with_fresh_registry(test, max_idle=1)
+
+
+if __name__ == "__main__":
+    test_sessions_share_one_index()
+    test_changes_copy_the_shared_index()
+    test_idle_indexes_are_evicted()
+    print("✅ Shared index tests passed!")
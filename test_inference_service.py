@@ -0,0 +1,70 @@
+"""
+Inference service test: a request cancelled before its task first runs frees its slot, and a
+cancelled stream raises instead of ending like a finished answer (which would be cached).
+With one generation at a time, a leaked slot would leave every later request waiting forever.
+Uses the local fake Ollama server.
+Run with: python -m pytest -q test_inference_service.py   (or: python test_inference_service.py)
+"""
+
+import threading
+
+import pytest
+
+import llm_logic
+from answer_cache import AnswerCache
+from fake_ollama import FakeOllamaServer
+from inference_service import GenerationCancelled, InferenceService
+
+TOKENS = ["Hello", " there."]
+
+
+def test_early_cancel_frees_the_slot():
+    with FakeOllamaServer(TOKENS) as server:
+        service = InferenceService(max_inflight=1)
+        url = f"{server.url}/api/generate"
+        try:
+            def subscribe_and_leave():
+                # The job's task is created but has not taken its first step yet
+                job, subscriber_id = service._subscribe(url, {"prompt": "early"}, "early", 0, lambda event: None)
+                service._unsubscribe(job, subscriber_id)
+                return job
+
+            job = service._call(subscribe_and_leave)
+            assert job.task is not None
+
+            answers = []
+            thread = threading.Thread(
+                target=lambda: answers.append("".join(service.stream(url, {"prompt": "later"}))), daemon=True
+            )
+            thread.start()
+            thread.join(timeout=10)
+            assert answers == ["".join(TOKENS)]
+            stats = service.stats()
+            assert (stats["in_flight"], stats["cancelled"], stats["completed"]) == (0, 1, 1)
+        finally:
+            service.close()
+
+
+def test_cancelled_answers_are_not_cached():
+    original = (llm_logic.ANSWER_CACHE_ENABLED, llm_logic._answer_cache, llm_logic.llm.base_url)
+    llm_logic.ANSWER_CACHE_ENABLED, llm_logic._answer_cache = True, AnswerCache()
+    tokens = [f" token{i}" for i in range(20)]
+    try:
+        with FakeOllamaServer(tokens, token_delay=0.05) as server:
+            llm_logic.llm.base_url = server.url
+            received = []
+            with pytest.raises(GenerationCancelled):
+                for token in llm_logic.stream_text_response("Tell me a long story", session_id="cancel-test"):
+                    received.append(token)
+                    if len(received) == 3:
+                        threading.Thread(target=llm_logic.cancel_session, args=("cancel-test",)).start()
+            assert 3 <= len(received) < len(tokens)
+            assert len(llm_logic._answer_cache) == 0
+    finally:
+        llm_logic.ANSWER_CACHE_ENABLED, llm_logic._answer_cache, llm_logic.llm.base_url = original
+
+
+if __name__ == "__main__":
+    test_early_cancel_frees_the_slot()
+    test_cancelled_answers_are_not_cached()
+    print("✅ Inference service tests passed!")
@@ -0,0 +1,112 @@
+"""
+Background ingestion test: a cancelled job keeps the files it finished, and processing
+the same uploads again only indexes the rest; cancelling mid-file also works on HNSW indexes
+Uses a deterministic fake embeddings model and synthetic documents.
+Run with: python -m pytest -q test_ingest_jobs.py   (or: python test_ingest_jobs.py)
+"""
+
+import random
+import tempfile
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import index_registry
+import llm_logic
+from ann_index import ensure_index_type, index_type_of
+from doc_registry import DocumentRegistry
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from index_registry import IndexRegistry
+from ingest import IngestCancelled, IngestProgress, add_chunks, ingest_files
+from ingest_jobs import CANCELLED, DONE, IngestJobQueue
+from synthetic_corpus import make_corpus, make_pages, make_txt
+
+
+class CancellingEmbedding:
+    """Fake embeddings that cancel `job` once they have embedded `after` batches"""
+
+    def __init__(self, after: int):
+        self.base = DeterministicFakeEmbedding(size=64)
+        self.after = after
+        self.calls = 0
+        self.job = None
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.job is not None and self.calls >= self.after:
+            self.job.cancel()
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
+
+
+def test_cancelled_job_resumes():
+    original_registry, original_embeddings = index_registry._registry, llm_logic._embeddings
+    base = CancellingEmbedding(after=2)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        index_registry._registry = IndexRegistry(cache_dir=cache_dir)
+        llm_logic._embeddings = CachedEmbeddings(base, "fake", cache=EmbeddingCache(":memory:"))
+        try:
+            files = make_corpus(60)
+            names = [f.name for f in files]
+            registry, queue = DocumentRegistry(), IngestJobQueue()
+
+            job = base.job = queue.submit(registry, files)
+            job.wait(120)
+            assert job.status == CANCELLED
+            assert 0 < len(registry) < len(files)
+            assert registry.vector_store.index.ntotal == registry.chunk_count
+            kept = sorted(registry.files)
+
+            base.job = None
+            job = queue.submit(registry, files)
+            assert job.wait(120)
+            assert job.status == DONE and job.progress == 1.0
+            assert job.changes["unchanged"] == kept
+            assert sorted(job.changes["added"]) == sorted(set(names) - set(kept))
+            assert sorted(registry.files) == sorted(names)
+            assert registry.vector_store.index.ntotal == registry.chunk_count
+            assert all(f.stage in ("done", "unchanged") for f in job.files.values())
+        finally:
+            index_registry._registry, llm_logic._embeddings = original_registry, original_embeddings
+
+
+class CancelAfterFirstBatch(IngestProgress):
+    def __init__(self):
+        self.batches = 0
+
+    def batch_embedded(self, result, embedded):
+        self.batches += 1
+
+    def cancelled(self):
+        return self.batches > 0
+
+
+def test_cancel_mid_file_on_hnsw_index():
+    embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=64), "fake", cache=EmbeddingCache(":memory:"))
+    chunks = [Document(page_content=f"Existing chunk number {i}.") for i in range(50)]
+    vector_store = ensure_index_type(add_chunks(None, chunks, [f"old-{i}" for i in range(50)], embeddings), "hnsw")
+    assert index_type_of(vector_store.index) == "hnsw"
+
+    # More than one batch of chunks, so the cancel lands mid-file
+    big_file = ("big.txt", make_txt(make_pages(random.Random(0), 80)))
+    progress = CancelAfterFirstBatch()
+    with pytest.raises(IngestCancelled) as cancelled:
+        ingest_files([big_file], embeddings, vector_store, max_workers=1, progress=progress)
+    vector_store = cancelled.value.vector_store
+
+    assert progress.batches == 1
+    assert index_type_of(vector_store.index) == "hnsw"
+    assert vector_store.index.ntotal == len(vector_store.index_to_docstore_id) == len(chunks)
+    assert sorted(vector_store.index_to_docstore_id.values()) == sorted(f"old-{i}" for i in range(50))
+    assert len(vector_store.lexical_index) == len(chunks)
+    found = vector_store.similarity_search("Existing chunk number 7.", k=1)[0]
+    assert found.page_content == "Existing chunk number 7."
+
+
+if __name__ == "__main__":
+    test_cancelled_job_resumes()
+    test_cancel_mid_file_on_hnsw_index()
+    print("✅ Ingestion job tests passed!")
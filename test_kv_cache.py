@@ -0,0 +1,72 @@
+"""
+KV-cache reuse test: prefill per turn must stay flat as a conversation grows
+Runs multi-turn Normal Chat conversations against the local fake Ollama server, which
+reports how many prompt tokens missed its simulated KV cache on every request.
+Run with: python -m pytest -q test_kv_cache.py   (or: python test_kv_cache.py)
+"""
+
+import llm_logic
+from fake_ollama import FakeOllamaServer
+from kv_cache import SessionKVCache
+
+ANSWER = [f"answer{i} " for i in range(30)]
+TURNS = 8
+
+
+def _converse(session_id: str) -> tuple:
+    """Chat for TURNS turns; returns (server requests, prompt tokens per turn if sent in full)"""
+    messages = []
+    full_sizes = []
+    with FakeOllamaServer(ANSWER) as server:
+        original_url, original_cache = llm_logic.llm.base_url, llm_logic.ANSWER_CACHE_ENABLED
+        llm_logic.llm.base_url = server.url
+        llm_logic.ANSWER_CACHE_ENABLED = False
+        try:
+            for turn in range(TURNS):
+                question = f"question number {turn} about topic {turn} in some detail"
+                answer = "".join(llm_logic.stream_text_response(question, messages, session_id=session_id))
+                messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+                full_sizes.append(sum(len(m["content"].split()) for m in messages))
+        finally:
+            llm_logic.llm.base_url = original_url
+            llm_logic.ANSWER_CACHE_ENABLED = original_cache
+    return server.requests, full_sizes
+
+
+def test_context_is_carried_between_turns():
+    requests, full_sizes = _converse("kv-test-context")
+    prefilled = [r["prompt_eval_count"] for r in requests]
+    print(f"\n   carried context: prefill per turn {prefilled} (conversation grows to {full_sizes[-1]} words)")
+
+    assert "context" not in requests[0]["payload"]
+    for request in requests[1:]:
+        assert request["payload"]["context"]
+        assert request["payload"]["prompt"].startswith("question number")
+        assert "system" not in request["payload"]
+    # Only the new question is prefilled, however long the conversation gets
+    assert max(prefilled[1:]) == min(prefilled[1:])
+    assert max(prefilled[1:]) < prefilled[0]
+
+
+def test_full_prompts_share_a_stable_prefix():
+    # No carried context: every turn sends the whole history, which must still hit the cache
+    original = llm_logic._session_kv
+    llm_logic._session_kv = SessionKVCache(max_context_tokens=0)
+    try:
+        requests, full_sizes = _converse("kv-test-prefix")
+    finally:
+        llm_logic._session_kv = original
+    prefilled = [r["prompt_eval_count"] for r in requests]
+    print(f"\n   stable prefix:   prefill per turn {prefilled}")
+
+    assert all("context" not in r["payload"] for r in requests)
+    assert all(r["payload"]["system"] == llm_logic.TEXT_SYSTEM_PROMPT for r in requests)
+    # Prefill covers the last exchange and the new question, not the whole history
+    assert max(prefilled[2:]) - min(prefilled[2:]) <= 2
+    assert prefilled[-1] < full_sizes[-2] / 2
+
+
+if __name__ == "__main__":
+    test_context_is_carried_between_turns()
+    test_full_prompts_share_a_stable_prefix()
+    print("✅ KV-cache reuse tests passed!")
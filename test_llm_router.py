@@ -0,0 +1,108 @@
+"""
+LLM routing test: questions go to the fast or main backend by type, and in draft mode the
+fast model's draft is replaced by the main model's answer. Uses two fake servers, one
+speaking Ollama's API and one OpenAI's.
+Run with: python -m pytest -q test_llm_router.py   (or: python test_llm_router.py)
+"""
+
+import time
+
+import pytest
+
+import llm_logic
+from fake_ollama import FakeOllamaServer
+from kv_cache import SessionKVCache
+from llm_backends import OllamaBackend, OpenAIBackend, backend_from_spec
+from llm_router import Replacement, Router, classify_query, collect
+
+MAIN_TOKENS = ["The main", " model's", " answer."]
+FAST_TOKENS = ["A fast", " draft."]
+
+
+class StaticStore:
+    def similarity_search(self, question, k=3):
+        from langchain_core.documents import Document
+        return [Document(page_content="The company was founded in 1999.")]
+
+
+def _use_router(router: Router) -> tuple:
+    original = (llm_logic._router, llm_logic._session_kv, llm_logic.ANSWER_CACHE_ENABLED)
+    llm_logic._router, llm_logic._session_kv, llm_logic.ANSWER_CACHE_ENABLED = router, SessionKVCache(), False
+    return original
+
+
+def _restore(original: tuple):
+    llm_logic._router, llm_logic._session_kv, llm_logic.ANSWER_CACHE_ENABLED = original
+
+
+def test_questions_are_routed_by_type():
+    assert classify_query("What is the capital of France?", "text") == "factual"
+    assert classify_query("Which year was the company founded?", "rag") == "extractive"
+    assert classify_query("Explain why the sky is blue", "text") == "open"
+    assert classify_query("Tell me a story about a dragon", "text") == "open"
+    assert classify_query("What " + "very " * 20 + "long question is this?", "rag") == "open"
+
+    assert backend_from_spec("ollama:gemma3:1b").model == "gemma3:1b"
+    assert backend_from_spec("openai:qwen@http://host:8080/v1").base_url == "http://host:8080/v1"
+    with pytest.raises(ValueError):
+        backend_from_spec("gemma3:1b")
+
+    with FakeOllamaServer(MAIN_TOKENS) as main_server, FakeOllamaServer(FAST_TOKENS) as fast_server:
+        router = Router(OllamaBackend("big", main_server.url), OpenAIBackend("small", f"{fast_server.url}/v1"))
+        original = _use_router(router)
+        try:
+            factual = "".join(llm_logic.stream_text_response("What is the capital of France?"))
+            open_ended = "".join(llm_logic.stream_text_response("Explain why the sky is blue"))
+            extractive = "".join(llm_logic.stream_rag_response("Which year was the company founded?", StaticStore()))
+        finally:
+            _restore(original)
+        # Without the InferenceService, the OpenAI backend streams over its own connection
+        direct = collect(router.fast.stream("What is the capital of France?", system="Be brief."))
+
+    assert (factual, open_ended, extractive, direct) == ("".join(FAST_TOKENS), "".join(MAIN_TOKENS),
+                                                         "".join(FAST_TOKENS), "".join(FAST_TOKENS))
+    assert [r["path"] for r in fast_server.requests] == ["/v1/chat/completions"] * 3
+    assert "founded in 1999" in fast_server.requests[1]["payload"]["messages"][-1]["content"]
+    assert fast_server.requests[2]["payload"]["messages"][0] == {"role": "system", "content": "Be brief."}
+    assert [r["payload"]["model"] for r in main_server.requests] == ["big"]
+
+    stats = router.telemetry.stats()
+    assert stats["factual"]["openai:small"]["answers"] == 1
+    assert stats["extractive"]["openai:small"]["answers"] == 1
+    assert stats["open"]["ollama:big"]["mean_ttft_ms"] > 0
+
+
+def test_draft_is_replaced_by_main_answer():
+    question = "Explain how tides work"
+    with FakeOllamaServer(MAIN_TOKENS, first_token_delay=0.3) as main_server, \
+            FakeOllamaServer(FAST_TOKENS, token_delay=0.01) as fast_server:
+        router = Router(OllamaBackend("big", main_server.url), OllamaBackend("small", fast_server.url), draft=True)
+        original = _use_router(router)
+        try:
+            start = time.perf_counter()
+            stream = llm_logic.stream_text_response(question, session_id="draft-test")
+            first = next(stream)
+            first_seconds = time.perf_counter() - start
+            fragments = [first] + list(stream)
+            kv = llm_logic._session_kv
+        finally:
+            _restore(original)
+
+    replaced = next(i for i, fragment in enumerate(fragments) if isinstance(fragment, Replacement))
+    record = router.telemetry.records[-1]
+    print(f"\n   draft after {record['ttft_ms']:.0f} ms, final answer after {record['final_ms']:.0f} ms")
+
+    assert "".join(fragments[:replaced]) == "".join(FAST_TOKENS)
+    assert collect(fragments) == "".join(MAIN_TOKENS)
+    assert first_seconds < 0.25
+    assert (record["backend"], record["draft"], record["outcome"]) == ("ollama:big", "ollama:small", "ok")
+    assert record["ttft_ms"] < record["final_ms"]
+    # Only the main model's context is kept for the next turn, covering its own answer
+    messages = [{"role": "user", "content": question}, {"role": "assistant", "content": "".join(MAIN_TOKENS)}]
+    assert kv.context_for("draft-test", messages) is not None
+
+
+if __name__ == "__main__":
+    test_questions_are_routed_by_type()
+    test_draft_is_replaced_by_main_answer()
+    print("✅ LLM routing tests passed!")
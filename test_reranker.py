@@ -0,0 +1,78 @@
+"""
+Reranking test: the cross-encoder stage reorders candidates, stops at its latency budget
+with the unscored tail in first-stage order, and passes rankings through until loaded
+Run with: python -m pytest -q test_reranker.py   (or: python test_reranker.py)
+"""
+
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from rag_response import Source
+from reranker import Reranker
+
+
+class LengthScorer:
+    """Scores a passage by its length; sleeps per pair to make the budget bite"""
+
+    def __init__(self, pair_seconds: float = 0.0, gate: threading.Event = None):
+        self.pair_seconds = pair_seconds
+        self.gate = gate
+
+    def predict(self, pairs: list, batch_size: int = 32) -> list:
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.pair_seconds * len(pairs))
+        return [len(passage) for _, passage in pairs]
+
+
+def make_sources(count: int) -> list:
+    return [Source(document=Document(page_content="x" * (i + 1), metadata={}), rank=i + 1) for i in range(count)]
+
+
+def test_rerank_reorders_by_score():
+    reranker = Reranker(model=LengthScorer(), budget_ms=1000, batch_size=4)
+    reranker.load()
+    ranked, stats = reranker.rerank("question", make_sources(10))
+
+    assert [len(s.document.page_content) for s in ranked] == list(range(10, 0, -1))
+    assert [s.rank for s in ranked] == list(range(1, 11))
+    assert ranked[0].rerank == 10
+    assert stats.scored == 10 and stats.fallback is None
+    assert reranker.stats["complete"] == 1
+
+
+def test_budget_keeps_unscored_tail_in_order():
+    # 4 pairs per batch at 5 ms each: only about two batches fit in 45 ms
+    reranker = Reranker(model=LengthScorer(pair_seconds=0.005), budget_ms=45, batch_size=4)
+    reranker.load()
+    ranked, stats = reranker.rerank("question", make_sources(20))
+
+    assert stats.fallback == "budget"
+    assert 0 < stats.scored < 20 and stats.scored % 4 == 0
+    scored, tail = ranked[:stats.scored], ranked[stats.scored:]
+    assert [s.rerank for s in scored] == sorted((s.rerank for s in scored), reverse=True)
+    assert [len(s.document.page_content) for s in tail] == list(range(stats.scored + 1, 21))
+    assert all(s.rerank is None for s in tail)
+
+
+def test_passes_through_while_loading():
+    gate = threading.Event()
+    reranker = Reranker(model=LengthScorer(gate=gate), budget_ms=1000)
+    sources = make_sources(5)
+    ranked, stats = reranker.rerank("question", sources)
+
+    assert stats.fallback == "loading" and stats.scored == 0
+    assert ranked == sources
+    gate.set()
+    reranker.load()
+    assert reranker.ready
+    assert reranker.rerank("question", make_sources(5))[1].fallback is None
+
+
+if __name__ == "__main__":
+    test_rerank_reorders_by_score()
+    test_budget_keeps_unscored_tail_in_order()
+    test_passes_through_while_loading()
+    print("✅ Reranker tests passed!")
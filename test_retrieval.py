@@ -0,0 +1,65 @@
+"""
+Retrieval test: batched retrieval must match one-at-a-time retrieval, and repeated
+questions must reuse their query embedding
+Uses a deterministic fake embeddings model and synthetic documents.
+Run with: python -m pytest -q test_retrieval.py   (or: python test_retrieval.py)
+"""
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import llm_logic
+from embedding_engine import CachedEmbeddings, EmbeddingCache
+from synthetic_corpus import make_corpus, make_questions
+
+
+def _with_store(test):
+    original = llm_logic._embeddings
+    llm_logic._embeddings = CachedEmbeddings(
+        DeterministicFakeEmbedding(size=64), "fake", batch_size=8, cache=EmbeddingCache(":memory:")
+    )
+    try:
+        test(llm_logic.process_documents(make_corpus(30), use_cache=False))
+    finally:
+        llm_logic._embeddings = original
+
+
+def test_batch_matches_single_queries():
+    def test(vector_store):
+        questions = make_questions(20)
+        for mode in ("hybrid", "dense"):
+            original_mode, llm_logic.RETRIEVAL_MODE = llm_logic.RETRIEVAL_MODE, mode
+            try:
+                batched = llm_logic.retrieve_batch(questions, vector_store, k=3)
+                single = [llm_logic.retrieve_scored(question, vector_store, k=3)[0] for question in questions]
+            finally:
+                llm_logic.RETRIEVAL_MODE = original_mode
+
+            assert len(batched) == len(questions)
+            for batch_sources, sources in zip(batched, single):
+                assert [s.document.id for s in batch_sources] == [s.document.id for s in sources]
+                for batch_source, source in zip(batch_sources, sources):
+                    assert abs(batch_source.score - source.score) < 1e-5
+
+    _with_store(test)
+
+
+def test_repeated_questions_reuse_embeddings():
+    def test(vector_store):
+        embeddings = llm_logic.get_embeddings()
+        embeddings.clear_query_cache()
+        questions = make_questions(5)
+
+        llm_logic.retrieve_batch(questions + questions, vector_store)
+        hits = embeddings.stats["query_hits"]
+        llm_logic.retrieve(questions[0], vector_store)
+
+        assert embeddings.stats["query_hits"] == hits + 1
+        assert len(embeddings._query_cache) == len(set(questions))
+
+    _with_store(test)
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_queries()
+    test_repeated_questions_reuse_embeddings()
+    print("✅ Retrieval tests passed!")
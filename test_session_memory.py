@@ -0,0 +1,119 @@
+"""
+Session memory test: messages that leave the prompt window are summarized in the
+background and recalled when relevant, and prompts stay bounded as a chat grows
+Run with: python -m pytest -q test_session_memory.py   (or: python test_session_memory.py)
+"""
+
+import zlib
+
+import numpy as np
+
+import llm_logic
+from context_builder import HISTORY_TOKEN_BUDGET, count_tokens
+from fake_ollama import FakeOllamaServer
+from kv_cache import SessionKVCache
+from session_memory import RECALL_TOKENS, SUMMARY_STEP_TOKENS, SUMMARY_TOKENS, SessionMemory
+
+CITIES = ["Lisbon", "Oslo", "Quito", "Hanoi", "Lagos", "Perth", "Tunis", "Riga", "Accra", "Lima"]
+
+
+def embed(texts: list) -> np.ndarray:
+    """Bag-of-words vectors: texts sharing words are similar"""
+    vectors = np.zeros((len(texts), 256), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().replace("?", " ").replace(".", " ").split():
+            vectors[row, zlib.crc32(word.encode()) % 256] += 1
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def embed_query(text: str) -> np.ndarray:
+    return embed([text])[0]
+
+
+class Summarizer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, session_id: str, summary: str, transcript: str) -> str:
+        self.calls += 1
+        return f"{summary} Part {self.calls}: {transcript.splitlines()[0]}"
+
+
+def make_chat(turns: int) -> list:
+    messages = []
+    for i in range(turns):
+        city = CITIES[i % len(CITIES)]
+        messages += [
+            {"role": "user", "content": f"What is the office code in {city} for year {2000 + i}?"},
+            {"role": "assistant", "content": f"The {city} office uses code {city.upper()}-{i:03d}. " + "Details follow. " * 3},
+        ]
+    return messages
+
+
+def test_old_messages_are_summarized_and_recalled():
+    summarizer = Summarizer()
+    memory = SessionMemory(summarize=summarizer, embed=embed, summary_tokens=60, recall_tokens=120)
+    messages = make_chat(30)
+    # The chat grows by one exchange per turn; everything but the last 6 messages has left the window
+    for end in range(8, len(messages) + 1, 2):
+        memory.update("s1", messages[:end - 6])
+        memory.wait("s1")
+
+    summary, recalled = memory.context("s1", "Which office code did Quito use in year 2002?", embed_query)
+    dropped_tokens = sum(count_tokens(msg["content"]) for msg in messages[:-6])
+    assert summary.startswith("Part 1")
+    assert count_tokens(summary) <= 60
+    # One summary per step of dropped history, not one per turn
+    assert 0 < summarizer.calls <= dropped_tokens // SUMMARY_STEP_TOKENS
+    assert any("QUITO-002" in text for text in recalled)
+    assert sum(count_tokens(text) for text in recalled) <= 120
+
+    # A restored copy of the chat reuses the cached summaries
+    calls = summarizer.calls
+    memory.update("s2", messages[:-6])
+    memory.wait("s2")
+    assert summarizer.calls == calls
+    assert memory.context("s2", "anything")[0] == summary
+    assert memory.stats["summary_cache_hits"] >= calls
+
+    # An edited chat starts over
+    memory.update("s1", make_chat(2)[::-1])
+    assert memory.context("s1", "Which office code did Quito use?", embed_query) == ("", [])
+
+
+def test_prompts_stay_bounded_in_long_chats():
+    original_kv, original_memory = llm_logic._session_kv, llm_logic._session_memory
+    original_cache = llm_logic.ANSWER_CACHE_ENABLED
+    # No carried context, so every turn builds a full prompt from window + memory
+    llm_logic._session_kv = SessionKVCache(max_context_tokens=0)
+    llm_logic._session_memory = None
+    llm_logic.ANSWER_CACHE_ENABLED = False
+    session_id = "memory-test"
+    messages = make_chat(3)
+    try:
+        with FakeOllamaServer([f"summary{i} " for i in range(20)]) as server:
+            llm_logic.llm.base_url = server.url
+            for turn in range(25):
+                question = f"Tell me more about office number {turn} and its history?"
+                answer = "".join(llm_logic.stream_text_response(question, messages, session_id=session_id))
+                messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer * 4}]
+                llm_logic.get_session_memory().wait(session_id)
+    finally:
+        llm_logic._session_kv, llm_logic._session_memory = original_kv, original_memory
+        llm_logic.ANSWER_CACHE_ENABLED = original_cache
+
+    chats = [r["payload"]["prompt"] for r in server.requests if r["payload"].get("system")]
+    summaries = [r for r in server.requests if not r["payload"].get("system")]
+    sizes = [count_tokens(prompt) for prompt in chats]
+    print(f"\n   prompt tokens per turn {sizes}, {len(summaries)} summary requests")
+
+    assert summaries and len(summaries) < len(chats) / 2
+    assert "Summary of the earlier conversation" in chats[-1]
+    assert max(sizes) <= HISTORY_TOKEN_BUDGET + SUMMARY_TOKENS + RECALL_TOKENS + 100
+    assert sum(count_tokens(m["content"]) for m in messages) > 3 * max(sizes)
+
+
+if __name__ == "__main__":
+    test_old_messages_are_summarized_and_recalled()
+    test_prompts_stay_bounded_in_long_chats()
+    print("✅ Session memory tests passed!")
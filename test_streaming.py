@@ -0,0 +1,69 @@
+"""
+Time-to-first-token test for streaming responses, against a local fake Ollama server
+Run with: python -m pytest -q test_streaming.py   (or: python test_streaming.py)
+"""
+
+import time
+
+import llm_logic
+from fake_ollama import FakeOllamaServer
+
+TOKENS = [f"token{i} " for i in range(20)]
+FIRST_TOKEN_DELAY = 0.05
+TOKEN_DELAY = 0.05
+
+
+def _measure(stream) -> tuple:
+    """Consume a token stream and return (first_token, text, ttft_seconds, total_seconds)"""
+    start = time.perf_counter()
+    first = next(stream)
+    ttft = time.perf_counter() - start
+    text = first + "".join(stream)
+    total = time.perf_counter() - start
+    return first, text, ttft, total
+
+
+def test_stream_text_response_time_to_first_token():
+    llm_logic.warm_up(embeddings=False).join()
+    with FakeOllamaServer(TOKENS, FIRST_TOKEN_DELAY, TOKEN_DELAY) as server:
+        original_url = llm_logic.llm.base_url
+        llm_logic.llm.base_url = server.url
+        try:
+            first, text, ttft, total = _measure(llm_logic.stream_text_response("What is Python?"))
+        finally:
+            llm_logic.llm.base_url = original_url
+
+    print(f"\n   text: TTFT {ttft * 1000:.0f} ms, total {total * 1000:.0f} ms")
+    assert first == TOKENS[0]
+    assert text == "".join(TOKENS)
+    # The first token must arrive long before the full generation is done
+    assert ttft < FIRST_TOKEN_DELAY + 5 * TOKEN_DELAY
+    assert total >= FIRST_TOKEN_DELAY + (len(TOKENS) - 1) * TOKEN_DELAY
+
+
+def test_stream_rag_response_time_to_first_token():
+    class StaticStore:
+        def similarity_search(self, question, k=3):
+            from langchain_core.documents import Document
+            return [Document(page_content="Python is a programming language.")]
+
+    with FakeOllamaServer(TOKENS, FIRST_TOKEN_DELAY, TOKEN_DELAY) as server:
+        original_url = llm_logic.llm.base_url
+        llm_logic.llm.base_url = server.url
+        try:
+            first, text, ttft, total = _measure(
+                llm_logic.stream_rag_response("What is Python?", StaticStore())
+            )
+        finally:
+            llm_logic.llm.base_url = original_url
+
+    print(f"\n   rag:  TTFT {ttft * 1000:.0f} ms, total {total * 1000:.0f} ms")
+    assert text == "".join(TOKENS)
+    assert ttft < FIRST_TOKEN_DELAY + 5 * TOKEN_DELAY
+    assert "Python is a programming language." in server.requests[0]["payload"]["prompt"]
+
+
+if __name__ == "__main__":
+    test_stream_text_response_time_to_first_token()
+    test_stream_rag_response_time_to_first_token()
+    print("✅ Streaming tests passed!")